@@ -1,36 +1,122 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context, url_for
 from flask_cors import CORS
-from model.sweet_model import add_sweet, get_sweets, remove_sweet, get_sweet_by_id
-from model.order_model import place_order, get_orders, get_daily_summary, update_order_status, edit_order
-from utils.pdf_generator import generate_order_pdf, generate_orders_statement_pdf
-from utils.email_service import send_order_invoice_to_manager, send_contact_form_to_manager
+from model.sweet_model import add_sweet, get_sweets, remove_sweet, get_sweet_by_id, search_sweets
+from model.order_model import place_order, bulk_place_orders, validate_order_request, claim_idempotency_key, complete_idempotency_key, release_idempotency_key, get_orders, get_daily_summary, update_order_status, edit_order, get_prep_list, get_customer_orders, archive_old_orders, bulk_update_order_status, OrderVersionConflict, get_order, iter_orders
+from utils.pdf_generator import generate_order_pdf, generate_prep_list_pdf
+from model.customer_model import get_customer, search_customers
+from model.capacity_model import CapacityExceededError, get_availability, set_capacity_limits
+from utils.email_service import send_order_invoice_to_manager, send_contact_form_to_manager, send_bulk_import_summary_to_manager, send_bulk_status_summary_to_manager
+from utils.order_import import parse_orders_csv
+from utils.order_export import order_rows, iter_csv, write_xlsx
+from utils.invoice_cache import invoice_cache
+from utils.notifier import manager_notifier
+from utils.order_intake import order_intake
+from utils.report_jobs import report_runner, ReportQueueFull
+from model.report_model import get_report_job, open_report_file
+from utils.image_upload import ImageUploadError, ImageTooLargeError, stream_multipart_form, UPLOAD_CHUNK_SIZE
+from model.image_model import open_image_upload, save_uploaded_image, open_image
+from model.archive_model import ARCHIVE_AFTER_DAYS
+from model.migrations import pending_migrations
+from utils.event_broker import OrderEventBroker, TooManySubscribers
+from model.event_model import EVENT_PAGE_SIZE, get_events_since, get_latest_seq
+from utils.logger import get_logger, request_id_var
+from utils.json_provider import OrjsonProvider, dumps_bytes
+from utils.compression import init_compression
+from utils.rate_limit import rate_limited, load_shedder, init_load_shedding
+from utils.catalogue_snapshot import catalogue_snapshots, snapshot_response
+from utils.static_catalogue import static_publisher
+from utils.stores import CORS_ORIGINS, DEFAULT_STORE_ID, UnknownStoreError, current_store_id, resolve_store_id, store_id_var
+import hashlib
+import logging
 import os
+import uuid
 from io import BytesIO
 from dotenv import load_dotenv
 
 load_dotenv(".env")
 
+log = get_logger(__name__)
+
 app = Flask(__name__)
+# orjson-backed JSON (handles ObjectId/datetime) and negotiated gzip/brotli bodies
+app.json = OrjsonProvider(app)
+init_compression(app)
+init_load_shedding(app)
 
 # Configure CORS to allow requests from frontend and handle large responses
+# (origins of every store's frontend come from CORS_ORIGINS)
 CORS(app, 
-     origins=["http://localhost:5173", "http://localhost:3000", "http://127.0.0.1:5173", "https://server.uemcseaiml.org", "https://sweet-store-frontend-ten.vercel.app", "https://www.mansoorhotel.in", "https://mansoorhotel.in"],
+     origins=CORS_ORIGINS,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization", "Accept"],
-     expose_headers=["Content-Type", "Content-Disposition"],
+     allow_headers=["Content-Type", "Authorization", "Accept", "Idempotency-Key", "X-Request-ID", "If-Match", "X-Store-ID"],
+     expose_headers=["Content-Type", "Content-Disposition", "Idempotent-Replayed", "X-Request-ID", "Retry-After", "ETag", "X-Store-ID"],
      supports_credentials=True,
      max_age=3600
 )
 
+# Live order feed: streams per worker are capped so they can never take every
+# gunicorn thread, and each stream ends after a while so clients reconnect
+# (resuming from Last-Event-ID) and rebalance across workers.
+SSE_MAX_STREAMS_PER_WORKER = int(os.getenv("SSE_MAX_STREAMS_PER_WORKER", 4))
+SSE_MAX_STREAM_SECONDS = int(os.getenv("SSE_MAX_STREAM_SECONDS", 300))
+SSE_KEEPALIVE_SECONDS = 15
+order_event_broker = OrderEventBroker(SSE_MAX_STREAMS_PER_WORKER)
+
+# Queries expect migrated documents (e.g. every sweet and order carries a
+# storeId), so unmigrated data is invisible. render.yaml migrates on build.
+try:
+    _pending_migrations = pending_migrations()
+except Exception as e:
+    log.warning("Could not check schema migrations: %s", e)
+    _pending_migrations = []
+if _pending_migrations:
+    log.error("Schema migrations pending (%s); existing sweets and orders stay hidden until `python migrate.py` is run",
+              ", ".join(_pending_migrations))
+
 # Increase max content length to handle large base64 images (16MB)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+@app.before_request
+def _assign_request_id():
+    """Tag every log line of this request with a request ID (client-supplied or generated)."""
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    request.environ["sweet_store.request_id_token"] = request_id_var.set(rid)
+
+@app.before_request
+def _resolve_store():
+    """Scope this request to one store: X-Store-ID header, else the Host's store, else the default."""
+    try:
+        store_id = resolve_store_id(request.headers.get("X-Store-ID"), request.host)
+    except UnknownStoreError as e:
+        return jsonify({"error": str(e)}), 400
+    request.environ["sweet_store.store_id_token"] = store_id_var.set(store_id)
+
+@app.after_request
+def _echo_request_id(response):
+    """Return the request ID so clients can correlate their calls with our logs."""
+    rid = request_id_var.get()
+    if rid:
+        response.headers["X-Request-ID"] = rid
+    # Same URL, different store: caches must key on the header too
+    response.headers["X-Store-ID"] = current_store_id()
+    response.vary.add("X-Store-ID")
+    return response
+
+@app.teardown_request
+def _clear_request_id(exc=None):
+    token = request.environ.pop("sweet_store.request_id_token", None)
+    if token is not None:
+        request_id_var.reset(token)
+    token = request.environ.pop("sweet_store.store_id_token", None)
+    if token is not None:
+        store_id_var.reset(token)
+
 @app.route("/server-date", methods=["GET"])
 def get_server_date():
     """Get current server date in YYYY-MM-DD format."""
     from datetime import datetime
     current_date = datetime.now().strftime("%Y-%m-%d")
-    print(f"📅 Server date requested: {current_date}")
+    log.debug("Server date requested: %s", current_date)
     return jsonify({"date": current_date})
 
 @app.route("/sweets", methods=["GET"])
@@ -39,21 +125,71 @@ def fetch_sweets():
     Returns full base64 image strings without truncation.
     """
     category = request.args.get("category")
+    if not category:
+        # The full catalogue is served from the shared pre-serialized snapshot
+        try:
+            snapshot = catalogue_snapshots.get(current_store_id())
+        except Exception:
+            log.exception("Catalogue snapshot unavailable; serving from the database")
+            snapshot = None
+        if snapshot is not None:
+            return snapshot_response(snapshot, request, app.response_class)
     sweets = get_sweets(category)
     
-    # Log response size for debugging
-    if sweets:
-        print(f"📤 Returning {len(sweets)} sweet(s) to frontend")
-        # Log details of first sweet for verification
-        if len(sweets) > 0 and sweets[0].get('image'):
-            print(f"   First sweet: {sweets[0].get('name')}")
-            print(f"   Unit: {sweets[0].get('unit')}")
-            print(f"   Image length: {len(sweets[0].get('image', ''))} chars")
-            print(f"   Has valid base64: {str(sweets[0].get('image', '')).startswith('data:image/')}")
+    # Details of the first sweet are only computed when debug logging is on
+    if sweets and log.isEnabledFor(logging.DEBUG):
+        first = sweets[0]
+        image = str(first.get('image') or '')
+        log.debug("Returning sweets to frontend", extra={
+            "count": len(sweets),
+            "first_sweet": first.get('name'),
+            "unit": first.get('unit'),
+            "image_length": len(image),
+            "image_is_data_uri": image.startswith('data:image/'),
+        })
     
     return jsonify(sweets)
 
+@app.route("/sweets/search", methods=["GET"])
+def search_sweets_route():
+    """Search-as-you-type over sweet names, categories and descriptions.
+    Query params: q (required), limit (default 10, max 50).
+    Tolerates small typos and matches the last word as a prefix.
+    """
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify([])
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        return jsonify(search_sweets(query, limit))
+    except Exception as e:
+        return jsonify({"error": f"Search failed: {str(e)}"}), 500
+
+@app.route("/availability", methods=["GET"])
+def fetch_availability():
+    """Remaining production capacity per delivery date (reads counters only).
+    Query params: from, to (YYYY-MM-DD, inclusive). Defaults to the next 14 days.
+    """
+    from datetime import date, datetime, timedelta
+    try:
+        start = datetime.strptime(request.args.get("from") or date.today().isoformat(), "%Y-%m-%d").date()
+        end = datetime.strptime(request.args.get("to") or (start + timedelta(days=13)).isoformat(), "%Y-%m-%d").date()
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Expected YYYY-MM-DD."}), 400
+    if end < start:
+        return jsonify({"error": "'to' must be on or after 'from'"}), 400
+    if (end - start).days > 92:
+        return jsonify({"error": "Date range may span at most 93 days"}), 400
+    try:
+        return jsonify(get_availability(start.isoformat(), end.isoformat()))
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch availability: {str(e)}"}), 500
+
 @app.route("/place_order", methods=["POST"])
+@rate_limited("place_order")
 def new_order():
     """
     Place a new order.
@@ -61,121 +197,158 @@ def new_order():
     """
     data = request.get_json()
     
-    print("\n" + "="*60)
-    print("📝 NEW ORDER RECEIVED")
-    print("="*60)
-    
-    if not data or "items" not in data:
-        print("❌ Invalid order data: missing 'items' field")
-        return jsonify({"error": "Invalid order data. 'items' field is required."}), 400
+    is_valid, error_msg = validate_order_request(data)
+    if not is_valid:
+        log.warning("Rejected order: %s", error_msg)
+        return jsonify({"error": error_msg}), 400
     
-    items = data.get("items", [])
+    log.info("New order received", extra={
+        "customer": data.get('customerName', 'Unknown'),
+        "order_date": data.get('orderDate'),
+        "delivery_date": data.get('deliveryDate'),
+        "item_count": len(data.get("items", [])),
+        "total": data.get('total', 0),
+    })
     
-    if not items:
-        print("❌ Empty order: no items provided")
-        return jsonify({"error": "Order must contain at least one item"}), 400
-    
-    # Validate required date fields
-    if "orderDate" not in data or not data.get("orderDate"):
-        print("❌ Missing required field: orderDate")
-        return jsonify({"error": "Order date is required"}), 400
-    
-    if "deliveryDate" not in data or not data.get("deliveryDate"):
-        print("❌ Missing required field: deliveryDate")
-        return jsonify({"error": "Delivery date is required"}), 400
-    
-    print(f"📅 Order Date: {data.get('orderDate')}")
-    print(f"📅 Delivery Date: {data.get('deliveryDate')}")
-    
-    print(f"\n📦 Order Details:")
-    print(f"   Customer: {data.get('customerName', 'Unknown')}")
-    print(f"   Total Items: {len(items)}")
-    print(f"   Total Amount: ₹{data.get('total', 0)}")
-    
-    for item in items:
-        if not item.get("sweetId"):
-            error_msg = f"Missing sweetId for item: {item.get('sweetName', 'Unknown')}"
-            print(f"❌ {error_msg}")
-            return jsonify({"error": error_msg}), 400
-        
-        # Validate quantity: required and must be >= 1
-        if "quantity" not in item:
-            error_msg = f"Missing quantity for item: {item.get('sweetName', 'Unknown')}"
-            print(f"❌ {error_msg}")
-            return jsonify({"error": error_msg}), 400
-        
+    # Optional Idempotency-Key: retries of a request we already handled get the
+    # original response back without re-running the insert, PDF or email
+    idempotency_key = (request.headers.get("Idempotency-Key") or "").strip()
+    if idempotency_key:
+        if len(idempotency_key) > 255:
+            return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
         try:
-            quantity = float(item.get("quantity", 0))
-            if quantity < 1:
-                error_msg = f"Quantity must be at least 1 for item: {item.get('sweetName', 'Unknown')}"
-                print(f"❌ {error_msg}")
-                return jsonify({"error": error_msg}), 400
-        except (ValueError, TypeError):
-            error_msg = f"Invalid quantity for item: {item.get('sweetName', 'Unknown')}"
-            print(f"❌ {error_msg}")
-            return jsonify({"error": error_msg}), 400
+            existing = claim_idempotency_key(idempotency_key, request_hash)
+        except Exception as e:
+            log.error("Idempotency key claim failed: %s", e)
+            return jsonify({"error": f"Failed to save order: {str(e)}"}), 500
+        if existing is not None:
+            return _idempotent_replay(existing, request_hash)
     
-    print("\n💾 Saving order to database...")
     try:
-        order_result = place_order(data)
-        print("✅ Order saved successfully!")
-        print(f"Order ID: {order_result.get('_id')}")
-        
-        # Generate PDF invoice and send to manager
-        print("\n📧 Generating invoice and sending to manager...")
-        try:
-            order_id = str(order_result.get('_id'))
-            pdf_filename = f"invoice_{order_id}.pdf"
-            
-            print(f"   Generating PDF: {pdf_filename}...")
-            pdf_path = generate_order_pdf(order_result, pdf_filename)
-            
-            if pdf_path:
-                print(f"   PDF created at: {pdf_path}")
-                print(f"   Sending email to manager...")
-                email_result = send_order_invoice_to_manager(order_result, pdf_path)
-                
-                if email_result:
-                    print(f"   ✅ Email sent successfully!")
-                else:
-                    print(f"   ❌ Email sending failed!")
-                
-                # Clean up PDF file after sending
-                if os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-                    print(f"   🗑️ Cleaned up temporary PDF: {pdf_filename}")
-            else:
-                print(f"   ❌ PDF generation failed!")
-                
-        except Exception as email_error:
-            print(f"❌ Email notification error: {str(email_error)}")
-            import traceback
-            traceback.print_exc()
-            # Don't fail the order if email fails
+        if order_intake.enabled:
+            # Logged durably; inserted and notified by the intake flusher
+            order_result = order_intake.submit(data)
+            log.info("Order logged", extra={"order_id": str(order_result.get('_id'))})
+        else:
+            order_result = place_order(data)
+            log.info("Order saved", extra={"order_id": str(order_result.get('_id'))})
         
-        print("="*60 + "\n")
-        return jsonify({
+        response_body = {
             "message": "Order placed successfully! 🎉",
             "orderDate": data.get("orderDate"),
             "deliveryDate": data.get("deliveryDate"),
             "total": data.get("total"),
             "customerName": data.get("customerName")
-        }), 201
+        }
+        if idempotency_key:
+            # Record the outcome before the slow PDF/email work so a retry
+            # that arrives meanwhile is answered from the stored response
+            try:
+                complete_idempotency_key(idempotency_key, 201, response_body)
+            except Exception as e:
+                # The order is saved, so the claim is kept pending rather than
+                # released: releasing it would let a retry place the order again
+                log.error("Could not record idempotent response: %s", e, extra={"order_id": str(order_result.get('_id'))})
+        
+        if not order_intake.enabled:
+            _notify_manager(order_result)
+        
+        return jsonify(response_body), 201
+    except CapacityExceededError as e:
+        log.info("Order rejected for capacity: %s", e)
+        if idempotency_key:
+            release_idempotency_key(idempotency_key)
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        # Validation errors (dates, unknown sweets) are the client's to fix
+        log.warning("Rejected order: %s", e)
+        if idempotency_key:
+            release_idempotency_key(idempotency_key)
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         error_msg = f"Failed to save order: {str(e)}"
-        print(f"❌ {error_msg}")
-        print("="*60 + "\n")
+        log.error(error_msg)
+        if idempotency_key:
+            release_idempotency_key(idempotency_key)
         return jsonify({"error": error_msg}), 500
 
+def _notify_manager(order_result):
+    """Notify the manager of a new order: queued for the next digest, or the invoice emailed right away."""
+    try:
+        order_id = str(order_result.get('_id'))
+        
+        if manager_notifier.digest_enabled:
+            manager_notifier.queue_order(order_result)
+        else:
+            # Rendered into the invoice cache, so a later download reuses it
+            with load_shedder.slow_work():
+                pdf_path, _ = invoice_cache.get_invoice(order_result, generate_order_pdf)
+            
+            if pdf_path:
+                with load_shedder.slow_work():
+                    email_result = send_order_invoice_to_manager(order_result, pdf_path)
+                
+                if email_result:
+                    log.info("Invoice emailed to manager", extra={"order_id": order_id})
+                else:
+                    log.warning("Invoice email failed", extra={"order_id": order_id})
+            else:
+                log.error("Invoice PDF generation failed", extra={"order_id": order_id})
+            
+    except Exception:
+        log.exception("Email notification error")
+        # Don't fail the order if email fails
+
+def _notify_manager_of_buffered_orders(orders):
+    for order in orders:
+        _notify_manager(order)
+
+if order_intake.enabled:
+    order_intake.on_inserted = _notify_manager_of_buffered_orders
+    # Replays orders logged before a restart
+    order_intake.start()
+
+def _idempotent_replay(record, request_hash):
+    """Answer a repeated Idempotency-Key from the stored record."""
+    if record.get("requestHash") != request_hash:
+        return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+    if record.get("status") == "completed":
+        log.info("Replaying idempotent response")
+        response = jsonify(record.get("responseBody") or {})
+        response.status_code = record.get("responseStatus") or 200
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+    response = jsonify({"error": "A request with this Idempotency-Key is still being processed"})
+    response.status_code = 409
+    response.headers["Retry-After"] = "1"
+    return response
+
 # ---------- ADMIN ROUTES ----------
 
 @app.route("/admin/add_sweet", methods=["POST"])
 def admin_add_sweet():
     """Add a new sweet to the inventory.
-    Accepts base64 image strings and stores them without modification.
+    Accepts JSON with base64 image strings (stored without modification), or
+    multipart/form-data with the image as a file part named 'image', which is
+    streamed into the image store.
     Supports optional existingSweetId: if provided, use its details unless overridden by payload.
     """
-    data = request.get_json()
+    if request.mimetype == "multipart/form-data":
+        try:
+            data = _read_sweet_upload()
+        except ImageTooLargeError as e:
+            return jsonify({"error": str(e)}), 413
+        except ImageUploadError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            log.exception("Image upload failed")
+            return jsonify({"error": f"Failed to upload image: {str(e)}"}), 500
+    else:
+        data = request.get_json()
+        if isinstance(data, dict):
+            # imageId is only trusted when the upload above stored the image itself
+            data.pop("imageId", None)
 
     if not data:
         return jsonify({"error": "Request body must be JSON"}), 400
@@ -192,12 +365,13 @@ def admin_add_sweet():
     
     # Validate image format if provided (accept from 'image', 'image_url', or 'imageUrl')
     image_data = data.get("image") or data.get("image_url") or data.get("imageUrl")
-    if image_data:
+    # An uploaded image is already validated; anything else must be a data URI
+    if image_data and not data.get("imageId"):
         if not isinstance(image_data, str):
             return jsonify({"error": "Image must be a string"}), 400
         if not image_data.startswith('data:image/'):
             return jsonify({"error": "Invalid image format. Must be a base64 data URI starting with 'data:image/'"}), 400
-        print(f"📸 Received image - Length: {len(image_data)} characters")
+        log.debug("Received image of %d characters", len(image_data))
 
     existing_id = data.get("existingSweetId")
     base = {}
@@ -210,7 +384,8 @@ def admin_add_sweet():
             "name": found.get("name", ""),
             "rate": found.get("rate", 0),
             "description": found.get("description", ""),
-            "image": found.get("image") or found.get("image_url") or found.get("imageUrl") or "",
+            "image": found.get("image", ""),
+            "imageId": found.get("imageId"),
             "unit": found.get("unit", "kg"),
         }
         # Merge with overrides from the request body
@@ -219,6 +394,7 @@ def admin_add_sweet():
             "rate": data.get("rate", base["rate"]),
             "description": data.get("description", base["description"]),
             "image": data.get("image") or data.get("image_url") or data.get("imageUrl") or base["image"],
+            "imageId": data.get("imageId") if image_data else base["imageId"],
             "category": data.get("category"),
             "unit": data.get("unit", base["unit"]),
         }
@@ -234,6 +410,7 @@ def admin_add_sweet():
 
     try:
         add_sweet(payload)
+        static_publisher.schedule(current_store_id())
         return jsonify({"message": "Sweet added successfully", "sweet": payload.get("name")}), 201
     except ValueError as e:
         # Handle validation errors (e.g., invalid image format)
@@ -241,6 +418,66 @@ def admin_add_sweet():
     except Exception as e:
         return jsonify({"error": f"Failed to add sweet: {str(e)}"}), 500
 
+def _read_sweet_upload():
+    """Stream a multipart sweet form: the 'image' file goes to the image store
+    chunk by chunk; the other parts become the sweet's fields.
+    """
+    fields, upload = stream_multipart_form(
+        request.stream, request.mimetype_params.get("boundary"), "image", open_image_upload
+    )
+    data = dict(fields)
+    # Set below from the stored upload only, never from a form field
+    data.pop("imageId", None)
+    if "isFestival" in data:
+        data["isFestival"] = data["isFestival"].strip().lower() in ("1", "true", "yes", "on")
+    if upload is not None:
+        grid_in, info, filename = upload
+        image_id = save_uploaded_image(grid_in, info)
+        log.info("Stored uploaded image", extra={"image_id": image_id, "bytes": info["size"],
+                                                 "width": info["width"], "height": info["height"]})
+        data["imageId"] = image_id
+        data["image"] = _image_url(image_id)
+    return data
+
+def _image_url(image_id):
+    base = os.getenv("PUBLIC_BASE_URL")
+    if base:
+        return f"{base.rstrip('/')}/sweets/images/{image_id}"
+    return url_for("get_sweet_image", image_id=image_id, _external=True)
+
+@app.route("/sweets/images/<image_id>", methods=["GET"])
+def get_sweet_image(image_id):
+    """Serve an uploaded sweet image from the image store, in chunks."""
+    grid_out = open_image(image_id)
+    if grid_out is None:
+        return jsonify({"error": "Image not found"}), 404
+    metadata = grid_out.metadata or {}
+    etag = metadata.get("sha256") or image_id
+    if etag in request.if_none_match:
+        grid_out.close()
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    def generate():
+        try:
+            while True:
+                chunk = grid_out.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            grid_out.close()
+
+    return Response(
+        generate(),
+        mimetype=metadata.get("contentType") or "application/octet-stream",
+        headers={
+            "Content-Length": str(grid_out.length),
+            "ETag": f'"{etag}"',
+            # Image ids never change content, so caches may keep them forever
+            "Cache-Control": "public, max-age=31536000, immutable",
+        }
+    )
+
 @app.route("/admin/remove_sweet", methods=["DELETE"])
 def admin_remove_sweet():
     """Remove a sweet from the inventory."""
@@ -251,19 +488,247 @@ def admin_remove_sweet():
     
     try:
         remove_sweet(name)
+        static_publisher.schedule(current_store_id())
         return jsonify({"message": f"Sweet '{name}' removed successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to remove sweet: {str(e)}"}), 500
 
+@app.route("/admin/catalogue/publish", methods=["POST"])
+def publish_static_catalogue():
+    """Export the catalogue, per-category lists and resized images as static
+    files for a reverse proxy or static host. Returns the new manifest.
+    """
+    try:
+        with load_shedder.slow_work():
+            manifest = static_publisher.publish(current_store_id())
+        return jsonify(manifest), 200
+    except Exception as e:
+        log.exception("Static catalogue publish error")
+        return jsonify({"error": f"Failed to publish catalogue: {str(e)}"}), 500
+
 @app.route("/admin/orders", methods=["GET"])
 def admin_orders():
-    """Get all orders with optional delivery date filtering."""
+    """Get all orders with optional delivery date filtering.
+    Query params: from, to (YYYY-MM-DD, inclusive). Without them only live
+    orders are returned; archived orders are included when the range needs them.
+    """
+    from datetime import datetime
+    from_date = request.args.get("from") or None
+    to_date = request.args.get("to") or None
+    try:
+        for value in (from_date, to_date):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Expected YYYY-MM-DD."}), 400
     try:
-        orders = get_orders()
+        orders = get_orders(from_date, to_date)
         return jsonify(orders)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch orders: {str(e)}"}), 500
 
+@app.route("/admin/orders/export", methods=["GET"])
+def admin_export_orders():
+    """Download order lines (one row per item) for accounting.
+    Query params: format (csv or xlsx, default csv), from, to (YYYY-MM-DD,
+    inclusive). Rows are streamed from the database cursor, so any range
+    can be exported in constant memory.
+    """
+    from datetime import datetime
+    export_format = (request.args.get("format") or "csv").lower()
+    from_date = request.args.get("from") or None
+    to_date = request.args.get("to") or None
+    if export_format not in ("csv", "xlsx"):
+        return jsonify({"error": "format must be csv or xlsx"}), 400
+    try:
+        for value in (from_date, to_date):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Expected YYYY-MM-DD."}), 400
+
+    filename = f"orders_{from_date or 'start'}_{to_date or 'end'}.{export_format}"
+    rows = order_rows(iter_orders(from_date, to_date))
+    try:
+        if export_format == "csv":
+            chunks = iter_csv(rows)
+            # Pull the first chunk now so database errors still get a proper 500
+            first = next(chunks)
+
+            def generate():
+                yield first
+                yield from chunks
+
+            return Response(
+                generate(),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
+
+        with load_shedder.slow_work():
+            path = write_xlsx(rows)
+    except Exception as e:
+        log.exception("Order export failed")
+        return jsonify({"error": f"Failed to export orders: {str(e)}"}), 500
+
+    def stream_file():
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+
+    return Response(
+        stream_file(),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Length": str(os.path.getsize(path)),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+    )
+
+@app.route("/admin/orders/archive", methods=["POST"])
+def admin_archive_orders():
+    """Move old Delivered/Cancelled orders into orders_archive.
+    JSON body (optional): olderThanDays, maxBatches. Safe to call repeatedly;
+    "done": false means more batches remain.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        older_than_days = int(data.get("olderThanDays") or ARCHIVE_AFTER_DAYS)
+        max_batches = int(data["maxBatches"]) if data.get("maxBatches") else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "olderThanDays and maxBatches must be integers"}), 400
+    if older_than_days < 1:
+        return jsonify({"error": "olderThanDays must be at least 1"}), 400
+    try:
+        return jsonify(archive_old_orders(older_than_days, max_batches=max_batches))
+    except Exception as e:
+        log.exception("Order archival failed")
+        return jsonify({"error": f"Failed to archive orders: {str(e)}"}), 500
+
+@app.route("/admin/orders/bulk", methods=["POST"])
+def admin_bulk_orders():
+    """Import many orders at once from a JSON array or a CSV upload.
+    JSON: a list of orders (or {"orders": [...]}) in the same shape as /place_order.
+    CSV: multipart field 'file' or a text/csv body, one row per item (see utils/order_import).
+    Valid rows are inserted in one batch; invalid rows are reported individually.
+    """
+    try:
+        upload = request.files.get("file")
+        if upload is not None or (request.mimetype or "").startswith("text/csv"):
+            raw = upload.read() if upload is not None else request.get_data()
+            try:
+                text = raw.decode("utf-8-sig")
+            except UnicodeDecodeError:
+                return jsonify({"error": "CSV must be UTF-8 encoded"}), 400
+            row_labels, orders, parse_errors = parse_orders_csv(text)
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                data = data.get("orders")
+            if not isinstance(data, list):
+                return jsonify({"error": "Expected a JSON array of orders or a CSV upload"}), 400
+            row_labels = list(range(len(data)))
+            orders = [o if isinstance(o, dict) else {} for o in data]
+            parse_errors = []
+
+        if not orders and not parse_errors:
+            return jsonify({"error": "No orders provided"}), 400
+
+        result = bulk_place_orders(orders, row_labels) if orders else {"inserted": [], "errors": []}
+        inserted = result["inserted"]
+        errors = sorted(parse_errors + result["errors"], key=lambda e: e["row"])
+
+        # One consolidated notification for the whole batch instead of one email per order
+        if inserted:
+            try:
+                send_bulk_import_summary_to_manager(inserted, len(errors))
+            except Exception:
+                log.exception("Bulk import notification error")
+
+        status_code = 201 if inserted else 400
+        return jsonify({
+            "message": f"Imported {len(inserted)} order(s), {len(errors)} failed",
+            "inserted": len(inserted),
+            "failed": len(errors),
+            "orderIds": [str(o.get("_id")) for o in inserted],
+            "errors": errors
+        }), status_code
+    except Exception as e:
+        log.exception("Bulk order import error")
+        return jsonify({"error": f"Failed to import orders: {str(e)}"}), 500
+
+@app.route("/admin/orders/stream", methods=["GET"])
+def admin_orders_stream():
+    """Server-Sent Events feed of order.created, order.updated and order.status_changed.
+    Each event's id is its feed sequence number; reconnecting clients send it back as
+    Last-Event-ID (or ?lastEventId=) and receive everything they missed first.
+    """
+    import time
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    try:
+        last_seq = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an event id from this feed"}), 400
+
+    try:
+        subscription = order_event_broker.subscribe()
+    except TooManySubscribers:
+        response = jsonify({"error": "Too many live streams on this server, retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+
+    store_id = current_store_id()
+
+    def _format(event):
+        data = dumps_bytes(event.get("order", {})).decode("utf-8")
+        return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+    def generate():
+        sent_seq = last_seq or 0
+        try:
+            yield "retry: 3000\n\n"
+            # Catch up on anything missed while disconnected (subscribed first, so nothing slips between),
+            # page by page until current; a seq still being inserted is waited for, up to EVENT_GAP_WAIT_SECONDS
+            while last_seq is not None:
+                events = get_events_since(sent_seq)
+                for event in events:
+                    sent_seq = event["seq"]
+                    if (event.get("storeId") or DEFAULT_STORE_ID) == store_id:
+                        yield _format(event)
+                if len(events) == EVENT_PAGE_SIZE:
+                    continue
+                if get_latest_seq() <= sent_seq:
+                    break
+                time.sleep(0.2)
+            deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+            while time.monotonic() < deadline and not subscription.overflowed:
+                event = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["seq"] <= sent_seq:
+                    continue
+                sent_seq = event["seq"]
+                # One feed for all stores; each stream shows its own store's orders
+                if (event.get("storeId") or DEFAULT_STORE_ID) == store_id:
+                    yield _format(event)
+        finally:
+            order_event_broker.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/admin/daily_summary", methods=["GET"])
 def admin_summary():
     """Get daily sales summary."""
@@ -273,6 +738,75 @@ def admin_summary():
     except Exception as e:
         return jsonify({"error": f"Failed to fetch daily summary: {str(e)}"}), 500
 
+@app.route("/admin/prep_list", methods=["GET"])
+def admin_prep_list():
+    """Kitchen prep list: total kg/pieces per sweet for orders due on a delivery date.
+    Query params: deliveryDate (YYYY-MM-DD, default today), format=json|pdf.
+    """
+    from datetime import datetime
+    delivery_date = request.args.get("deliveryDate") or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(delivery_date, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Invalid deliveryDate. Expected YYYY-MM-DD."}), 400
+
+    try:
+        prep_list = get_prep_list(delivery_date)
+        if request.args.get("format", "json").lower() != "pdf":
+            return jsonify(prep_list)
+
+        pdf_bytes = generate_prep_list_pdf(prep_list)
+        if not pdf_bytes:
+            return jsonify({"error": "Failed to generate PDF"}), 500
+        return send_file(
+            BytesIO(pdf_bytes),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f"prep_list_{delivery_date}.pdf"
+        )
+    except Exception as e:
+        return jsonify({"error": f"Failed to build prep list: {str(e)}"}), 500
+
+@app.route("/admin/customers", methods=["GET"])
+def admin_search_customers():
+    """Find customer profiles by (part of) their name. Query params: name, limit."""
+    name = (request.args.get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "name is required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        return jsonify(search_customers(name, limit))
+    except Exception as e:
+        return jsonify({"error": f"Failed to search customers: {str(e)}"}), 500
+
+@app.route("/admin/customers/<mobile>/orders", methods=["GET"])
+def admin_customer_orders(mobile):
+    """Customer profile plus their orders, newest first.
+    Query params: limit (default 50), before ("YYYY-MM-DD HH:MM:SS" createdAt of the last order seen).
+    """
+    from datetime import datetime
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    before = request.args.get("before")
+    if before:
+        try:
+            before = datetime.strptime(before, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return jsonify({"error": "Invalid before. Expected YYYY-MM-DD HH:MM:SS."}), 400
+    try:
+        customer = get_customer(mobile)
+        orders = get_customer_orders(mobile, limit, before or None)
+        if customer is None and not orders:
+            return jsonify({"error": "Customer not found"}), 404
+        return jsonify({"customer": customer, "orders": orders})
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch customer orders: {str(e)}"}), 500
+
 # ----- ORDER ADMIN UPDATES -----
 
 @app.route("/admin/update_order_status", methods=["PUT"])
@@ -322,22 +856,157 @@ def admin_update_order_status():
         return jsonify({"error": f"Failed to update order status: {str(e)}"}), 500
 
 
+@app.route("/admin/orders/<order_id>/invoice.pdf", methods=["GET"])
+def admin_order_invoice(order_id):
+    """Invoice PDF for an order, rendered only if the order changed since the
+    last render. Add ?download=1 to get it as an attachment.
+    """
+    order = get_order(order_id)
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+    try:
+        pdf_path, key = invoice_cache.get_invoice(order, generate_order_pdf)
+        if not pdf_path:
+            return jsonify({"error": "Failed to generate PDF"}), 500
+        # Open before responding so a concurrent eviction cannot pull the file away
+        pdf_file = open(pdf_path, "rb")
+    except Exception as e:
+        log.exception("Invoice download error")
+        return jsonify({"error": f"Failed to generate invoice: {str(e)}"}), 500
+    response = send_file(
+        pdf_file,
+        mimetype='application/pdf',
+        as_attachment=request.args.get("download", "").lower() in ("1", "true", "yes"),
+        download_name=f"invoice_{order_id}.pdf",
+        etag=key,
+        conditional=True,
+        max_age=0
+    )
+    return response
+
+@app.route("/admin/orders/bulk_status", methods=["POST"])
+def admin_bulk_order_status():
+    """Set the status of many orders in one request.
+    JSON body: {"status": "Delivered"|"Cancelled", "orderIds": [...]} or
+    {"status": ..., "filter": {"deliveryDate": "YYYY-MM-DD", "currentStatus": "pending"}}.
+    Returns the outcome per order and sends one summary email for the batch.
+    """
+    data = request.get_json(silent=True) or {}
+    status_lc = str(data.get("status") or "").strip().lower()
+    if status_lc not in ("delivered", "cancelled"):
+        return jsonify({"error": "Invalid status. Allowed values: Delivered or Cancelled"}), 400
+    status = "Delivered" if status_lc == "delivered" else "Cancelled"
+
+    order_ids = data.get("orderIds")
+    filters = data.get("filter")
+    if (order_ids is None) == (filters is None):
+        return jsonify({"error": "Provide either orderIds or filter"}), 400
+    if order_ids is not None and not isinstance(order_ids, list):
+        return jsonify({"error": "orderIds must be a list"}), 400
+
+    try:
+        results, updated = bulk_update_order_status(status, order_ids=order_ids, filters=filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to update order status: {str(e)}"}), 500
+
+    log.info("Bulk status update", extra={"status": status, "updated": len(updated), "requested": len(results)})
+    if updated:
+        try:
+            with load_shedder.slow_work():
+                send_bulk_status_summary_to_manager(status, updated)
+        except Exception:
+            log.exception("Bulk status notification error")
+
+    counts = {}
+    for result in results:
+        counts[result["outcome"]] = counts.get(result["outcome"], 0) + 1
+    return jsonify({
+        "message": f"{len(updated)} order(s) marked {status}",
+        "status": status,
+        "updated": counts.get("updated", 0),
+        "unchanged": counts.get("unchanged", 0),
+        "notFound": counts.get("not_found", 0),
+        "invalid": counts.get("invalid_id", 0),
+        "results": results
+    }), 200
+
+
 @app.route("/admin/edit_order/<order_id>", methods=["PUT"])
 def admin_edit_order(order_id):
-    """Edit fields of an order by ID. Only provided fields are updated."""
+    """Edit fields of an order by ID. Only provided fields are updated.
+    Send the order's version as If-Match (or "version" in the body) to have the
+    edit rejected with 409 if someone else changed the order in the meantime.
+    """
     data = request.get_json() or {}
+    expected = request.headers.get("If-Match") or data.pop("version", None)
+    expected_version = None
+    if expected is not None and str(expected).strip() != "*":
+        try:
+            expected_version = int(str(expected).strip().removeprefix("W/").strip('"'))
+        except ValueError:
+            return jsonify({"error": "If-Match must be the order's version number"}), 400
     try:
-        updated = edit_order(order_id, data)
+        updated = edit_order(order_id, data, expected_version)
         if not updated:
             return jsonify({"error": "Order not found"}), 404
-        return jsonify({"message": "Order updated successfully", "order": updated}), 200
+        response = jsonify({"message": "Order updated successfully", "order": updated})
+        response.headers["ETag"] = f'"{updated.get("version", 0)}"'
+        return response, 200
+    except OrderVersionConflict as e:
+        response = jsonify({"error": str(e), "currentVersion": e.current_version})
+        response.headers["ETag"] = f'"{e.current_version}"'
+        return response, 409
+    except CapacityExceededError as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to edit order: {str(e)}"}), 500
 
+@app.route("/admin/capacity", methods=["PUT"])
+def admin_set_capacity():
+    """Set production capacity limits for a delivery date.
+    Body: {"date": "YYYY-MM-DD", "limitKg": 50, "limitPieces": 500, "sweets": {"<sweetId>": 10}}
+    Omitted or null limits mean unlimited.
+    """
+    from datetime import datetime
+    data = request.get_json(silent=True) or {}
+    day = data.get("date")
+    try:
+        datetime.strptime(str(day), "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "date is required in YYYY-MM-DD format"}), 400
+
+    def _limit(value):
+        if value is None or value == "":
+            return None
+        value = float(value)
+        if value < 0:
+            raise ValueError("Limits cannot be negative")
+        return value
+
+    try:
+        limit_kg = _limit(data.get("limitKg"))
+        limit_pieces = _limit(data.get("limitPieces"))
+        sweets = data.get("sweets") or {}
+        if not isinstance(sweets, dict):
+            return jsonify({"error": "sweets must map sweetId to a limit"}), 400
+        sweet_limits = {str(k): _limit(v) for k, v in sweets.items()}
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid limit: {str(e)}"}), 400
+
+    try:
+        set_capacity_limits(day, limit_kg, limit_pieces, sweet_limits)
+        return jsonify({"message": f"Capacity updated for {day}", "availability": get_availability(day, day)[0]}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to update capacity: {str(e)}"}), 500
+
 @app.route("/admin/fix-festival-sweets", methods=["POST"])
 def fix_festival_sweets():
     """Update specific sweets to mark them as festival sweets."""
-    from model.sweet_model import sweet_collection
+    from model.sweet_model import sweet_collection, invalidate_search_index, touch_catalogue
     
     if sweet_collection is None:
         return jsonify({"error": "Database not connected"}), 500
@@ -351,9 +1020,12 @@ def fix_festival_sweets():
     
     # Update the sweet to be a festival sweet
     result = sweet_collection.update_one(
-        {"name": sweet_name},
+        {"storeId": current_store_id(), "name": sweet_name},
         {"$set": {"isFestival": True}}
     )
+    invalidate_search_index()
+    touch_catalogue()
+    static_publisher.schedule(current_store_id())
     
     if result.matched_count == 0:
         return jsonify({"error": f"Sweet '{sweet_name}' not found"}), 404
@@ -385,12 +1057,10 @@ def admin_download_statement():
         if not orders:
             return jsonify({"error": "No orders provided"}), 400
         
-        print(f"\n📥 Statement download requested")
-        print(f"   Orders count: {len(orders)}")
-        print(f"   Filters: {filters}")
+        log.info("Statement download requested", extra={"order_count": len(orders), "filters": filters})
         
-        # Generate PDF
-        pdf_bytes = generate_orders_statement_pdf(orders, filters)
+        # Rendered in the report process pool so the GIL stays free for other requests
+        pdf_bytes = report_runner.render_statement(orders, filters)
         
         if not pdf_bytes:
             return jsonify({"error": "Failed to generate PDF"}), 500
@@ -412,13 +1082,106 @@ def admin_download_statement():
         )
         
     except Exception as e:
-        print(f"❌ Statement download error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Statement download error")
         return jsonify({"error": f"Failed to generate statement: {str(e)}"}), 500
 
 
+def _report_job_json(job):
+    body = {
+        "jobId": job["_id"],
+        "status": job["status"],
+        "createdAt": job.get("createdAt"),
+        "finishedAt": job.get("finishedAt"),
+    }
+    if job.get("error"):
+        body["error"] = job["error"]
+    if job["status"] == "done":
+        body["size"] = job.get("size")
+        body["downloadUrl"] = url_for("download_report", job_id=job["_id"])
+    return body
+
+
+@app.route("/admin/reports/statements", methods=["POST"])
+def create_statement_report():
+    """Queue a PDF statement for filtered orders; poll the returned job for the result.
+    Identical requests share one job and one render.
+    """
+    try:
+        data = request.get_json() or {}
+        orders = data.get('orders', [])
+        filters = data.get('filters', {})
+        if not orders:
+            return jsonify({"error": "No orders provided"}), 400
+
+        job, created = report_runner.submit_statement(orders, filters)
+        body = _report_job_json(job)
+        body["coalesced"] = not created
+        response = jsonify(body)
+        response.headers["Location"] = url_for("get_report_status", job_id=job["_id"])
+        return response, 200 if job["status"] == "done" else 202
+    except ReportQueueFull:
+        response = jsonify({"error": "Too many reports are being generated, please retry shortly"})
+        response.headers["Retry-After"] = "10"
+        return response, 503
+    except Exception as e:
+        log.exception("Statement report error")
+        return jsonify({"error": f"Failed to queue statement: {str(e)}"}), 500
+
+
+@app.route("/admin/reports/<job_id>", methods=["GET"])
+def get_report_status(job_id):
+    """Status of a report job: queued, done (with downloadUrl) or failed."""
+    try:
+        job = get_report_job(job_id)
+        if job is None:
+            return jsonify({"error": "Report job not found"}), 404
+        return jsonify(_report_job_json(job)), 200
+    except Exception as e:
+        log.exception("Report status error")
+        return jsonify({"error": f"Failed to fetch report status: {str(e)}"}), 500
+
+
+@app.route("/admin/reports/<job_id>/download", methods=["GET"])
+def download_report(job_id):
+    """Download a finished report PDF, streamed from GridFS."""
+    job = get_report_job(job_id)
+    if job is None:
+        return jsonify({"error": "Report job not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": "Report is not ready", "status": job["status"]}), 409
+    grid_out = open_report_file(job)
+    if grid_out is None:
+        return jsonify({"error": "Report file not found"}), 404
+    if job_id in request.if_none_match:
+        grid_out.close()
+        return Response(status=304, headers={"ETag": f'"{job_id}"'})
+
+    def generate():
+        try:
+            while True:
+                chunk = grid_out.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            grid_out.close()
+
+    filename = job.get("filename") or "statement.pdf"
+    return Response(
+        generate(),
+        mimetype="application/pdf",
+        headers={
+            "Content-Length": str(grid_out.length),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            # The job id is the hash of the request, so its PDF never changes
+            "ETag": f'"{job_id}"',
+            "Cache-Control": "private, max-age=3600",
+        }
+    )
+
+
 @app.route("/contact", methods=["POST", "OPTIONS"])
+@rate_limited("contact")
 def submit_contact_form():
     """Handle contact form submissions and send email to manager."""
     # Handle CORS preflight
@@ -446,28 +1209,27 @@ def submit_contact_form():
             'message': data.get('message', '').strip()
         }
         
-        print(f"📧 Contact form submission received from: {contact_data['name']}")
+        log.info("Contact form submission received", extra={"contact_name": contact_data['name']})
         
         # Send email to manager
-        email_sent = send_contact_form_to_manager(contact_data)
+        with load_shedder.slow_work():
+            email_sent = send_contact_form_to_manager(contact_data)
         
         if email_sent:
-            print(f"✅ Contact form email sent successfully to manager")
+            log.info("Contact form email sent to manager")
             return jsonify({
                 "success": True,
                 "message": "Thank you! Your message has been sent successfully. We'll get back to you soon."
             }), 200
         else:
-            print(f"⚠️ Failed to send contact form email")
+            log.warning("Failed to send contact form email")
             return jsonify({
                 "success": False,
                 "message": "Message received but email notification failed. We'll still review your message."
             }), 200
             
     except Exception as e:
-        print(f"❌ Contact form error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Contact form error")
         return jsonify({"error": f"Failed to process contact form: {str(e)}"}), 500
 
 
@@ -476,7 +1238,7 @@ if __name__ == "__main__":
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", 5000))
     
-    print(f"🚀 Starting server on http://{host}:{port}")
+    log.info("Starting server on http://%s:%s", host, port)
     
     # Disable auto-reloader on Windows to avoid intermittent WinError 10038 during restarts
     app.run(host=host, port=port, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,18 @@
+"""
+Move old Delivered/Cancelled orders from `orders` into `orders_archive`.
+
+Safe to run repeatedly (e.g. nightly as a cron job) and to interrupt: each
+run picks up whatever is still eligible in the live collection.
+
+Usage: python archive_orders.py [older_than_days]
+"""
+import sys
+
+from model.archive_model import ARCHIVE_AFTER_DAYS
+from model.order_model import archive_old_orders
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_DAYS
+    print(f"\n📦 Archiving Delivered/Cancelled orders delivered more than {days} days ago...")
+    result = archive_old_orders(days)
+    print(f"✅ Archived {result['archived']} order(s) in {result['batches']} batch(es), delivered before {result['before']}")
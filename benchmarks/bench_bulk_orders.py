@@ -0,0 +1,98 @@
+"""
+Benchmark: one-at-a-time order placement vs bulk import.
+
+Places N synthetic orders (default 10,000) through place_order() one by one
+and through bulk_place_orders() in a single call, against a scratch
+database, and prints orders/second for each path.
+
+Usage:
+    python benchmarks/bench_bulk_orders.py [N]
+
+Uses BENCH_MONGO_URI (or MONGO_URI). The app's database is switched to
+'sweet_store_bench' before the models are imported, so every collection and
+index the run touches lives there; that database is dropped afterwards.
+"""
+import copy
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DB_NAME = "sweet_store_bench"
+# Must happen before model.db is imported: the models create their indexes on import
+os.environ["MONGO_URI"] = os.getenv("BENCH_MONGO_URI") or os.getenv("MONGO_URI") or "mongodb://127.0.0.1:27017"
+os.environ["MONGO_DB_NAME"] = BENCH_DB_NAME
+
+from model.db import db
+import model.order_model as order_model
+import model.sweet_model as sweet_model
+from utils.stores import DEFAULT_STORE_ID
+
+
+def bench_db():
+    """The scratch database, refusing to run against anything else."""
+    if db is None:
+        sys.exit("MongoDB is not reachable")
+    if db.name != BENCH_DB_NAME:
+        sys.exit(f"Refusing to run against database {db.name!r}")
+    return db
+
+
+def make_orders(n, kaju_id, jalebi_id):
+    today = date.today()
+    orders = []
+    for i in range(n):
+        orders.append({
+            "customerName": f"Customer {i}",
+            "mobile": f"98{i:08d}",
+            "address": f"{i} Festival Street",
+            "orderDate": today.isoformat(),
+            "deliveryDate": (today + timedelta(days=i % 7)).isoformat(),
+            "items": [
+                {"sweetId": kaju_id, "sweetName": "Kaju Barfi", "quantity": 1 + i % 3, "unit": "kg", "price": 800},
+                {"sweetId": jalebi_id, "sweetName": "Jalebi", "quantity": 2, "unit": "kg", "price": 200},
+            ],
+            "total": 800 * (1 + i % 3) + 400,
+        })
+    return orders
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    scratch = bench_db()
+    collection = order_model.order_collection
+    sweets = sweet_model.sweet_collection
+    # Clear rather than drop, so the indexes the models created stay in place
+    sweets.delete_many({})
+    sweet_model.invalidate_price_index()
+    kaju_id = str(sweets.insert_one({"storeId": DEFAULT_STORE_ID, "name": "Kaju Barfi", "rate": 800.0, "unit": "kg"}).inserted_id)
+    jalebi_id = str(sweets.insert_one({"storeId": DEFAULT_STORE_ID, "name": "Jalebi", "rate": 200.0, "unit": "kg"}).inserted_id)
+
+    orders = make_orders(n, kaju_id, jalebi_id)
+
+    collection.delete_many({})
+    single = copy.deepcopy(orders)
+    start = time.perf_counter()
+    for order in single:
+        ok, err = order_model.validate_order_request(order)
+        if ok:
+            order_model.place_order(order)
+    single_s = time.perf_counter() - start
+
+    collection.delete_many({})
+    bulk = copy.deepcopy(orders)
+    start = time.perf_counter()
+    result = order_model.bulk_place_orders(bulk)
+    bulk_s = time.perf_counter() - start
+
+    scratch.client.drop_database(BENCH_DB_NAME)
+    print(f"Orders:        {n}")
+    print(f"insert_one:    {single_s:8.2f}s  {n / single_s:10.0f} orders/s")
+    print(f"insert_many:   {bulk_s:8.2f}s  {len(result['inserted']) / bulk_s:10.0f} orders/s")
+    print(f"Speed-up:      {single_s / bulk_s:8.1f}x  ({len(result['errors'])} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: JSON serialization and bytes on the wire for /sweets and /admin/orders.
+
+Builds a synthetic but realistic payload (a catalogue of sweets with inline
+base64 JPEG-sized images, and a list of orders), then compares stdlib json
+vs the orjson provider, and raw vs gzip vs brotli body sizes.
+
+Usage:
+    python benchmarks/bench_json_compression.py [SWEETS] [ORDERS]
+"""
+import base64
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from utils.compression import brotli, compress_bytes
+from utils.json_provider import dumps_bytes
+
+
+def make_catalogue(n, image_bytes=60_000):
+    rng = random.Random(42)
+    sweets = []
+    for i in range(n):
+        # Random bytes stand in for JPEG data, which is already compressed
+        image = base64.b64encode(rng.randbytes(image_bytes)).decode("ascii")
+        sweets.append({
+            "_id": ObjectId(),
+            "name": f"Sweet {i}",
+            "rate": float(200 + i * 10),
+            "description": "Made fresh every morning with pure ghee and dry fruits. " * 2,
+            "image": f"data:image/jpeg;base64,{image}",
+            "category": ["Barfi", "Ladoo", "Halwa", "Namkeen"][i % 4],
+            "unit": "kg" if i % 3 else "piece",
+            "isFestival": i % 5 == 0,
+        })
+    return sweets
+
+
+def make_orders(n):
+    now = datetime.now()
+    orders = []
+    for i in range(n):
+        orders.append({
+            "_id": ObjectId(),
+            "customerName": f"Customer {i}",
+            "mobile": f"98{i:08d}",
+            "address": f"{i} Festival Street, Old City",
+            "orderDate": now.strftime("%Y-%m-%d"),
+            "deliveryDate": (now + timedelta(days=i % 7)).strftime("%Y-%m-%d"),
+            "createdAt": now,
+            "updatedAt": now,
+            "status": "Pending",
+            "advancePaid": 100.0,
+            "total": 1200.0,
+            "items": [
+                {"sweetId": str(ObjectId()), "sweetName": "Kaju Barfi", "quantity": 1.0, "unit": "kg", "price": 800.0, "lineTotal": 800.0},
+                {"sweetId": str(ObjectId()), "sweetName": "Jalebi", "quantity": 2.0, "unit": "kg", "price": 200.0, "lineTotal": 400.0},
+            ],
+        })
+    return orders
+
+
+def stdlib_dumps(docs):
+    # What the old code path did: copy, stringify _id/datetimes, then json.dumps
+    out = []
+    for d in docs:
+        d = dict(d)
+        d["_id"] = str(d["_id"])
+        for k in ("createdAt", "updatedAt"):
+            if isinstance(d.get(k), datetime):
+                d[k] = d[k].strftime("%Y-%m-%d %H:%M:%S")
+        out.append(d)
+    return json.dumps(out).encode("utf-8")
+
+
+def timeit(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(label, docs):
+    std_s, std_body = timeit(lambda: stdlib_dumps(docs))
+    orj_s, orj_body = timeit(lambda: dumps_bytes(docs))
+    print(f"\n{label}")
+    print(f"  stdlib json:  {std_s * 1000:9.2f} ms  {len(std_body):>12,} bytes")
+    print(f"  orjson:       {orj_s * 1000:9.2f} ms  {len(orj_body):>12,} bytes  ({std_s / orj_s:.1f}x faster)")
+    gz_s, gz_body = timeit(lambda: compress_bytes(orj_body, "gzip"), repeat=3)
+    print(f"  gzip:         {gz_s * 1000:9.2f} ms  {len(gz_body):>12,} bytes  ({len(gz_body) / len(orj_body):.0%} of raw)")
+    if brotli is not None:
+        br_s, br_body = timeit(lambda: compress_bytes(orj_body, "br"), repeat=3)
+        print(f"  brotli:       {br_s * 1000:9.2f} ms  {len(br_body):>12,} bytes  ({len(br_body) / len(orj_body):.0%} of raw)")
+
+
+def main():
+    n_sweets = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    n_orders = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    report(f"/sweets ({n_sweets} sweets with inline images)", make_catalogue(n_sweets))
+    report(f"/admin/orders ({n_orders} orders)", make_orders(n_orders))
+
+
+if __name__ == "__main__":
+    main()
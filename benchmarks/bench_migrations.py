@@ -0,0 +1,105 @@
+"""
+Benchmark: schema migration throughput and resumability.
+
+Seeds a scratch database with N legacy orders (default 200,000; items
+without unit/quantity) and a legacy catalogue, then times run_migrations()
+and reports documents/second. A second run checks that an already
+migrated database is a no-op, and a third simulates a crash halfway
+through to show the run resumes from its checkpoint.
+
+Usage:
+    python benchmarks/bench_migrations.py [N] [BATCH_SIZE]
+
+Uses MONGO_URI (or BENCH_MONGO_URI); writes only to the 'sweet_store_bench' db.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from model import migrations
+
+
+def seed(database, n):
+    database["sweets"].drop()
+    database["orders"].drop()
+    database["orders_archive"].drop()
+    database["schema_migrations"].drop()
+    sweets = [
+        {"name": "Kaju Barfi", "rate": 800.0, "image_url": "data:image/png;base64,AAAA"},
+        {"name": "Rasgulla", "rate": 20.0, "unit": "piece", "imageUrl": "data:image/png;base64,BBBB"},
+        {"name": "Jalebi", "rate": 200.0, "category": "Fried"},
+    ]
+    ids = database["sweets"].insert_many(sweets).inserted_ids
+    batch = []
+    for i in range(n):
+        batch.append({
+            "customerName": f"Customer {i}",
+            "mobile": f"98{i:08d}",
+            "orderDate": "2024-10-01",
+            "deliveryDate": "2024-10-02",
+            "items": [
+                {"sweetId": str(ids[0]), "sweetName": "Kaju Barfi", "price": 800},
+                {"sweetId": str(ids[1]), "sweetName": "Rasgulla", "quantity": 10, "price": 20},
+                {"sweetName": "Jalebi", "quantity": 2, "unit": "kg", "price": 200},
+            ],
+            "total": 1400,
+        })
+        if len(batch) == 10000:
+            database["orders"].insert_many(batch)
+            batch = []
+    if batch:
+        database["orders"].insert_many(batch)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else migrations.MIGRATION_BATCH_SIZE
+    uri = os.getenv("BENCH_MONGO_URI") or os.getenv("MONGO_URI") or "mongodb://127.0.0.1:27017"
+    database = MongoClient(uri, serverSelectionTimeoutMS=5000)["sweet_store_bench"]
+
+    seed(database, n)
+    start = time.perf_counter()
+    results = migrations.run_migrations(database, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"full run:   {sum(results.values()):>8} docs in {elapsed:6.2f}s  "
+          f"({sum(results.values()) / elapsed:,.0f} docs/s, batch {batch_size})")
+
+    start = time.perf_counter()
+    results = migrations.run_migrations(database, batch_size=batch_size)
+    print(f"rerun:      {sum(results.values()):>8} docs in {time.perf_counter() - start:6.2f}s  (should be 0)")
+
+    # Crash halfway through the orders step, then resume with a normal run
+    seed(database, n)
+    orders = database["orders"]
+    step = next(m for m in migrations.MIGRATIONS if m.key == "orders:v1")
+    seen = {"docs": 0}
+
+    class Crash(Exception):
+        pass
+
+    def crashing(doc, context):
+        seen["docs"] += 1
+        if seen["docs"] > n // 2:
+            raise Crash()
+        return step.transform(doc, context)
+
+    try:
+        migrations._run_step(database, migrations.Migration(step.collection, step.version, step.name, crashing, step.prepare), batch_size)
+    except Crash:
+        pass
+    left = orders.count_documents({"schema_version": {"$exists": False}})
+    start = time.perf_counter()
+    results = migrations.run_migrations(database, batch_size=batch_size)
+    print(f"resume:     {results['orders:v1']:>8} docs in {time.perf_counter() - start:6.2f}s  "
+          f"({left} were left after the simulated crash)")
+
+    sample = orders.find_one()
+    assert all("unit" in item and "quantity" in item for item in sample["items"]), sample
+    assert orders.count_documents({"schema_version": {"$exists": False}}) == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: direct order placement vs the buffered (write-behind) intake.
+
+Places N synthetic orders (default 5,000) from T threads (default 16), as
+concurrent /place_order requests would, first through place_order() (one
+insert_one each) and then through OrderIntakeBuffer.submit() (fsynced log
+append, acknowledged before the insert). For the buffered mode it prints
+both the acknowledged rate and the rate until every order was in Mongo.
+The inline invoice PDF/email that direct mode also does per request is
+not included, so the real gap is larger.
+
+Usage:
+    python benchmarks/bench_order_intake.py [N] [THREADS]
+
+Uses the scratch 'sweet_store_bench' database the same way as
+bench_bulk_orders.py (dropped afterwards). The intake log goes to a temporary directory on the current disk.
+"""
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Points the app at the scratch database; must come before any model import
+from bench_bulk_orders import BENCH_DB_NAME, bench_db, make_orders
+import model.order_model as order_model
+import model.sweet_model as sweet_model
+from utils.order_intake import OrderIntakeBuffer
+from utils.stores import DEFAULT_STORE_ID
+
+
+def run_threads(orders, threads, place):
+    """Call place(order) for every order from `threads` threads; returns seconds taken."""
+    chunks = [orders[i::threads] for i in range(threads)]
+
+    def work(chunk):
+        for order in chunk:
+            place(order)
+
+    workers = [threading.Thread(target=work, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    scratch = bench_db()
+    collection = order_model.order_collection
+    sweets = sweet_model.sweet_collection
+    sweets.delete_many({})
+    sweet_model.invalidate_price_index()
+    kaju_id = str(sweets.insert_one({"storeId": DEFAULT_STORE_ID, "name": "Kaju Barfi", "rate": 800.0, "unit": "kg"}).inserted_id)
+    jalebi_id = str(sweets.insert_one({"storeId": DEFAULT_STORE_ID, "name": "Jalebi", "rate": 200.0, "unit": "kg"}).inserted_id)
+
+    orders = make_orders(n, kaju_id, jalebi_id)
+
+    collection.delete_many({})
+    direct_s = run_threads(copy.deepcopy(orders), threads, order_model.place_order)
+
+    collection.delete_many({})
+    log_dir = tempfile.mkdtemp(prefix="bench_intake_")
+    intake = OrderIntakeBuffer(mode="buffered", directory=log_dir)
+    intake.start()
+    start = time.perf_counter()
+    acked_s = run_threads(copy.deepcopy(orders), threads, intake.submit)
+    while intake.pending():
+        time.sleep(0.01)
+    while collection.estimated_document_count() < n:
+        time.sleep(0.01)
+    stored_s = time.perf_counter() - start
+
+    scratch.client.drop_database(BENCH_DB_NAME)
+    shutil.rmtree(log_dir, ignore_errors=True)
+    print(f"Orders:             {n} from {threads} threads")
+    print(f"direct insert_one:  {direct_s:8.2f}s  {n / direct_s:10.0f} orders/s")
+    print(f"buffered (acked):   {acked_s:8.2f}s  {n / acked_s:10.0f} orders/s  ({direct_s / acked_s:.1f}x)")
+    print(f"buffered (stored):  {stored_s:8.2f}s  {n / stored_s:10.0f} orders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: in-memory sweet search lookup latency.
+
+Builds the search index over a synthetic catalogue and times a mix of
+exact, prefix (autocomplete) and misspelt queries. Target: well under a
+millisecond per lookup.
+
+Usage:
+    python benchmarks/bench_search.py [SWEETS] [QUERIES]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from utils.search_index import SweetSearchIndex
+
+BASES = ["Kaju", "Badam", "Pista", "Coconut", "Besan", "Motichoor", "Boondi", "Rava", "Malai", "Kesar",
+         "Chocolate", "Mango", "Gulab", "Rasgulla", "Sandesh", "Peda", "Jalebi", "Imarti", "Soan", "Milk"]
+KINDS = ["Barfi", "Ladoo", "Katli", "Halwa", "Peda", "Roll", "Cake", "Papdi", "Jamun", "Kalakand"]
+CATEGORIES = ["Barfi", "Ladoo", "Bengali Sweets", "Dry Fruit", "Festival Special", "Namkeen"]
+QUERIES = ["kaju", "kaj", "barfi", "barfy", "kaju barfi", "kaju bar", "ladoo", "laddo", "motichor",
+           "gulab jam", "festival", "chocolat", "dry fruit", "rasgula", "xyz", "b"]
+
+
+def make_catalogue(n):
+    rng = random.Random(7)
+    docs = []
+    for i in range(n):
+        base, kind = rng.choice(BASES), rng.choice(KINDS)
+        docs.append({
+            "_id": ObjectId(),
+            "name": f"{base} {kind}" + (f" {i}" if i >= len(BASES) * len(KINDS) else ""),
+            "category": rng.choice(CATEGORIES),
+            "description": f"Fresh {base.lower()} {kind.lower()} made with pure ghee, sugar and cardamom.",
+            "rate": float(rng.randint(200, 1500)),
+            "unit": rng.choice(["kg", "piece"]),
+        })
+    return docs
+
+
+def main():
+    n_sweets = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    docs = make_catalogue(n_sweets)
+
+    start = time.perf_counter()
+    index = SweetSearchIndex(docs)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = [QUERIES[i % len(QUERIES)] for i in range(n_queries)]
+    timings = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q, 10)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1e6
+
+    print(f"Catalogue:   {n_sweets} sweets, index built in {build_ms:.1f} ms")
+    print(f"Queries:     {n_queries}")
+    print(f"Latency:     p50 {pct(0.50):.1f} us   p95 {pct(0.95):.1f} us   p99 {pct(0.99):.1f} us   max {timings[-1] * 1e6:.1f} us")
+    for q in ("kaj", "barfy", "kaju bar", "rasgula"):
+        print(f"  {q!r:12} -> {[r['name'] for r in index.search(q, 3)]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,11 @@ import os
 # Bind to the port that Render provides
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
 
-# Worker processes
+# Worker processes. Threaded workers so long-lived SSE streams
+# (/admin/orders/stream) hold a thread each instead of a whole worker
 workers = 2
-worker_class = "sync"
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
 worker_connections = 1000
 timeout = 120
 keepalive = 5
@@ -0,0 +1,31 @@
+"""
+Bring stored sweets and orders up to the current schema version.
+
+Run once after deploying a release that adds a migration step. Safe to
+interrupt and rerun: finished batches are checkpointed and already
+migrated documents are skipped.
+
+Usage: python migrate.py [--status]
+"""
+import sys
+
+from model.migrations import run_migrations, pending_migrations
+from model.sweet_model import sweet_collection, touch_catalogue
+
+if __name__ == "__main__":
+    pending = pending_migrations()
+    if "--status" in sys.argv:
+        print(f"\n📋 Pending migrations: {', '.join(pending) if pending else 'none'}")
+        sys.exit(0)
+    if not pending:
+        print("\n✅ Schema is up to date.")
+        sys.exit(0)
+    print(f"\n🔄 Running migrations: {', '.join(pending)}")
+    results = run_migrations()
+    for key, count in results.items():
+        print(f"  {key}: {count} document(s) migrated")
+    if any(key.startswith("sweets:") and count for key, count in results.items()):
+        # Catalogue snapshots are keyed on the version; make workers re-render them
+        for store_id in sweet_collection.distinct("storeId"):
+            touch_catalogue(store_id)
+    print("\n✅ Done!")
@@ -0,0 +1,60 @@
+import os
+from datetime import datetime
+from utils.logger import get_logger
+from model.db import db, analytics_db
+
+log = get_logger(__name__)
+
+# Cold tier for finished orders. Delivered/Cancelled orders whose delivery
+# date is older than ARCHIVE_AFTER_DAYS are moved here by the archival job,
+# keeping the live "orders" collection (and its indexes) small enough to stay
+# in RAM. The watermark records the delivery date before which orders may
+# live in the archive, so reads only touch this collection when their date
+# range reaches back past it.
+archive_collection = db["orders_archive"] if db is not None else None
+archive_state_collection = db["archive_state"] if db is not None else None
+archive_analytics_collection = analytics_db["orders_archive"] if analytics_db is not None else None
+
+ARCHIVE_AFTER_DAYS = max(1, int(os.getenv("ARCHIVE_AFTER_DAYS", 90)))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+ARCHIVE_STATUSES = ["Delivered", "Cancelled"]
+
+_WATERMARK_ID = "orders"
+
+if archive_collection is not None:
+    try:
+        # Same read paths as the live collection
+        archive_collection.create_index([("storeId", 1), ("deliveryDate", 1), ("status", 1)])
+        archive_collection.create_index([("storeId", 1), ("mobile", 1), ("createdAt", -1)])
+    except Exception as e:
+        log.warning("Could not create orders_archive indexes: %s", e)
+
+def get_archive_watermark():
+    """Delivery date (YYYY-MM-DD) before which orders may be archived, or None
+    if nothing was ever archived. Read fresh each time (a primary-key lookup)
+    so no worker misses orders another worker has just moved.
+    """
+    if archive_state_collection is None:
+        return None
+    doc = archive_state_collection.find_one({"_id": _WATERMARK_ID})
+    return doc.get("archivedBefore") if doc else None
+
+def raise_archive_watermark(day):
+    """Move the watermark forward to day (never backwards).
+    Called before any order is moved, so readers include the archive as soon
+    as it might hold something they ask for.
+    """
+    if archive_state_collection is None:
+        raise RuntimeError("Database not connected: cannot archive orders")
+    archive_state_collection.update_one(
+        {"_id": _WATERMARK_ID},
+        {"$max": {"archivedBefore": day}, "$set": {"updatedAt": datetime.now()}},
+        upsert=True
+    )
+
+def archive_needed(from_date):
+    """Whether a read starting at from_date (None = unbounded) must include the archive."""
+    watermark = get_archive_watermark()
+    if watermark is None or archive_collection is None:
+        return False
+    return from_date is None or str(from_date) < watermark
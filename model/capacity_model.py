@@ -0,0 +1,262 @@
+from pymongo import UpdateOne
+import os
+from dotenv import load_dotenv
+from datetime import datetime
+from utils.logger import get_logger
+from utils.stores import current_store_id
+from model.db import db
+from model.migrations import CAPACITY_SCHEMA_VERSION
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+# Production capacity counters, one document per (storeId, deliveryDate, scope):
+#   "<storeId>|<date>|*"          day totals: reservedKg/limitKg and reservedPieces/limitPieces
+#   "<storeId>|<date>|<sweetId>"  per sweet: reserved/limit in that sweet's own unit
+# A limit of None means unlimited. Reservations are conditional $inc updates,
+# so concurrent workers can never push a counter past its limit.
+capacity_collection = db["capacity"] if db is not None else None
+
+def _env_limit(name):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        log.warning("Ignoring invalid %s=%r", name, value)
+        return None
+
+# Defaults applied the first time a date is touched; admins can override per date
+DEFAULT_DAILY_KG_LIMIT = _env_limit("CAPACITY_DAILY_KG")
+DEFAULT_DAILY_PIECES_LIMIT = _env_limit("CAPACITY_DAILY_PIECES")
+
+if capacity_collection is not None:
+    try:
+        # Replaces the store-less "date_1" index
+        if "date_1" in capacity_collection.index_information():
+            capacity_collection.drop_index("date_1")
+        capacity_collection.create_index([("storeId", 1), ("date", 1)])
+    except Exception as e:
+        log.warning("Could not create capacity index: %s", e)
+
+class CapacityExceededError(ValueError):
+    """Raised when an order would exceed the kitchen's capacity for its delivery date."""
+
+def _day_id(store_id, day):
+    return f"{store_id}|{day}|*"
+
+def _sweet_id(store_id, day, sweet_id):
+    return f"{store_id}|{day}|{sweet_id}"
+
+def order_capacity_needs(order):
+    """Compute the counter increments an order needs.
+    Returns {(storeId, deliveryDate, sweetId or "*", unit): quantity}; the "*"
+    entries are the day totals per unit.
+    """
+    store_id = order.get("storeId") or current_store_id()
+    day = order.get("deliveryDate")
+    needs = {}
+    if not day:
+        return needs
+    for item in order.get("items", []) or []:
+        try:
+            qty = float(item.get("quantity", 0) or 0)
+        except (ValueError, TypeError):
+            continue
+        if qty <= 0:
+            continue
+        unit = item.get("unit") or "kg"
+        sweet_key = (store_id, day, str(item.get("sweetId")), unit)
+        day_key = (store_id, day, "*", unit)
+        needs[sweet_key] = needs.get(sweet_key, 0) + qty
+        needs[day_key] = needs.get(day_key, 0) + qty
+    return needs
+
+def _diff_needs(old, new):
+    """Per-counter change needed to move from one reservation to another."""
+    delta = {}
+    for key in set(old) | set(new):
+        change = new.get(key, 0) - old.get(key, 0)
+        if abs(change) > 1e-9:
+            delta[key] = change
+    return delta
+
+def _counter_target(key):
+    """Map a needs key to (document _id, reserved field, limit field)."""
+    store_id, day, sweet, unit = key
+    if sweet == "*":
+        suffix = "Kg" if unit == "kg" else "Pieces"
+        return _day_id(store_id, day), f"reserved{suffix}", f"limit{suffix}"
+    return _sweet_id(store_id, day, sweet), "reserved", "limit"
+
+def _ensure_counters(keys):
+    """Create any missing counter documents with the default limits."""
+    ops = []
+    now = datetime.now()
+    for store_id, day in {k[:2] for k in keys}:
+        ops.append(UpdateOne(
+            {"_id": _day_id(store_id, day)},
+            {"$setOnInsert": {
+                "storeId": store_id, "date": day, "sweetId": None,
+                "reservedKg": 0.0, "limitKg": DEFAULT_DAILY_KG_LIMIT,
+                "reservedPieces": 0.0, "limitPieces": DEFAULT_DAILY_PIECES_LIMIT,
+                "createdAt": now, "schema_version": CAPACITY_SCHEMA_VERSION,
+            }},
+            upsert=True
+        ))
+    for store_id, day, sweet, unit in keys:
+        if sweet == "*":
+            continue
+        ops.append(UpdateOne(
+            {"_id": _sweet_id(store_id, day, sweet)},
+            {
+                "$set": {"unit": unit},
+                "$setOnInsert": {
+                    "storeId": store_id, "date": day, "sweetId": sweet, "reserved": 0.0, "limit": None,
+                    "createdAt": now, "schema_version": CAPACITY_SCHEMA_VERSION,
+                },
+            },
+            upsert=True
+        ))
+    if ops:
+        capacity_collection.bulk_write(ops, ordered=False)
+
+def _apply_delta(delta):
+    """Apply counter changes atomically per counter, all-or-nothing per call.
+    Increments are conditional on staying within the limit; if any fails,
+    the increments already applied are rolled back and CapacityExceededError
+    is raised. Decrements always succeed.
+    """
+    if not delta:
+        return
+    _ensure_counters(list(delta))
+
+    applied = []
+    # Release first so a shrinking edit frees room before anything grows
+    for key, change in sorted(delta.items(), key=lambda kv: kv[1]):
+        doc_id, reserved_field, limit_field = _counter_target(key)
+        if change < 0:
+            capacity_collection.update_one({"_id": doc_id}, {"$inc": {reserved_field: change}})
+            applied.append((doc_id, reserved_field, change))
+            continue
+        result = capacity_collection.update_one(
+            {
+                "_id": doc_id,
+                "$or": [
+                    {limit_field: None},
+                    {"$expr": {"$lte": [{"$add": [f"${reserved_field}", change]}, f"${limit_field}"]}},
+                ],
+            },
+            {"$inc": {reserved_field: change}}
+        )
+        if result.modified_count == 0:
+            for undo_id, undo_field, undo_change in applied:
+                capacity_collection.update_one({"_id": undo_id}, {"$inc": {undo_field: -undo_change}})
+            _, day, sweet, unit = key
+            what = "kg" if unit == "kg" else "pieces"
+            if sweet != "*":
+                what += " of this sweet"
+            raise CapacityExceededError(f"Not enough capacity left for {day} ({what}). Please choose another delivery date.")
+        applied.append((doc_id, reserved_field, change))
+
+def reserve_order_capacity(order):
+    """Reserve production capacity for a new order. Raises CapacityExceededError."""
+    if capacity_collection is None:
+        raise RuntimeError("Database not connected: cannot reserve capacity")
+    _apply_delta(order_capacity_needs(order))
+
+def release_order_capacity(order):
+    """Give back the capacity held by an order (e.g. on cancellation)."""
+    if capacity_collection is None:
+        raise RuntimeError("Database not connected: cannot release capacity")
+    needs = order_capacity_needs(order)
+    _apply_delta({k: -v for k, v in needs.items()})
+
+def adjust_order_capacity(old_order, new_order):
+    """Move an order's reservation to its edited items/date. Raises CapacityExceededError."""
+    if capacity_collection is None:
+        raise RuntimeError("Database not connected: cannot adjust capacity")
+    _apply_delta(_diff_needs(order_capacity_needs(old_order), order_capacity_needs(new_order)))
+
+def set_capacity_limits(day, limit_kg=None, limit_pieces=None, sweet_limits=None):
+    """Set the current store's capacity limits for a delivery date.
+    limit_kg / limit_pieces cap the day's totals; sweet_limits maps sweetId to
+    a limit in that sweet's unit. Pass None for a limit to make it unlimited.
+    """
+    if capacity_collection is None:
+        raise RuntimeError("Database not connected: cannot set capacity")
+    store_id = current_store_id()
+    now = datetime.now()
+    ops = [UpdateOne(
+        {"_id": _day_id(store_id, day)},
+        {
+            "$set": {"limitKg": limit_kg, "limitPieces": limit_pieces, "updatedAt": now},
+            "$setOnInsert": {
+                "storeId": store_id, "date": day, "sweetId": None, "reservedKg": 0.0, "reservedPieces": 0.0,
+                "createdAt": now, "schema_version": CAPACITY_SCHEMA_VERSION,
+            },
+        },
+        upsert=True
+    )]
+    for sweet_id, limit in (sweet_limits or {}).items():
+        ops.append(UpdateOne(
+            {"_id": _sweet_id(store_id, day, sweet_id)},
+            {
+                "$set": {"limit": limit, "updatedAt": now},
+                "$setOnInsert": {
+                    "storeId": store_id, "date": day, "sweetId": str(sweet_id), "reserved": 0.0,
+                    "createdAt": now, "schema_version": CAPACITY_SCHEMA_VERSION,
+                },
+            },
+            upsert=True
+        ))
+    capacity_collection.bulk_write(ops, ordered=False)
+
+def _remaining(reserved, limit):
+    if limit is None:
+        return None
+    return round(max(limit - reserved, 0), 3)
+
+def get_availability(from_date, to_date):
+    """Read the current store's capacity counters for a date range (inclusive, YYYY-MM-DD strings).
+    Uses the counters only; orders are never scanned. Dates nobody has ordered
+    for yet are reported with the default limits.
+    """
+    if capacity_collection is None:
+        return []
+    days = {}
+    for doc in capacity_collection.find({"storeId": current_store_id(), "date": {"$gte": from_date, "$lte": to_date}}):
+        day = days.setdefault(doc["date"], {"date": doc["date"], "sweets": {}})
+        if doc.get("sweetId") is None:
+            day["kg"] = {
+                "reserved": doc.get("reservedKg", 0),
+                "limit": doc.get("limitKg"),
+                "remaining": _remaining(doc.get("reservedKg", 0), doc.get("limitKg")),
+            }
+            day["pieces"] = {
+                "reserved": doc.get("reservedPieces", 0),
+                "limit": doc.get("limitPieces"),
+                "remaining": _remaining(doc.get("reservedPieces", 0), doc.get("limitPieces")),
+            }
+        else:
+            day["sweets"][doc["sweetId"]] = {
+                "unit": doc.get("unit"),
+                "reserved": doc.get("reserved", 0),
+                "limit": doc.get("limit"),
+                "remaining": _remaining(doc.get("reserved", 0), doc.get("limit")),
+            }
+
+    defaults_kg = {"reserved": 0, "limit": DEFAULT_DAILY_KG_LIMIT, "remaining": DEFAULT_DAILY_KG_LIMIT}
+    defaults_pieces = {"reserved": 0, "limit": DEFAULT_DAILY_PIECES_LIMIT, "remaining": DEFAULT_DAILY_PIECES_LIMIT}
+    result = []
+    start = datetime.strptime(from_date, "%Y-%m-%d").date()
+    end = datetime.strptime(to_date, "%Y-%m-%d").date()
+    for ordinal in range(start.toordinal(), end.toordinal() + 1):
+        key = datetime.fromordinal(ordinal).strftime("%Y-%m-%d")
+        day = days.get(key, {"date": key, "sweets": {}})
+        day.setdefault("kg", dict(defaults_kg))
+        day.setdefault("pieces", dict(defaults_pieces))
+        result.append(day)
+    return result
@@ -0,0 +1,140 @@
+from pymongo import UpdateOne, DESCENDING
+import re
+from datetime import datetime
+from utils.logger import get_logger
+from utils.stores import current_store_id
+from model.db import db, analytics_db
+from model.migrations import CUSTOMER_SCHEMA_VERSION
+
+log = get_logger(__name__)
+
+# One profile per customer and store, keyed "<storeId>|<normalized mobile>"
+# (_id), holding running totals so repeat customers can be looked up without
+# scanning orders.
+customer_collection = db["customers"] if db is not None else None
+customer_analytics_collection = analytics_db["customers"] if analytics_db is not None else None
+
+if customer_collection is not None:
+    try:
+        # Replaced by the storeId-led indexes below
+        existing = customer_collection.index_information()
+        for old_index in ("nameNgrams_1", "nameKey_1"):
+            if old_index in existing:
+                customer_collection.drop_index(old_index)
+        # Multikey index over name trigrams for substring search, plus prefix search on the key
+        customer_collection.create_index([("storeId", 1), ("nameNgrams", 1)])
+        customer_collection.create_index([("storeId", 1), ("nameKey", 1)])
+    except Exception as e:
+        log.warning("Could not create customer indexes: %s", e)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+def normalize_mobile(mobile):
+    """Strip spaces, dashes and brackets from a phone number, keeping a leading '+'."""
+    if mobile is None:
+        return ""
+    text = str(mobile).strip()
+    digits = re.sub(r"\D", "", text)
+    if not digits:
+        return ""
+    return f"+{digits}" if text.startswith("+") else digits
+
+def normalize_name(name):
+    """Lowercase, drop punctuation and collapse whitespace for name matching."""
+    text = _NON_ALNUM.sub(" ", str(name or "").lower())
+    return _SPACES.sub(" ", text).strip()
+
+def name_ngrams(name_key):
+    """Distinct character trigrams of each word of a normalized name."""
+    grams = set()
+    for word in name_key.split():
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return sorted(grams)
+
+def _customer_id(store_id, mobile):
+    return f"{store_id}|{mobile}"
+
+def _order_amount(order):
+    try:
+        return float(order.get("total", 0) or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+def _profile_update(store_id, mobile, orders):
+    """Build the upsert that folds a customer's new orders into their profile."""
+    latest = max(orders, key=lambda o: o.get("createdAt") or datetime.min)
+    name = latest.get("customerName") or ""
+    name_key = normalize_name(name)
+    return UpdateOne(
+        {"_id": _customer_id(store_id, mobile)},
+        {
+            "$inc": {"orderCount": len(orders), "lifetimeSpend": sum(_order_amount(o) for o in orders)},
+            "$set": {
+                "storeId": store_id,
+                "mobile": mobile,
+                "name": name,
+                "nameKey": name_key,
+                "nameNgrams": name_ngrams(name_key),
+                "address": latest.get("address", ""),
+                "lastOrderId": latest.get("_id"),
+                "lastOrderAt": latest.get("createdAt"),
+                "lastOrderTotal": _order_amount(latest),
+            },
+            "$setOnInsert": {"firstOrderAt": latest.get("createdAt"), "schema_version": CUSTOMER_SCHEMA_VERSION},
+        },
+        upsert=True
+    )
+
+def record_customer_orders(orders):
+    """Upsert customer profiles for newly placed orders in one bulk write.
+    Orders without a mobile number are skipped.
+    """
+    if customer_collection is None:
+        return
+    by_customer = {}
+    for order in orders:
+        mobile = normalize_mobile(order.get("mobile"))
+        if mobile:
+            by_customer.setdefault((order.get("storeId") or current_store_id(), mobile), []).append(order)
+    if not by_customer:
+        return
+    customer_collection.bulk_write([_profile_update(s, m, o) for (s, m), o in by_customer.items()], ordered=False)
+
+def forget_customer_order(order):
+    """Take a cancelled order back out of its customer's running totals."""
+    if customer_collection is None:
+        return
+    mobile = normalize_mobile(order.get("mobile"))
+    if not mobile:
+        return
+    customer_collection.update_one(
+        {"_id": _customer_id(order.get("storeId") or current_store_id(), mobile)},
+        {"$inc": {"orderCount": -1, "lifetimeSpend": -_order_amount(order)}}
+    )
+
+def get_customer(mobile):
+    """Fetch a customer profile of the current store by mobile number. Returns dict or None."""
+    if customer_collection is None:
+        return None
+    return customer_collection.find_one({"_id": _customer_id(current_store_id(), normalize_mobile(mobile))}, {"nameNgrams": 0})
+
+def search_customers(name, limit=20):
+    """Find the current store's customers whose name contains the given text.
+    Uses the trigram index when the input has a word of 3+ characters, and
+    an anchored prefix match on the normalized name for shorter input.
+    """
+    if customer_collection is None:
+        return []
+    name_key = normalize_name(name)
+    if not name_key:
+        return []
+    grams = name_ngrams(name_key)
+    if grams:
+        # Trigrams narrow the candidates via the index; the regex keeps only true substrings
+        query = {"storeId": current_store_id(), "nameNgrams": {"$all": grams}, "nameKey": re.compile(re.escape(name_key))}
+    else:
+        query = {"storeId": current_store_id(), "nameKey": re.compile("^" + re.escape(name_key))}
+    cursor = customer_analytics_collection.find(query, {"nameNgrams": 0}).sort("lastOrderAt", DESCENDING).limit(limit)
+    return list(cursor)
@@ -0,0 +1,80 @@
+from pymongo import MongoClient, ReadPreference
+from pymongo.read_preferences import Nearest, PrimaryPreferred, Secondary, SecondaryPreferred
+import os
+from dotenv import load_dotenv
+import ssl
+from utils.logger import get_logger
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+# Single MongoClient shared by every model module in this process
+
+MONGO_URI = os.getenv("MONGO_URI")
+if not MONGO_URI:
+    # Fallback to local Mongo for development so endpoints don't 500 when env is missing
+    MONGO_URI = "mongodb://127.0.0.1:27017"
+    log.warning("MONGO_URI not set; falling back to local MongoDB at mongodb://127.0.0.1:27017")
+
+# Force legacy OpenSSL provider for compatibility with MongoDB Atlas
+os.environ['OPENSSL_CONF'] = ''
+
+# Create SSL context with legacy settings
+ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+ssl_context.check_hostname = False
+ssl_context.verify_mode = ssl.CERT_NONE
+ssl_context.options |= 0x4  # OP_LEGACY_SERVER_CONNECT
+
+# MongoDB connection with safer TLS handling
+try:
+    mongo_kwargs = {
+        "serverSelectionTimeoutMS": 30000,
+    }
+    # Enable TLS only for SRV (Atlas) URIs or when explicitly provided in URI
+    if MONGO_URI.startswith("mongodb+srv://"):
+        mongo_kwargs["tls"] = True
+        # Optionally allow invalid certs via env toggle (default False)
+        if os.getenv("MONGO_TLS_ALLOW_INVALID", "false").lower() in ("1", "true", "yes"):
+            mongo_kwargs["tlsAllowInvalidCertificates"] = True
+    # IMPORTANT: Do not set tlsInsecure and tlsAllowInvalidCertificates together
+    client = MongoClient(MONGO_URI, **mongo_kwargs)
+    # Test the connection
+    client.admin.command('ping')
+    log.info("MongoDB connection successful")
+except Exception as e:
+    log.error("MongoDB connection error: %s", e)
+    client = None
+
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME") or "sweet_store"
+
+db = client[MONGO_DB_NAME] if client is not None else None
+
+# Read routing by operation class. Catalogue listings and admin analytics
+# (order lists, summaries, prep lists, exports) tolerate a little replication
+# lag, so they may be served by secondaries and stay off the primary that
+# takes checkout writes. Order placement and read-after-write paths keep
+# using `db` (primary). maxStalenessSeconds bounds how far behind a secondary
+# may be before it is skipped; MongoDB requires at least 90. On a standalone
+# server or a single-member replica set every read goes to that one host.
+READ_MAX_STALENESS_SECONDS = max(90, int(os.getenv("READ_MAX_STALENESS_SECONDS", 90)))
+
+_READ_MODES = {
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def read_preference(mode_name):
+    """Read preference for a mode name like "secondaryPreferred" ("primary" = no routing)."""
+    mode = _READ_MODES.get(str(mode_name or "primary").strip().lower())
+    if mode is None:
+        return ReadPreference.PRIMARY
+    return mode(max_staleness=READ_MAX_STALENESS_SECONDS)
+
+CATALOGUE_READ_PREFERENCE = read_preference(os.getenv("READ_PREFERENCE_CATALOGUE", "secondaryPreferred"))
+ANALYTICS_READ_PREFERENCE = read_preference(os.getenv("READ_PREFERENCE_ANALYTICS", "secondaryPreferred"))
+
+catalogue_db = db.with_options(read_preference=CATALOGUE_READ_PREFERENCE) if db is not None else None
+analytics_db = db.with_options(read_preference=ANALYTICS_READ_PREFERENCE) if db is not None else None
@@ -0,0 +1,102 @@
+from pymongo import ReturnDocument
+from pymongo.errors import CollectionInvalid
+import os
+from datetime import datetime, timedelta
+from utils.logger import get_logger
+from model.db import db
+
+log = get_logger(__name__)
+
+# Order change feed shared by all workers: a capped collection of small event
+# documents numbered by a global sequence, so clients can resume from the last
+# sequence they saw (SSE Last-Event-ID) and old events age out automatically.
+ORDER_EVENTS_CAPPED_BYTES = int(os.getenv("ORDER_EVENTS_CAPPED_BYTES", 16 * 1024 * 1024))
+# Sequence numbers are reserved before the insert, so a lower seq can land
+# after a higher one. Readers wait this long for a missing seq before taking it
+# as lost (publisher failed mid-way, or the event aged out of the capped feed).
+EVENT_GAP_WAIT_SECONDS = float(os.getenv("EVENT_GAP_WAIT_SECONDS", 5))
+EVENT_PAGE_SIZE = 500
+
+ORDER_CREATED = "order.created"
+ORDER_UPDATED = "order.updated"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+if db is not None:
+    try:
+        db.create_collection("order_events", capped=True, size=ORDER_EVENTS_CAPPED_BYTES)
+    except CollectionInvalid:
+        pass  # already exists
+    except Exception as e:
+        log.warning("Could not create order_events collection: %s", e)
+
+event_collection = db["order_events"] if db is not None else None
+counter_collection = db["counters"] if db is not None else None
+
+if event_collection is not None:
+    try:
+        event_collection.create_index("seq")
+    except Exception as e:
+        log.warning("Could not create order_events index: %s", e)
+
+# Fields sent with each event; enough for the dashboard to patch its list in place
+_EVENT_ORDER_FIELDS = (
+    "_id", "customerName", "mobile", "address", "status", "total", "advancePaid",
+    "orderDate", "deliveryDate", "createdAt", "updatedAt", "items", "preference",
+)
+
+def _allocate_seq(count):
+    """Reserve `count` consecutive sequence numbers; returns the first one."""
+    doc = counter_collection.find_one_and_update(
+        {"_id": "order_events"},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["seq"] - count + 1
+
+def publish_order_events(event_type, orders):
+    """Append one event per order to the shared feed. Never raises."""
+    if event_collection is None or not orders:
+        return
+    try:
+        first = _allocate_seq(len(orders))
+        now = datetime.now()
+        docs = []
+        for offset, order in enumerate(orders):
+            docs.append({
+                "seq": first + offset,
+                "type": event_type,
+                "storeId": order.get("storeId"),
+                "at": now,
+                "order": {k: order[k] for k in _EVENT_ORDER_FIELDS if k in order},
+            })
+        event_collection.insert_many(docs, ordered=True)
+    except Exception as e:
+        log.warning("Could not publish %s events: %s", event_type, e)
+
+def get_events_since(seq, limit=EVENT_PAGE_SIZE):
+    """Events with a sequence number greater than seq, oldest first.
+    The result ends before the first missing seq, so callers never move past an
+    event that is still being inserted; a gap followed by events older than
+    EVENT_GAP_WAIT_SECONDS is skipped. At most `limit` events are returned;
+    page by calling again with the last seq.
+    """
+    if event_collection is None:
+        return []
+    events = list(event_collection.find({"seq": {"$gt": seq}}, {"_id": 0}).sort("seq", 1).limit(limit))
+    settled_before = datetime.now() - timedelta(seconds=EVENT_GAP_WAIT_SECONDS)
+    expected = seq + 1
+    for i, event in enumerate(events):
+        if event["seq"] != expected:
+            if event.get("at") and event["at"] > settled_before:
+                return events[:i]
+            log.warning("Skipping missing order events %d-%d", expected, event["seq"] - 1)
+        expected = event["seq"] + 1
+    return events
+
+def get_latest_seq():
+    """Sequence number of the newest event (0 when the feed is empty)."""
+    if event_collection is None:
+        return 0
+    doc = event_collection.find_one({}, {"seq": 1}, sort=[("seq", -1)])
+    return doc["seq"] if doc else 0
@@ -0,0 +1,57 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from datetime import datetime
+from utils.logger import get_logger
+from model.db import db
+
+log = get_logger(__name__)
+
+# Uploaded sweet images live in GridFS (sweet_images.files / .chunks) so they
+# can be written and served in chunks instead of as base64 inside documents.
+# The image's sha256 is kept in the file metadata to deduplicate re-uploads.
+image_bucket = GridFSBucket(db, bucket_name="sweet_images") if db is not None else None
+image_files = db["sweet_images.files"] if db is not None else None
+
+if image_files is not None:
+    try:
+        image_files.create_index("metadata.sha256")
+    except Exception as e:
+        log.warning("Could not create sweet image index: %s", e)
+
+def open_image_upload(filename):
+    """Open a GridFS upload stream for a new image."""
+    if image_bucket is None:
+        raise RuntimeError("Database not connected: cannot store image")
+    return image_bucket.open_upload_stream(filename or "image")
+
+def save_uploaded_image(grid_in, info):
+    """Record metadata for a finished upload and return its image id.
+    If the same bytes were uploaded before, the new copy is deleted and
+    the existing image id is returned.
+    """
+    if image_files is None:
+        raise RuntimeError("Database not connected: cannot store image")
+    existing = image_files.find_one({"metadata.sha256": info["sha256"], "_id": {"$ne": grid_in._id}}, {"_id": 1})
+    if existing:
+        try:
+            image_bucket.delete(grid_in._id)
+        except Exception as e:
+            log.warning("Could not delete duplicate image %s: %s", grid_in._id, e)
+        log.info("Reusing identical image %s", existing["_id"])
+        return str(existing["_id"])
+    image_files.update_one(
+        {"_id": grid_in._id},
+        {"$set": {"metadata": dict(info, uploadedAt=datetime.now())}}
+    )
+    return str(grid_in._id)
+
+def open_image(image_id):
+    """Open a stored image for reading. Returns a GridOut or None."""
+    if image_bucket is None:
+        return None
+    try:
+        return image_bucket.open_download_stream(ObjectId(image_id))
+    except (InvalidId, TypeError, NoFile):
+        return None
@@ -0,0 +1,348 @@
+"""
+Versioned, resumable schema migrations for stored documents.
+
+Every migrated document carries a `schema_version`. A migration step brings
+documents of one collection from version N-1 to N with a pure transform;
+the runner walks the collection in _id order, in batches, and writes each
+batch with one bulk_write. Progress is checkpointed per step in the
+schema_migrations collection, so an interrupted run resumes after the last
+finished batch, and the schema_version guard on every update makes reruns
+harmless. New documents are written at the current version by the models,
+so read paths can trust stored documents as-is.
+
+Steps that change a document's _id (rekey) cannot update in place: the
+transform's update is upserted into the document at the new _id, merging
+with one the app may already have created there, and the old document is
+deleted. The new document records the old _id in migratedFrom, so a rerun
+after a crash between the two never merges the same document twice.
+
+Steps that derive a whole collection from another (rebuild) run once as a
+unit instead; they overwrite rather than add, so a rerun is harmless too.
+"""
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime
+from utils.logger import get_logger
+from utils.stores import DEFAULT_STORE_ID
+from model.db import db
+
+log = get_logger(__name__)
+
+MIGRATION_BATCH_SIZE = 1000
+
+SWEET_SCHEMA_VERSION = 2
+ORDER_SCHEMA_VERSION = 3
+CAPACITY_SCHEMA_VERSION = 2
+CUSTOMER_SCHEMA_VERSION = 3
+
+
+def _sweets_v1(doc, context):
+    """Fill defaults the read path used to patch in and fold the image aliases into 'image'."""
+    update = {"$set": {}, "$unset": {}}
+    if not doc.get("category"):
+        update["$set"]["category"] = "Uncategorized"
+    unit = str(doc.get("unit") or "").strip().lower()
+    if unit not in ("kg", "piece"):
+        update["$set"]["unit"] = "kg"
+    elif unit != doc.get("unit"):
+        update["$set"]["unit"] = unit
+    if "isFestival" not in doc:
+        update["$set"]["isFestival"] = False
+    if "image" not in doc:
+        update["$set"]["image"] = doc.get("image_url") or doc.get("imageUrl") or ""
+    for alias in ("image_url", "imageUrl"):
+        if alias in doc:
+            update["$unset"][alias] = ""
+    return update
+
+
+def _load_sweet_units(database):
+    """Catalogue units by sweet id and by name, for filling in legacy order items."""
+    units = {}
+    for sweet in database["sweets"].find({}, {"name": 1, "unit": 1}):
+        unit = sweet.get("unit") if sweet.get("unit") in ("kg", "piece") else "kg"
+        units[str(sweet["_id"])] = unit
+        if sweet.get("name"):
+            units.setdefault(("name", sweet["name"]), unit)
+    return units
+
+
+def _orders_v1(doc, context):
+    """Give every item a quantity and a unit (the catalogue's unit where known, else kg)."""
+    items = doc.get("items")
+    if not isinstance(items, list):
+        return {"$set": {}, "$unset": {}}
+    units = context["sweet_units"]
+    changed = False
+    fixed = []
+    for item in items:
+        if isinstance(item, dict):
+            item = dict(item)
+            if "quantity" not in item:
+                item["quantity"] = 1
+                changed = True
+            if not item.get("unit"):
+                item["unit"] = (units.get(str(item.get("sweetId")))
+                                or units.get(("name", item.get("sweetName") or item.get("name")))
+                                or "kg")
+                changed = True
+        fixed.append(item)
+    return {"$set": {"items": fixed} if changed else {}, "$unset": {}}
+
+
+def _default_store_v2(doc, context):
+    """Documents from before multi-store support belong to the default store."""
+    return {"$set": {} if doc.get("storeId") else {"storeId": DEFAULT_STORE_ID}, "$unset": {}}
+
+
+def _default_store_key(doc):
+    """Counters and profiles from before multi-store support, keyed under the default store."""
+    return f"{DEFAULT_STORE_ID}|{doc['_id']}"
+
+
+def _capacity_v2(doc, context):
+    """Fold a store-less capacity counter into the default store's counter.
+    Reservations add up with any the app made there since; limits an admin set
+    on the old counter win over the defaults the app filled in.
+    """
+    reserved = ("reserved",) if doc.get("sweetId") is not None else ("reservedKg", "reservedPieces")
+    limits = ("limit",) if doc.get("sweetId") is not None else ("limitKg", "limitPieces")
+    on_insert = {k: v for k, v in doc.items() if k not in ("_id", "schema_version", *reserved)}
+    on_insert["storeId"] = DEFAULT_STORE_ID
+    update = {"$set": {}, "$unset": {}, "$inc": {k: doc.get(k) or 0.0 for k in reserved}, "$setOnInsert": on_insert}
+    if doc.get("updatedAt"):
+        for field in limits:
+            update["$set"][field] = on_insert.pop(field, None)
+    return update
+
+
+def _customers_v2(doc, context):
+    """Fold a store-less customer profile into the default store's profile.
+    Totals add up with orders recorded there since; the newer profile keeps
+    its name, address and last order.
+    """
+    on_insert = {k: v for k, v in doc.items() if k not in ("_id", "schema_version", "orderCount", "lifetimeSpend", "firstOrderAt")}
+    on_insert["storeId"] = DEFAULT_STORE_ID
+    update = {
+        "$set": {},
+        "$unset": {},
+        "$inc": {"orderCount": doc.get("orderCount") or 0, "lifetimeSpend": doc.get("lifetimeSpend") or 0.0},
+        "$setOnInsert": on_insert,
+    }
+    if doc.get("firstOrderAt"):
+        update["$min"] = {"firstOrderAt": doc["firstOrderAt"]}
+    return update
+
+
+def _orders_v3(doc, context):
+    """Store the mobile number normalized, as new orders are, so customer
+    lookups match it, and mark uncancelled orders as counted in their
+    customer's profile (rebuilt by the customers step).
+    """
+    # Imported here: customer_model imports this module for its schema version
+    from model.customer_model import normalize_mobile
+    update = {"$set": {}, "$unset": {}}
+    mobile = doc.get("mobile")
+    normalized = normalize_mobile(mobile) if mobile else ""
+    if normalized and normalized != mobile:
+        update["$set"]["mobile"] = normalized
+    if "customerCounted" not in doc:
+        update["$set"]["customerCounted"] = bool(normalized) and doc.get("status") != "Cancelled"
+    return update
+
+
+def _order_amount(order):
+    try:
+        return float(order.get("total", 0) or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _rebuild_customers(database, batch_size):
+    """Recompute every customer profile from the live and archived orders.
+    Totals are set, not added, so profiles written by the app since (or by an
+    earlier run) end up the same. Returns the number of profiles written.
+    """
+    from model.customer_model import name_ngrams, normalize_mobile, normalize_name
+    profiles = {}
+    counted = {"mobile": {"$nin": [None, ""]}, "status": {"$ne": "Cancelled"}, "customerCounted": {"$ne": False}}
+    projection = {"storeId": 1, "mobile": 1, "total": 1, "createdAt": 1, "customerName": 1, "address": 1}
+    for name in ("orders", "orders_archive"):
+        for order in database[name].find(counted, projection).batch_size(batch_size):
+            mobile = normalize_mobile(order["mobile"])
+            if not mobile:
+                continue
+            profile = profiles.setdefault((order.get("storeId") or DEFAULT_STORE_ID, mobile), {
+                "orderCount": 0, "lifetimeSpend": 0.0, "firstOrderAt": None, "latest": None,
+            })
+            profile["orderCount"] += 1
+            profile["lifetimeSpend"] += _order_amount(order)
+            created = order.get("createdAt") if isinstance(order.get("createdAt"), datetime) else None
+            if created and (profile["firstOrderAt"] is None or created < profile["firstOrderAt"]):
+                profile["firstOrderAt"] = created
+            latest = profile["latest"]
+            if latest is None or (created or datetime.min) >= (latest.get("createdAt") or datetime.min):
+                profile["latest"] = dict(order, createdAt=created)
+
+    ops = []
+    for (store_id, mobile), profile in profiles.items():
+        latest = profile["latest"]
+        name_key = normalize_name(latest.get("customerName") or "")
+        ops.append(UpdateOne({"_id": f"{store_id}|{mobile}"}, {"$set": {
+            "storeId": store_id,
+            "mobile": mobile,
+            "orderCount": profile["orderCount"],
+            "lifetimeSpend": profile["lifetimeSpend"],
+            "firstOrderAt": profile["firstOrderAt"],
+            "name": latest.get("customerName") or "",
+            "nameKey": name_key,
+            "nameNgrams": name_ngrams(name_key),
+            "address": latest.get("address", ""),
+            "lastOrderId": latest.get("_id"),
+            "lastOrderAt": latest.get("createdAt"),
+            "lastOrderTotal": _order_amount(latest),
+            "schema_version": CUSTOMER_SCHEMA_VERSION,
+        }}, upsert=True))
+    for start in range(0, len(ops), batch_size):
+        database["customers"].bulk_write(ops[start:start + batch_size], ordered=False)
+    return len(ops)
+
+
+class Migration:
+    def __init__(self, collection, version, name, transform, prepare=None, rekey=None, rebuild=None):
+        self.collection = collection
+        self.version = version
+        self.name = name
+        self.transform = transform
+        # Optional callable(database) -> context dict, run once per step
+        self.prepare = prepare
+        # Optional callable(doc) -> new _id, for steps that move documents
+        self.rekey = rekey
+        # Optional callable(database, batch_size) -> count, replacing the per-document walk
+        self.rebuild = rebuild
+
+    @property
+    def key(self):
+        return f"{self.collection}:v{self.version}"
+
+
+# In order. Orders and their archive share a schema, so both get the same steps.
+MIGRATIONS = [
+    Migration("sweets", 1, "sweet defaults and image field", _sweets_v1),
+    Migration("orders", 1, "order item quantity and unit", _orders_v1,
+              prepare=lambda database: {"sweet_units": _load_sweet_units(database)}),
+    Migration("orders_archive", 1, "order item quantity and unit", _orders_v1,
+              prepare=lambda database: {"sweet_units": _load_sweet_units(database)}),
+    Migration("sweets", 2, "store id", _default_store_v2),
+    Migration("orders", 2, "store id", _default_store_v2),
+    Migration("orders_archive", 2, "store id", _default_store_v2),
+    Migration("capacity", 2, "store id in counter id", _capacity_v2, rekey=_default_store_key),
+    Migration("customers", 2, "store id in customer id", _customers_v2, rekey=_default_store_key),
+    Migration("orders", 3, "normalized mobile", _orders_v3),
+    Migration("orders_archive", 3, "normalized mobile", _orders_v3),
+    Migration("customers", 3, "rebuild from order history", None, rebuild=_rebuild_customers),
+]
+
+
+def _write_rekeyed(collection, migration, batch, context):
+    """Merge each document into its new _id, then delete the old ones. Returns documents moved."""
+    ops = []
+    for doc in batch:
+        update = migration.transform(doc, context)
+        update["$set"]["schema_version"] = migration.version
+        update["$addToSet"] = {"migratedFrom": doc["_id"]}
+        update = {op: fields for op, fields in update.items() if fields}
+        ops.append(UpdateOne({"_id": migration.rekey(doc), "migratedFrom": {"$ne": doc["_id"]}}, update, upsert=True))
+    for attempt in range(2):
+        try:
+            collection.bulk_write(ops, ordered=False)
+            break
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            # A duplicate key means the target exists and already lists this document
+            # (merged by an earlier run), or the app created it concurrently: retry once
+            ops = [ops[error["index"]] for error in errors]
+    collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+    return len(batch)
+
+
+def _run_step(database, migration, batch_size):
+    state = database["schema_migrations"]
+    checkpoint = state.find_one({"_id": migration.key}) or {}
+    if checkpoint.get("done"):
+        return 0
+    if migration.rebuild is not None:
+        migrated = migration.rebuild(database, batch_size)
+        state.update_one(
+            {"_id": migration.key},
+            {"$set": {"done": True, "name": migration.name, "migrated": migrated, "finishedAt": datetime.now()}},
+            upsert=True
+        )
+        return migrated
+    context = migration.prepare(database) if migration.prepare else {}
+    collection = database[migration.collection]
+    outdated = {"$or": [{"schema_version": {"$exists": False}}, {"schema_version": {"$lt": migration.version}}]}
+    last_id = checkpoint.get("lastId")
+    migrated = 0
+    while True:
+        query = dict(outdated)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(collection.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        if migration.rekey is not None:
+            moved = _write_rekeyed(collection, migration, batch, context)
+            migrated += moved
+            state.update_one(
+                {"_id": migration.key},
+                {"$set": {"lastId": last_id, "updatedAt": datetime.now()}, "$inc": {"migrated": moved}},
+                upsert=True
+            )
+            continue
+        ops = []
+        for doc in batch:
+            update = migration.transform(doc, context)
+            update["$set"]["schema_version"] = migration.version
+            update = {op: fields for op, fields in update.items() if fields}
+            # Guarded by version: a document another run already migrated is left alone
+            ops.append(UpdateOne({"_id": doc["_id"], **outdated}, update))
+        result = collection.bulk_write(ops, ordered=False)
+        migrated += result.modified_count
+        state.update_one(
+            {"_id": migration.key},
+            {"$set": {"lastId": last_id, "updatedAt": datetime.now()}, "$inc": {"migrated": result.modified_count}},
+            upsert=True
+        )
+    state.update_one(
+        {"_id": migration.key},
+        {"$set": {"done": True, "name": migration.name, "finishedAt": datetime.now()}},
+        upsert=True
+    )
+    return migrated
+
+
+def run_migrations(database=None, batch_size=MIGRATION_BATCH_SIZE):
+    """Apply every pending migration step. Returns {step key: documents migrated}."""
+    database = database if database is not None else db
+    if database is None:
+        raise RuntimeError("Database not connected: cannot run migrations")
+    results = {}
+    for migration in MIGRATIONS:
+        migrated = _run_step(database, migration, batch_size)
+        results[migration.key] = migrated
+        if migrated:
+            log.info("Migrated %s documents", migration.key, extra={"migration": migration.name, "documents": migrated})
+    return results
+
+
+def pending_migrations(database=None):
+    """Keys of migration steps that have not finished yet."""
+    database = database if database is not None else db
+    if database is None:
+        return []
+    done = {d["_id"] for d in database["schema_migrations"].find({"done": True}, {"_id": 1})}
+    return [m.key for m in MIGRATIONS if m.key not in done]
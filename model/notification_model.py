@@ -0,0 +1,64 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from utils.logger import get_logger
+from model.db import db
+
+log = get_logger(__name__)
+
+# Queue of new orders awaiting the manager's digest email. Entries are shared
+# by all workers; whichever worker holds the digest lease sends the summary,
+# so each order is reported once no matter which worker took it.
+notification_collection = db["manager_notifications"] if db is not None else None
+notification_state_collection = db["notification_state"] if db is not None else None
+
+PENDING = "pending"
+SENT = "sent"
+# Sent entries are kept a week for troubleshooting, then expire
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+_LEASE_ID = "order_digest"
+
+if notification_collection is not None:
+    try:
+        notification_collection.create_index([("status", 1), ("createdAt", 1)])
+        notification_collection.create_index("sentAt", expireAfterSeconds=SENT_RETENTION_SECONDS)
+    except Exception as e:
+        log.warning("Could not create manager_notifications indexes: %s", e)
+
+def queue_order_notification(order):
+    """Add a new order to the next digest."""
+    if notification_collection is None:
+        raise RuntimeError("Database not connected: cannot queue notification")
+    notification_collection.insert_one({
+        "orderId": order["_id"],
+        "status": PENDING,
+        "createdAt": datetime.now(),
+    })
+
+def claim_digest_lease(owner, seconds):
+    """Take the digest lease for `seconds` if nobody else holds it. Returns bool."""
+    if notification_state_collection is None:
+        return False
+    now = datetime.now()
+    try:
+        doc = notification_state_collection.find_one_and_update(
+            {"_id": _LEASE_ID, "$or": [{"leaseUntil": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "leaseUntil": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Held by another worker (the upsert lost to the existing document)
+        return False
+    return doc is not None and doc.get("owner") == owner
+
+def get_pending_notifications(limit):
+    """Oldest pending entries, up to limit."""
+    return list(notification_collection.find({"status": PENDING}).sort("createdAt", 1).limit(limit))
+
+def mark_notifications_sent(entry_ids):
+    notification_collection.update_many(
+        {"_id": {"$in": entry_ids}},
+        {"$set": {"status": SENT, "sentAt": datetime.now()}}
+    )
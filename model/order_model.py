@@ -1,12 +1,24 @@
-from pymongo import MongoClient, ReturnDocument
+from pymongo import ReturnDocument, UpdateOne, ReplaceOne, DeleteOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson import ObjectId
 import os
 from dotenv import load_dotenv
-from datetime import datetime, date
-import ssl
+from datetime import datetime, date, timedelta
+import threading
+from utils.logger import get_logger
+from utils.stores import DEFAULT_STORE_ID, current_store_id
+from model.db import db, analytics_db
+from model.sweet_model import get_sweet_prices
+from model.capacity_model import CapacityExceededError, reserve_order_capacity, release_order_capacity, adjust_order_capacity
+from model.event_model import publish_order_events, ORDER_CREATED, ORDER_UPDATED, ORDER_STATUS_CHANGED
+from model.customer_model import normalize_mobile, record_customer_orders, forget_customer_order
+from model.migrations import ORDER_SCHEMA_VERSION
+from model.archive_model import archive_collection, archive_analytics_collection, archive_needed, get_archive_watermark, raise_archive_watermark, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_STATUSES
 
 load_dotenv()
 
+log = get_logger(__name__)
+
 def validate_dates(order_date_str, delivery_date_str):
     """Validate that order and delivery dates are valid and meet business rules.
     Returns (True, None) if valid, or (False, error_message) if invalid.
@@ -51,49 +63,118 @@ def validate_dates_for_edit(order_date_str, delivery_date_str):
     
     return True, None
 
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    # Fallback to local Mongo for development so endpoints don't 500 when env is missing
-    MONGO_URI = "mongodb://127.0.0.1:27017"
-    print("⚠️ MONGO_URI not set; falling back to local MongoDB at mongodb://127.0.0.1:27017")
-
-# Force legacy OpenSSL provider for compatibility with MongoDB Atlas
-os.environ['OPENSSL_CONF'] = ''
-
-# Create SSL context with legacy settings
-ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
-ssl_context.options |= 0x4  # OP_LEGACY_SERVER_CONNECT
-
-# MongoDB connection with safer TLS handling
-try:
-    mongo_kwargs = {
-        "serverSelectionTimeoutMS": 30000,
-    }
-    # Enable TLS only for SRV (Atlas) URIs or when explicitly provided in URI
-    if MONGO_URI.startswith("mongodb+srv://"):
-        mongo_kwargs["tls"] = True
-        # Optionally allow invalid certs via env toggle (default False)
-        if os.getenv("MONGO_TLS_ALLOW_INVALID", "false").lower() in ("1", "true", "yes"):
-            mongo_kwargs["tlsAllowInvalidCertificates"] = True
-
-    client = MongoClient(MONGO_URI, **mongo_kwargs)
-    # Test the connection
-    client.admin.command('ping')
-    print("✅ MongoDB connection successful!")
-except Exception as e:
-    print(f"⚠️ MongoDB connection error: {e}")
-    client = None
-
-db = client["sweet_store"] if client is not None else None
 order_collection = db["orders"] if db is not None else None
+# Same collection, read with the analytics read preference (may be a secondary);
+# for admin lists and summaries only, never for read-after-write paths
+order_analytics_collection = analytics_db["orders"] if analytics_db is not None else None
+idempotency_collection = db["idempotency_keys"] if db is not None else None
 
-def place_order(order):
-    """Place a new order in the database with delivery date support."""
-    if order_collection is None:
-        raise RuntimeError("Database not connected: cannot place order")
-    
+# Idempotency keys expire after this long; a pending claim older than the
+# stale window (worker died mid-request) may be taken over by a retry.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+IDEMPOTENCY_STALE_SECONDS = int(os.getenv("IDEMPOTENCY_STALE_SECONDS", 120))
+
+if idempotency_collection is not None:
+    try:
+        # The key itself is the _id, so the built-in unique _id index enforces one claim per key
+        idempotency_collection.create_index("createdAt", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+    except Exception as e:
+        log.warning("Could not create idempotency TTL index: %s", e)
+
+# Change stamp per (store, delivery date), bumped by every order write touching
+# that date. Per-date views (the prep list) are cached until their stamp moves,
+# which also works across gunicorn workers.
+order_date_versions = db["order_date_versions"] if db is not None else None
+PREP_LIST_CACHE_MAX_DATES = 64
+_prep_list_cache = {}
+_prep_list_cache_lock = threading.Lock()
+
+# Every order belongs to one store (storeId). Request-scoped queries always
+# carry the current store, so their indexes lead with storeId (also the
+# natural shard key); the archival job works across stores and keeps the
+# store-less (deliveryDate, status) index.
+if order_collection is not None:
+    try:
+        order_collection.create_index([("deliveryDate", 1), ("status", 1)])
+        order_collection.create_index([("storeId", 1), ("deliveryDate", 1), ("status", 1)])
+        order_collection.create_index([("storeId", 1), ("orderDate", 1)])
+        order_collection.create_index([("storeId", 1), ("mobile", 1), ("createdAt", -1)])
+    except Exception as e:
+        log.warning("Could not create orders indexes: %s", e)
+
+def validate_order_request(data):
+    """Validate the shape of an incoming order before it is prepared for storage.
+    Checks items, required date fields, sweetId and quantity on every item.
+    Returns (True, None) if valid, or (False, error_message) if invalid.
+    """
+    if not data or "items" not in data:
+        return False, "Invalid order data. 'items' field is required."
+
+    items = data.get("items", [])
+    if not items:
+        return False, "Order must contain at least one item"
+
+    if "orderDate" not in data or not data.get("orderDate"):
+        return False, "Order date is required"
+    if "deliveryDate" not in data or not data.get("deliveryDate"):
+        return False, "Delivery date is required"
+
+    for item in items:
+        if not isinstance(item, dict):
+            return False, "Each item must be an object"
+        if not item.get("sweetId"):
+            return False, f"Missing sweetId for item: {item.get('sweetName', 'Unknown')}"
+
+        # Validate quantity: required and must be >= 1
+        if "quantity" not in item:
+            return False, f"Missing quantity for item: {item.get('sweetName', 'Unknown')}"
+        try:
+            quantity = float(item.get("quantity", 0))
+        except (ValueError, TypeError):
+            return False, f"Invalid quantity for item: {item.get('sweetName', 'Unknown')}"
+        if quantity < 1:
+            return False, f"Quantity must be at least 1 for item: {item.get('sweetName', 'Unknown')}"
+
+    return True, None
+
+def apply_catalogue_prices(order, prices):
+    """Price every item from the catalogue and recompute the order total server-side.
+    prices maps sweetId -> (rate, unit, name) as returned by get_sweet_prices.
+    Client-supplied item prices and totals are overwritten, never trusted.
+    Raises ValueError if an item references a sweet that is not in the catalogue.
+    """
+    grand_total = 0.0
+    for item in order.get("items", []) or []:
+        entry = prices.get(str(item.get("sweetId")))
+        if entry is None:
+            raise ValueError(f"Sweet not found for item: {item.get('sweetName', 'Unknown')}")
+        rate, unit, name = entry
+        item["price"] = rate
+        item["unit"] = unit
+        item["sweetName"] = name or item.get("sweetName", "")
+        item["lineTotal"] = round(rate * item["quantity"], 2)
+        grand_total += item["lineTotal"]
+
+    client_total = order.get("total")
+    order["total"] = round(grand_total, 2)
+    try:
+        if client_total is not None and abs(float(client_total or 0) - order["total"]) > 0.01:
+            log.info("Client total differs from catalogue total", extra={
+                "client_total": client_total, "server_total": order["total"]
+            })
+    except (ValueError, TypeError):
+        pass
+    return order
+
+def _order_sweet_ids(order):
+    return [item.get("sweetId") for item in order.get("items", []) or [] if isinstance(item, dict)]
+
+def prepare_order(order, prices=None):
+    """Validate dates and coerce numeric fields of an order in place, ready for insert.
+    When prices (sweetId -> (rate, unit, name)) is given, item prices and the
+    total are recomputed from the catalogue.
+    Raises ValueError with a user-facing message when the order is invalid.
+    """
     # Validate required date fields
     if "orderDate" not in order or not order["orderDate"]:
         raise ValueError("Order date is required")
@@ -106,7 +187,14 @@ def place_order(order):
         raise ValueError(error_msg)
     
     now = datetime.now()
+    order["storeId"] = current_store_id()
     order["createdAt"] = now
+    order["schema_version"] = ORDER_SCHEMA_VERSION
+    order["version"] = 1
+
+    # Store phone numbers in one canonical form so customer lookups hit the index
+    if order.get("mobile"):
+        order["mobile"] = normalize_mobile(order["mobile"]) or order["mobile"]
     
     # Store both dates as strings in YYYY-MM-DD format
     order["orderDate"] = order["orderDate"]
@@ -147,58 +235,250 @@ def place_order(order):
             item["price"] = 0
         
         # Store unit field (default to 'kg' if not provided)
-        unit = item.get("unit", "kg").strip().lower()
+        unit = (item.get("unit") or "kg").strip().lower()
         if unit not in ["piece", "kg"]:
             unit = "kg"
         item["unit"] = unit
 
-    order_collection.insert_one(order)
+    if prices is not None:
+        apply_catalogue_prices(order, prices)
+
+    return order
+
+def admit_order(order):
+    """Price and validate a new order and reserve its kitchen capacity, leaving
+    it ready to insert. Raises ValueError or CapacityExceededError.
+    """
+    # One batched price lookup for all items (served from the in-memory index)
+    prices = get_sweet_prices(_order_sweet_ids(order))
+    prepare_order(order, prices)
+
+    # Atomically reserve kitchen capacity for the delivery date before saving
+    reserve_order_capacity(order)
+    order["capacityReserved"] = True
+    order["customerCounted"] = bool(order.get("mobile"))
+    return order
+
+def place_order(order):
+    """Place a new order in the database with delivery date support."""
+    if order_collection is None:
+        raise RuntimeError("Database not connected: cannot place order")
+
+    admit_order(order)
+    try:
+        order_collection.insert_one(order)
+    except Exception:
+        release_order_capacity(order)
+        raise
+    _touch_delivery_dates([order.get("deliveryDate")])
+    _record_customers([order])
+    publish_order_events(ORDER_CREATED, [order])
     
     # Return the order with its generated _id for PDF and email
     return order
 
-def _serialize_datetimes(doc):
-    """Convert datetime objects in a document to strings to make them JSON-serializable."""
-    if not doc:
-        return doc
-    if isinstance(doc.get("createdAt"), datetime):
-        doc["createdAt"] = doc["createdAt"].strftime("%Y-%m-%d %H:%M:%S")
-    if isinstance(doc.get("updatedAt"), datetime):
-        doc["updatedAt"] = doc["updatedAt"].strftime("%Y-%m-%d %H:%M:%S")
-    # orderDate and deliveryDate are already strings
-    return doc
+def bulk_place_orders(orders, row_labels=None):
+    """Validate and insert many orders in one unordered insert_many.
+    Each order goes through the same rules as place_order. Invalid rows are
+    skipped and reported; one bad row never blocks the rest of the batch.
+    row_labels optionally maps each order to the label reported in errors
+    (e.g. the CSV line number); defaults to the list index.
+    Returns {"inserted": [order docs], "errors": [{"row": label, "error": msg}]}.
+    """
+    if order_collection is None:
+        raise RuntimeError("Database not connected: cannot place orders")
+    if row_labels is None:
+        row_labels = list(range(len(orders)))
+
+    errors = []
+    valid = []
+    for label, order in zip(row_labels, orders):
+        is_valid, error_msg = validate_order_request(order)
+        if not is_valid:
+            errors.append({"row": label, "error": error_msg})
+            continue
+        valid.append((label, order))
+
+    # Resolve every sweetId of the whole batch in a single lookup
+    prices = get_sweet_prices({sid for _, order in valid for sid in _order_sweet_ids(order)})
 
-def _serialize_order(doc):
-    """Normalize an order document for API responses (stringify _id and datetimes).
-    Also ensures legacy orders have quantity and unit defaulted for each item.
+    docs = []
+    doc_labels = []
+    try:
+        for label, order in valid:
+            try:
+                prepare_order(order, prices)
+                reserve_order_capacity(order)
+            except ValueError as e:
+                errors.append({"row": label, "error": str(e)})
+                continue
+            order["capacityReserved"] = True
+            order["customerCounted"] = bool(order.get("mobile"))
+            docs.append(order)
+            doc_labels.append(label)
+    except Exception:
+        # Not a bad row but a failed write: nothing is inserted, so give back what earlier rows reserved
+        for doc in docs:
+            release_order_capacity(doc)
+        raise
+
+    if not docs:
+        return {"inserted": [], "errors": errors}
+
+    failed_indexes = set()
+    try:
+        order_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            idx = write_error.get("index")
+            failed_indexes.add(idx)
+            release_order_capacity(docs[idx])
+            errors.append({"row": doc_labels[idx], "error": write_error.get("errmsg", "Write failed")})
+    except Exception:
+        # Nothing is known to be stored; give back every reservation made above
+        for doc in docs:
+            release_order_capacity(doc)
+        raise
+
+    inserted = [doc for i, doc in enumerate(docs) if i not in failed_indexes]
+    _touch_delivery_dates(doc.get("deliveryDate") for doc in inserted)
+    _record_customers(inserted)
+    publish_order_events(ORDER_CREATED, inserted)
+    log.info("Bulk order insert finished", extra={"inserted": len(inserted), "failed": len(errors)})
+    return {"inserted": inserted, "errors": errors}
+
+def insert_admitted_orders(orders):
+    """Insert orders that went through admit_order earlier and already carry
+    their _id (e.g. from the order intake log) in one unordered insert_many.
+    Orders that are already stored are skipped, so replaying a batch is
+    harmless; orders the database rejects are dropped and their capacity
+    released. Other errors are raised so the caller can retry the batch.
+    Returns the orders inserted by this call.
     """
-    if not doc:
+    if order_collection is None:
+        raise RuntimeError("Database not connected: cannot place orders")
+    if not orders:
+        return []
+
+    failed_indexes = set()
+    try:
+        order_collection.insert_many(orders, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            idx = write_error.get("index")
+            failed_indexes.add(idx)
+            if write_error.get("code") != 11000:
+                release_order_capacity(orders[idx])
+                log.error("Order rejected by the database", extra={
+                    "order_id": str(orders[idx].get("_id")), "error": write_error.get("errmsg")
+                })
+
+    inserted = [order for i, order in enumerate(orders) if i not in failed_indexes]
+    dates_by_store = {}
+    for order in inserted:
+        dates_by_store.setdefault(order.get("storeId") or DEFAULT_STORE_ID, set()).add(order.get("deliveryDate"))
+    for store_id, dates in dates_by_store.items():
+        _touch_delivery_dates(dates, store_id)
+    _record_customers(inserted)
+    publish_order_events(ORDER_CREATED, inserted)
+    return inserted
+
+def _record_customers(orders):
+    """Fold new orders into customer profiles; never fails the order itself."""
+    try:
+        record_customer_orders(orders)
+    except Exception as e:
+        log.warning("Could not update customer profiles: %s", e)
+
+def _date_version_id(store_id, day):
+    return f"{store_id}:{day}"
+
+def _touch_delivery_dates(dates, store_id=None):
+    """Bump the change stamp of each delivery date (of the current store unless
+    store_id is given) so cached per-date views refresh.
+    """
+    store_id = store_id or current_store_id()
+    dates = {d for d in dates if d}
+    if not dates or order_date_versions is None:
+        return
+    try:
+        order_date_versions.bulk_write(
+            [UpdateOne({"_id": _date_version_id(store_id, d)}, {"$inc": {"version": 1}}, upsert=True) for d in dates],
+            ordered=False
+        )
+    except Exception as e:
+        log.warning("Could not bump delivery date versions: %s", e)
+
+def _delivery_date_version(store_id, day):
+    doc = order_date_versions.find_one({"_id": _date_version_id(store_id, day)}) if order_date_versions is not None else None
+    return doc.get("version", 0) if doc else 0
+
+def claim_idempotency_key(key, request_hash):
+    """Claim an Idempotency-Key before doing the work it protects.
+    Returns None when this caller now owns the key and should proceed.
+    Otherwise returns the existing record: {"status": "pending"|"completed",
+    "requestHash", "responseStatus", "responseBody"}.
+    """
+    if idempotency_collection is None:
+        raise RuntimeError("Database not connected: cannot claim idempotency key")
+    now = datetime.now()
+    try:
+        idempotency_collection.insert_one({
+            "_id": key,
+            "status": "pending",
+            "requestHash": request_hash,
+            "createdAt": now,
+        })
         return None
-    doc = dict(doc)
-    if doc.get("_id") is not None:
-        doc["_id"] = str(doc["_id"])
-    
-    # Handle legacy orders: ensure all items have quantity and unit fields
-    if "items" in doc and isinstance(doc["items"], list):
-        for item in doc["items"]:
-            if isinstance(item, dict):
-                if "quantity" not in item:
-                    item["quantity"] = 1
-                if "unit" not in item:
-                    item["unit"] = "kg"  # Default to 'kg' for backward compatibility
-    
-    return _serialize_datetimes(doc)
+    except DuplicateKeyError:
+        pass
 
-def get_orders():
-    """Retrieve all orders, sorted by delivery date (ascending), including _id as string.
+    # Take over a claim abandoned by a crashed or timed-out worker
+    stale_before = datetime.fromtimestamp(now.timestamp() - IDEMPOTENCY_STALE_SECONDS)
+    taken = idempotency_collection.find_one_and_update(
+        {"_id": key, "status": "pending", "requestHash": request_hash, "createdAt": {"$lt": stale_before}},
+        {"$set": {"createdAt": now}}
+    )
+    if taken:
+        return None
+    return idempotency_collection.find_one({"_id": key}) or {"status": "pending", "requestHash": request_hash}
+
+def complete_idempotency_key(key, response_status, response_body):
+    """Store the response for a claimed key so replays can return it verbatim."""
+    if idempotency_collection is None:
+        return
+    idempotency_collection.update_one(
+        {"_id": key},
+        {"$set": {"status": "completed", "responseStatus": response_status, "responseBody": response_body}}
+    )
+
+def release_idempotency_key(key):
+    """Drop a pending claim after a failed attempt so the client may retry."""
+    if idempotency_collection is None:
+        return
+    idempotency_collection.delete_one({"_id": key, "status": "pending"})
+
+def get_orders(from_date=None, to_date=None):
+    """Retrieve orders, sorted by delivery date (ascending), including _id as string.
     Orders without deliveryDate will be sorted to the end.
+    Optionally limited to delivery dates between from_date and to_date (inclusive).
+    Without a range only live orders are returned; archived orders are included
+    when the range reaches back past the archive watermark.
     """
     if order_collection is None:
-        print("⚠️ Database not connected; returning empty orders list")
+        log.warning("Database not connected; returning empty orders list")
         return []
+    match = {"storeId": current_store_id()}
+    if from_date or to_date:
+        match["deliveryDate"] = {}
+        if from_date:
+            match["deliveryDate"]["$gte"] = from_date
+        if to_date:
+            match["deliveryDate"]["$lte"] = to_date
     # Sort by deliveryDate ascending (1), nulls last
     # MongoDB sorts null/missing values first, so we need a pipeline to handle this
     pipeline = [
+        {"$match": match},
         {
             "$addFields": {
                 "deliveryDateSort": {
@@ -209,15 +489,81 @@ def get_orders():
         {"$sort": {"deliveryDateSort": 1}},
         {"$project": {"deliveryDateSort": 0}}
     ]
-    docs = list(order_collection.aggregate(pipeline))
-    return [_serialize_order(d) for d in docs]
+    docs = list(order_analytics_collection.aggregate(pipeline))
+    if (from_date or to_date) and archive_needed(from_date):
+        seen = {d["_id"] for d in docs}
+        # An order is briefly in both tiers while being archived; the live copy wins
+        docs.extend(d for d in archive_analytics_collection.aggregate(pipeline) if d["_id"] not in seen)
+        docs.sort(key=lambda d: d.get("deliveryDate") or "9999-12-31")
+    return docs
+
+EXPORT_BATCH_SIZE = 500
+
+def iter_orders(from_date=None, to_date=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield orders with delivery dates in [from_date, to_date] one at a time,
+    straight from the cursor, so callers can stream any range in constant memory.
+    Live orders come first, sorted by delivery date, then archived ones when the
+    range needs them. Orders caught mid-archival are yielded once (live copy).
+    """
+    if order_collection is None:
+        raise RuntimeError("Database not connected: cannot export orders")
+    match = {"storeId": current_store_id()}
+    if from_date or to_date:
+        match["deliveryDate"] = {}
+        if from_date:
+            match["deliveryDate"]["$gte"] = from_date
+        if to_date:
+            match["deliveryDate"]["$lte"] = to_date
+    # Index order on (storeId, deliveryDate, ...), so the server never sorts in memory
+    sort = [("deliveryDate", 1)]
+    yield from order_analytics_collection.find(match).sort(sort).batch_size(batch_size)
+
+    if not archive_needed(from_date):
+        return
+    batch = []
+    for doc in archive_analytics_collection.find(match).sort(sort).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield from _not_live(batch)
+            batch = []
+    yield from _not_live(batch)
+
+def _not_live(docs):
+    if not docs:
+        return []
+    live = {d["_id"] for d in order_analytics_collection.find({"_id": {"$in": [d["_id"] for d in docs]}}, {"_id": 1})}
+    return [d for d in docs if d["_id"] not in live]
+
+def get_order(order_id: str):
+    """Fetch one order by id, looking in the archive if it is no longer live.
+    Returns dict or None.
+    """
+    if order_collection is None:
+        return None
+    try:
+        oid = ObjectId(order_id)
+    except Exception:
+        return None
+    query = {"_id": oid, "storeId": current_store_id()}
+    doc = order_collection.find_one(query)
+    if doc is None and archive_collection is not None:
+        doc = archive_collection.find_one(query)
+    return doc
+
+def get_orders_by_ids(order_ids):
+    """Live orders with the given ObjectIds, oldest first (missing ids are skipped).
+    Not scoped to a store: used by background jobs that already hold the ids.
+    """
+    if order_collection is None:
+        return []
+    return list(order_collection.find({"_id": {"$in": list(order_ids)}}).sort("createdAt", 1))
 
 def get_daily_summary():
     """Get summary statistics for today's orders.
     Only includes non-cancelled orders in the calculations.
     """
     if order_collection is None:
-        print("⚠️ Database not connected; returning empty daily summary")
+        log.warning("Database not connected; returning empty daily summary")
         return {
             "total_orders": 0,
             "total_revenue": 0,
@@ -228,7 +574,8 @@ def get_daily_summary():
 
     today = datetime.now().strftime("%Y-%m-%d")
     # Exclude cancelled orders from today's summary
-    today_orders = list(order_collection.find({
+    today_orders = list(order_analytics_collection.find({
+        "storeId": current_store_id(),
         "orderDate": today,
         "status": {"$ne": "Cancelled"}  # Exclude cancelled orders
     }, {"_id": 0}).sort("createdAt", -1))
@@ -246,9 +593,6 @@ def get_daily_summary():
     total_pieces_sold = 0
     sweet_stats = {}
     
-    # Import sweet collection to look up units
-    from model.sweet_model import sweet_collection
-
     for order in today_orders:
         for item in order.get("items", []) or []:
             try:
@@ -257,17 +601,7 @@ def get_daily_summary():
                 quantity_ordered = 0
 
             sweet_name = item.get("sweetName") or item.get("name") or "Unknown"
-            unit = item.get("unit")  # Get unit type from order item
-            
-            # If unit not in order, look it up from sweets collection
-            if not unit and sweet_collection is not None:
-                sweet_doc = sweet_collection.find_one({"name": sweet_name})
-                if sweet_doc:
-                    unit = sweet_doc.get("unit", "piece")
-                else:
-                    unit = "piece"  # Default fallback
-            elif not unit:
-                unit = "piece"  # Default fallback if no sweet_collection
+            unit = item.get("unit") or "kg"
 
             try:
                 price = float(item.get("price", 0) or 0)
@@ -293,8 +627,6 @@ def get_daily_summary():
 
     popular_sweets = sorted(sweet_stats.values(), key=lambda x: x["quantity"], reverse=True)
 
-    serialized_orders = [_serialize_order(o) for o in today_orders]
-
     return {
         "total_orders": total_orders,
         "total_revenue": total_revenue,
@@ -302,7 +634,7 @@ def get_daily_summary():
         "total_kg_sold": round(total_kg_sold, 2),
         "total_pieces_sold": int(total_pieces_sold),
         "popular_sweets": popular_sweets[:5],
-        "orders": serialized_orders
+        "orders": today_orders
     }
 
 def update_order_status(order_id: str, status: str):
@@ -317,20 +649,152 @@ def update_order_status(order_id: str, status: str):
         return None
 
     updated = order_collection.find_one_and_update(
-        {"_id": oid},
-        {"$set": {"status": status, "updatedAt": datetime.now()}},
+        {"_id": oid, "storeId": current_store_id()},
+        {"$set": {"status": status, "updatedAt": datetime.now()}, "$inc": {"version": 1}},
         return_document=ReturnDocument.AFTER,
-        projection={"_id": 1, "customerName": 1, "mobile": 1, "address": 1, "status": 1, "total": 1, "orderDate": 1, "deliveryDate": 1, "createdAt": 1, "updatedAt": 1, "items": 1}
+        projection=_STATUS_PROJECTION
     )
     if not updated:
         return None
-    return _serialize_order(updated)
 
-def edit_order(order_id: str, updates: dict):
+    _touch_delivery_dates([updated.get("deliveryDate")])
+    publish_order_events(ORDER_STATUS_CHANGED, [updated])
+
+    if status == "Cancelled":
+        _release_cancelled_order(oid)
+
+    return updated
+
+def _release_cancelled_order(oid):
+    """Give back the capacity and customer totals held by a cancelled order."""
+    # Flip the flags atomically so a repeated cancel never releases twice
+    held = order_collection.find_one_and_update(
+        {"_id": oid, "$or": [{"capacityReserved": True}, {"customerCounted": True}]},
+        {"$set": {"capacityReserved": False, "customerCounted": False}},
+        projection={"storeId": 1, "items": 1, "deliveryDate": 1, "mobile": 1, "total": 1, "capacityReserved": 1, "customerCounted": 1}
+    )
+    if held and held.get("capacityReserved"):
+        release_order_capacity(held)
+    if held and held.get("customerCounted"):
+        forget_customer_order(held)
+
+BULK_STATUS_MAX_ORDERS = 1000
+_STATUS_PROJECTION = {"_id": 1, "storeId": 1, "version": 1, "customerName": 1, "mobile": 1, "address": 1, "status": 1, "total": 1, "orderDate": 1, "deliveryDate": 1, "createdAt": 1, "updatedAt": 1, "items": 1}
+
+def status_filter_query(filters):
+    """Build an orders query from a bulk status filter.
+    Supported keys: deliveryDate (YYYY-MM-DD) and currentStatus
+    ("pending", "Delivered" or "Cancelled"). Raises ValueError otherwise.
+    """
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError("filter must be an object with deliveryDate and/or currentStatus")
+    unknown = set(filters) - {"deliveryDate", "currentStatus"}
+    if unknown:
+        raise ValueError(f"Unsupported filter field(s): {', '.join(sorted(unknown))}")
+    query = {}
+    if filters.get("deliveryDate"):
+        try:
+            datetime.strptime(str(filters["deliveryDate"]), "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("Invalid deliveryDate in filter. Expected YYYY-MM-DD.")
+        query["deliveryDate"] = str(filters["deliveryDate"])
+    current = str(filters.get("currentStatus") or "").strip().lower()
+    if current == "pending":
+        # New orders carry no status until they are delivered or cancelled
+        query["status"] = {"$nin": ["Delivered", "Cancelled"]}
+    elif current in ("delivered", "cancelled"):
+        query["status"] = current.capitalize()
+    elif current:
+        raise ValueError("currentStatus must be pending, Delivered or Cancelled")
+    if not query:
+        raise ValueError("filter must include deliveryDate and/or currentStatus")
+    return query
+
+def bulk_update_order_status(status, order_ids=None, filters=None):
+    """Set the status of many orders with one update_many.
+    Targets either order_ids or the orders matching filters (see
+    status_filter_query), at most BULK_STATUS_MAX_ORDERS at a time.
+    Returns (results, updated_orders): results is a list of
+    {"orderId", "outcome"} with outcome updated, unchanged (already in that
+    status), not_found or invalid_id; updated_orders are the changed orders.
+    """
+    if order_collection is None:
+        raise RuntimeError("Database not connected: cannot update order status")
+    results = []
+    if order_ids is not None:
+        oids = []
+        for raw in order_ids:
+            try:
+                oids.append(ObjectId(str(raw)))
+            except Exception:
+                results.append({"orderId": str(raw), "outcome": "invalid_id"})
+        if len(oids) > BULK_STATUS_MAX_ORDERS:
+            raise ValueError(f"At most {BULK_STATUS_MAX_ORDERS} orders can be updated at once")
+        query = {"_id": {"$in": oids}}
+    else:
+        query = status_filter_query(filters)
+        oids = None
+    query["storeId"] = current_store_id()
+
+    found = {d["_id"]: d for d in order_collection.find(query, {"_id": 1, "status": 1}).limit(BULK_STATUS_MAX_ORDERS + 1)}
+    if oids is None:
+        if len(found) > BULK_STATUS_MAX_ORDERS:
+            raise ValueError(f"Filter matches more than {BULK_STATUS_MAX_ORDERS} orders; narrow it down")
+        oids = list(found)
+
+    # Tag the documents this call changes so exactly those can be read back,
+    # even if another request updates some of the same orders concurrently
+    batch_id = ObjectId()
+    targets = [oid for oid in oids if oid in found and found[oid].get("status") != status]
+    if targets:
+        order_collection.update_many(
+            {"_id": {"$in": targets}, "status": {"$ne": status}},
+            {"$set": {"status": status, "updatedAt": datetime.now(), "statusBatchId": batch_id}, "$inc": {"version": 1}}
+        )
+    updated_orders = list(order_collection.find({"_id": {"$in": targets}, "statusBatchId": batch_id}, _STATUS_PROJECTION)) if targets else []
+    updated_ids = {d["_id"] for d in updated_orders}
+
+    for oid in oids:
+        if oid in updated_ids:
+            outcome = "updated"
+        elif oid in found:
+            outcome = "unchanged"
+        else:
+            outcome = "not_found"
+        results.append({"orderId": str(oid), "outcome": outcome})
+
+    if updated_orders:
+        _touch_delivery_dates([d.get("deliveryDate") for d in updated_orders])
+        publish_order_events(ORDER_STATUS_CHANGED, updated_orders)
+        if status == "Cancelled":
+            for doc in updated_orders:
+                _release_cancelled_order(doc["_id"])
+    return results, updated_orders
+
+class OrderVersionConflict(Exception):
+    """Raised when an edit names a version of the order that is no longer current."""
+
+    def __init__(self, current_version):
+        super().__init__(f"Order was changed by someone else (now at version {current_version}). Reload and try again.")
+        self.current_version = current_version
+
+def _version_query(expected_version):
+    # Orders written before versioning have no version field; they count as 0
+    if expected_version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": expected_version}
+
+def edit_order(order_id: str, updates: dict, expected_version=None):
     """Update provided fields of an order and return the updated document.
     Supports field mapping: contact->mobile, amount->total.
     Validates deliveryDate if being updated.
     Returns None if order not found.
+
+    The edit is one conditional find_one_and_update: the delivery/order date
+    rule is checked against the stored document with $expr, and when
+    expected_version is given (the admin UI's If-Match) the write only applies
+    to that version, raising OrderVersionConflict otherwise. Every edit bumps
+    the order's version.
     """
     if order_collection is None:
         raise RuntimeError("Database not connected: cannot edit order")
@@ -338,26 +802,6 @@ def edit_order(order_id: str, updates: dict):
         oid = ObjectId(order_id)
     except Exception:
         return None
-    
-    # If deliveryDate is being updated, validate it against orderDate
-    if "deliveryDate" in updates and updates["deliveryDate"]:
-        # Fetch current order to get orderDate
-        current_order = order_collection.find_one({"_id": oid})
-        if not current_order:
-            return None
-        
-        order_date = current_order.get("orderDate")
-        if not order_date:
-            # For legacy orders without orderDate, use createdAt date
-            if "createdAt" in current_order:
-                order_date = current_order["createdAt"].strftime("%Y-%m-%d")
-            else:
-                order_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # Use edit-specific validation that allows past dates
-        is_valid, error_msg = validate_dates_for_edit(order_date, updates["deliveryDate"])
-        if not is_valid:
-            raise ValueError(error_msg)
 
     field_map = {
         "customerName": "customerName",
@@ -380,6 +824,8 @@ def edit_order(order_id: str, updates: dict):
         if k not in field_map:
             continue
         dest = field_map[k]
+        if dest == "mobile" and v:
+            v = normalize_mobile(v) or v
         if dest == "total" or dest == "advancePaid":
             try:
                 v = float(v or 0)
@@ -415,7 +861,7 @@ def edit_order(order_id: str, updates: dict):
                     itm["price"] = 0
                 
                 # Store unit field (default to 'kg' if not provided)
-                unit = itm.get("unit", "kg").strip().lower()
+                unit = str(itm.get("unit") or "kg").strip().lower()
                 if unit not in ["piece", "kg"]:
                     unit = "kg"
                 itm["unit"] = unit
@@ -426,18 +872,235 @@ def edit_order(order_id: str, updates: dict):
 
     if not set_payload:
         # Nothing to update; return current doc
-        current = order_collection.find_one({"_id": oid})
+        current = order_collection.find_one({"_id": oid, "storeId": current_store_id()})
         if not current:
             return None
-        return _serialize_order(current)
+        if expected_version is not None and current.get("version", 0) != expected_version:
+            raise OrderVersionConflict(current.get("version", 0))
+        return current
+
+    query = {"_id": oid, "storeId": current_store_id()}
+    if expected_version is not None:
+        query.update(_version_query(expected_version))
+
+    # Delivery must not be before the order date. When only one of the two
+    # dates changes, the other is taken from the stored order inside the
+    # update's filter (legacy orders without orderDate use createdAt).
+    new_order_date = set_payload.get("orderDate") or None
+    new_delivery_date = set_payload.get("deliveryDate") or None
+    if new_order_date and new_delivery_date:
+        is_valid, error_msg = validate_dates_for_edit(new_order_date, new_delivery_date)
+        if not is_valid:
+            raise ValueError(error_msg)
+    elif new_delivery_date or new_order_date:
+        # Use edit-specific validation (past dates allowed) for the format check
+        given = new_delivery_date or new_order_date
+        is_valid, error_msg = validate_dates_for_edit(given, given)
+        if not is_valid:
+            raise ValueError(error_msg)
+        stored_order_date = {"$ifNull": ["$orderDate", {"$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}}]}
+        if new_delivery_date:
+            query["$expr"] = {"$lte": [{"$ifNull": [stored_order_date, new_delivery_date]}, new_delivery_date]}
+        else:
+            query["$expr"] = {"$lte": [new_order_date, {"$ifNull": ["$deliveryDate", new_order_date]}]}
 
     set_payload["updatedAt"] = datetime.now()
 
-    updated = order_collection.find_one_and_update(
-        {"_id": oid},
-        {"$set": set_payload},
-        return_document=ReturnDocument.AFTER
+    previous = order_collection.find_one_and_update(
+        query,
+        {"$set": set_payload, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE
     )
-    if not updated:
-        return None
-    return _serialize_order(updated)
+    if not previous:
+        # Only the failure path reads: tell missing, stale and invalid apart
+        current = order_collection.find_one({"_id": oid, "storeId": current_store_id()}, {"version": 1})
+        if not current:
+            return None
+        if expected_version is not None and current.get("version", 0) != expected_version:
+            raise OrderVersionConflict(current.get("version", 0))
+        raise ValueError("Delivery date must be on or after the order date.")
+
+    updated = dict(previous)
+    updated.update(set_payload)
+    updated["version"] = previous.get("version", 0) + 1
+
+    cancelled = set_payload.get("status") == "Cancelled" and previous.get("status") != "Cancelled"
+    # Move the capacity reservation when the items or delivery date change
+    if previous.get("capacityReserved") and not cancelled and ("items" in set_payload or "deliveryDate" in set_payload):
+        try:
+            adjust_order_capacity(previous, updated)
+        except CapacityExceededError:
+            _undo_edit(oid, previous, set_payload, updated["version"])
+            raise
+
+    _touch_delivery_dates([updated.get("deliveryDate"), previous.get("deliveryDate")])
+    publish_order_events(ORDER_UPDATED, [updated])
+
+    if cancelled:
+        _release_cancelled_order(oid)
+        updated["capacityReserved"] = updated["customerCounted"] = False
+    return updated
+
+def _undo_edit(oid, previous, set_payload, applied_version):
+    """Put back the fields an edit changed, unless the order was edited again since."""
+    restore = {k: previous[k] for k in set_payload if k in previous}
+    remove = {k: "" for k in set_payload if k not in previous}
+    update = {"$inc": {"version": 1}}
+    if restore:
+        update["$set"] = restore
+    if remove:
+        update["$unset"] = remove
+    result = order_collection.update_one({"_id": oid, "version": applied_version}, update)
+    if result.modified_count == 0:
+        log.error("Could not undo edit of order %s after a capacity failure; it was changed again", oid)
+
+def get_prep_list(delivery_date: str):
+    """Total quantity per sweet for non-cancelled orders due on a delivery date.
+    Computed with an aggregation on the (storeId, deliveryDate, status) index
+    and cached in-process, per store, until an order for that date changes.
+    """
+    if order_collection is None:
+        log.warning("Database not connected; returning empty prep list")
+        return {"deliveryDate": delivery_date, "orderCount": 0, "totalKg": 0, "totalPieces": 0, "sweets": []}
+
+    store_id = current_store_id()
+    cache_key = (store_id, delivery_date)
+    version = _delivery_date_version(store_id, delivery_date)
+    with _prep_list_cache_lock:
+        cached = _prep_list_cache.get(cache_key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    match = {"storeId": store_id, "deliveryDate": delivery_date, "status": {"$ne": "Cancelled"}}
+    pipeline = [{"$match": match}]
+    if archive_needed(delivery_date):
+        pipeline += [
+            {"$unionWith": {"coll": archive_collection.name, "pipeline": [{"$match": match}]}},
+            # Drop the second copy of an order caught mid-archive
+            {"$group": {"_id": "$_id", "doc": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$doc"}},
+        ]
+    pipeline += [
+        {"$facet": {
+            "sweets": [
+                {"$unwind": "$items"},
+                {"$group": {
+                    "_id": {
+                        "sweet": {"$ifNull": ["$items.sweetId", "$items.sweetName"]},
+                        "unit": {"$ifNull": ["$items.unit", "kg"]},
+                    },
+                    "name": {"$first": {"$ifNull": ["$items.sweetName", "Unknown"]}},
+                    "quantity": {"$sum": {"$ifNull": ["$items.quantity", 1]}},
+                    "orders": {"$addToSet": "$_id"},
+                }},
+            ],
+            "orders": [{"$count": "n"}],
+        }},
+    ]
+    facet = next(order_collection.aggregate(pipeline), {"sweets": [], "orders": []})
+
+    sweets = []
+    total_kg = 0
+    total_pieces = 0
+    for row in facet.get("sweets", []):
+        unit = row["_id"]["unit"]
+        quantity = round(float(row.get("quantity") or 0), 3)
+        if unit == "kg":
+            total_kg += quantity
+        else:
+            total_pieces += quantity
+        sweets.append({
+            "sweetId": row["_id"]["sweet"],
+            "name": row.get("name"),
+            "unit": unit,
+            "quantity": quantity,
+            "orders": len(row.get("orders", [])),
+        })
+    sweets.sort(key=lambda s: (s["unit"], -s["quantity"], s["name"] or ""))
+
+    order_rows = facet.get("orders", [])
+    prep_list = {
+        "deliveryDate": delivery_date,
+        "orderCount": order_rows[0]["n"] if order_rows else 0,
+        "totalKg": round(total_kg, 3),
+        "totalPieces": round(total_pieces, 3),
+        "sweets": sweets,
+    }
+
+    with _prep_list_cache_lock:
+        _prep_list_cache.pop(cache_key, None)
+        _prep_list_cache[cache_key] = (version, prep_list)
+        while len(_prep_list_cache) > PREP_LIST_CACHE_MAX_DATES:
+            _prep_list_cache.pop(next(iter(_prep_list_cache)))
+    return prep_list
+
+def get_customer_orders(mobile: str, limit: int = 50, before=None):
+    """Orders for one mobile number at the current store, newest first, served
+    by the (storeId, mobile, createdAt) index.
+    Pass before (a datetime) to page past the last order already shown.
+    """
+    if order_collection is None:
+        log.warning("Database not connected; returning empty customer orders")
+        return []
+    query = {"storeId": current_store_id(), "mobile": normalize_mobile(mobile)}
+    if before is not None:
+        query["createdAt"] = {"$lt": before}
+    docs = list(order_analytics_collection.find(query).sort("createdAt", -1).limit(limit))
+    watermark = get_archive_watermark()
+    if watermark and archive_collection is not None:
+        oldest = docs[-1].get("createdAt") if len(docs) == limit else None
+        # Archived orders were delivered (so created) before the watermark; only
+        # a page reaching back past it can contain any
+        if not isinstance(oldest, datetime) or oldest.strftime("%Y-%m-%d") < watermark:
+            seen = {d["_id"] for d in docs}
+            archived = archive_analytics_collection.find(query).sort("createdAt", -1).limit(limit)
+            docs.extend(d for d in archived if d["_id"] not in seen)
+            docs.sort(key=lambda d: d.get("createdAt") if isinstance(d.get("createdAt"), datetime) else datetime.min, reverse=True)
+            docs = docs[:limit]
+    return docs
+
+def archive_old_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """Move Delivered/Cancelled orders delivered more than older_than_days ago
+    into orders_archive, batch_size orders at a time.
+
+    Each batch is upserted into the archive by _id and only then deleted from
+    the live collection, so the job is idempotent and can be stopped and
+    rerun at any point: whatever is still live is simply picked up again.
+    Works across all stores.
+    Returns {"archived": n, "batches": n, "before": "YYYY-MM-DD", "done": bool}.
+    """
+    if order_collection is None or archive_collection is None:
+        raise RuntimeError("Database not connected: cannot archive orders")
+    before = (date.today() - timedelta(days=max(1, int(older_than_days)))).strftime("%Y-%m-%d")
+    eligible = {"status": {"$in": ARCHIVE_STATUSES}, "deliveryDate": {"$lt": before}}
+
+    # Readers must start looking in the archive before anything lands there
+    raise_archive_watermark(before)
+
+    archived = 0
+    batches = 0
+    done = False
+    while max_batches is None or batches < max_batches:
+        batch = list(order_collection.find(eligible).sort("_id", 1).limit(batch_size))
+        if not batch:
+            done = True
+            break
+        ids = [d["_id"] for d in batch]
+        archive_collection.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in batch], ordered=False)
+        # Delete only the version that was copied (and only if still eligible): an
+        # order edited after the copy stays live, and its stale copy is removed
+        # from the archive below so the next batch copies it afresh
+        deleted = order_collection.bulk_write(
+            [DeleteOne({"_id": d["_id"], "version": d.get("version"), **eligible}) for d in batch],
+            ordered=False
+        ).deleted_count
+        if deleted < len(ids):
+            still_live = [d["_id"] for d in order_collection.find({"_id": {"$in": ids}}, {"_id": 1})]
+            if still_live:
+                archive_collection.delete_many({"_id": {"$in": still_live}})
+        for store_id in {d.get("storeId") for d in batch}:
+            _touch_delivery_dates([d.get("deliveryDate") for d in batch if d.get("storeId") == store_id], store_id)
+        archived += deleted
+        batches += 1
+        log.info("Archived order batch", extra={"batch": batches, "orders": deleted, "before": before})
+    return {"archived": archived, "batches": batches, "before": before, "done": done}
@@ -0,0 +1,42 @@
+from pymongo import ReturnDocument
+from utils.logger import get_logger
+from model.db import db
+
+log = get_logger(__name__)
+
+# Shared token buckets for rate limiting across workers/instances, one
+# document per bucket key. Buckets refill lazily on each take, using the
+# server clock ($$NOW) so workers never disagree about elapsed time.
+rate_limit_collection = db["rate_limits"] if db is not None else None
+
+if rate_limit_collection is not None:
+    try:
+        # Idle buckets are full again after their refill period; let Mongo drop them
+        rate_limit_collection.create_index("expiresAt", expireAfterSeconds=0)
+    except Exception as e:
+        log.warning("Could not create rate_limits index: %s", e)
+
+def take_shared_token(key, rate, capacity):
+    """Atomically refill and take one token from a shared bucket.
+    rate is tokens per second, capacity the burst size.
+    Returns (allowed, tokens_left). Raises if the database is unavailable.
+    """
+    if rate_limit_collection is None:
+        raise RuntimeError("Database not connected: cannot use shared rate limits")
+    elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updatedAt", "$$NOW"]}]}, 1000]}
+    refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, rate]}]}]}
+    doc = rate_limit_collection.find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": refilled}},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", 1]},
+                "updatedAt": "$$NOW",
+                "expiresAt": {"$add": ["$$NOW", int(capacity / rate * 1000) + 1000]},
+            }},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return bool(doc.get("allowed")), float(doc.get("tokens", 0))
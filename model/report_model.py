@@ -0,0 +1,143 @@
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import os
+from datetime import datetime, timedelta
+from utils.logger import get_logger
+from model.db import db
+
+log = get_logger(__name__)
+
+# Report jobs: one document per distinct request, keyed by the hash of the
+# request itself, so identical requests share a job (and a single render).
+# Finished PDFs are stored in the "reports" GridFS bucket.
+report_job_collection = db["report_jobs"] if db is not None else None
+report_bucket = GridFSBucket(db, bucket_name="reports") if db is not None else None
+
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", 3600))
+# A job still queued after this long lost its worker (restart, crash); it may be retried
+REPORT_JOB_TIMEOUT_SECONDS = int(os.getenv("REPORT_JOB_TIMEOUT_SECONDS", 300))
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+if report_job_collection is not None:
+    try:
+        report_job_collection.create_index("expiresAt")
+    except Exception as e:
+        log.warning("Could not create report_jobs index: %s", e)
+
+def _is_stale(job, now):
+    return job.get("status") == QUEUED and \
+        now - job["createdAt"] > timedelta(seconds=REPORT_JOB_TIMEOUT_SECONDS)
+
+def claim_report_job(job_id, kind, params):
+    """Create the job for a request, or join the existing one.
+    Returns (job, created): created is True when the caller must start the
+    render; False means an identical job is already queued or done.
+    Failed, stale and expired jobs are taken over and restarted.
+    """
+    if report_job_collection is None:
+        raise RuntimeError("Database not connected: cannot create report job")
+    now = datetime.now()
+    job = {
+        "_id": job_id,
+        "kind": kind,
+        "status": QUEUED,
+        "params": params,
+        "createdAt": now,
+        "expiresAt": now + timedelta(seconds=REPORT_JOB_TTL_SECONDS),
+    }
+    try:
+        report_job_collection.insert_one(job)
+        return job, True
+    except DuplicateKeyError:
+        pass
+
+    existing = report_job_collection.find_one({"_id": job_id}, {"params": 0})
+    if existing is None:
+        # Purged between the insert and the read; try again
+        return claim_report_job(job_id, kind, params)
+    if existing.get("status") in (QUEUED, DONE) and not _is_stale(existing, now) \
+            and existing.get("expiresAt", now) > now:
+        return existing, False
+
+    # Take over a failed/stale/expired job; the filter makes only one caller win
+    restarted = report_job_collection.find_one_and_update(
+        {"_id": job_id, "status": existing.get("status"), "createdAt": existing.get("createdAt")},
+        {"$set": {"status": QUEUED, "createdAt": now, "expiresAt": job["expiresAt"], "params": params},
+         "$unset": {"error": "", "fileId": "", "finishedAt": ""}},
+        projection={"params": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if restarted:
+        if existing.get("fileId"):
+            _delete_file(existing["fileId"])
+        return restarted, True
+    return report_job_collection.find_one({"_id": job_id}, {"params": 0}), False
+
+def complete_report_job(job_id, filename, pdf_bytes):
+    """Store the rendered PDF in GridFS and mark the job done."""
+    grid_in = report_bucket.open_upload_stream(filename, metadata={"jobId": job_id, "contentType": "application/pdf"})
+    try:
+        grid_in.write(pdf_bytes)
+    finally:
+        grid_in.close()
+    file_id = grid_in._id
+    now = datetime.now()
+    result = report_job_collection.update_one(
+        {"_id": job_id, "status": QUEUED},
+        {"$set": {"status": DONE, "fileId": file_id, "filename": filename, "size": len(pdf_bytes),
+                  "finishedAt": now, "expiresAt": now + timedelta(seconds=REPORT_JOB_TTL_SECONDS)}}
+    )
+    if result.modified_count == 0:
+        # The job was restarted meanwhile; this render is no longer wanted
+        _delete_file(file_id)
+
+def fail_report_job(job_id, error):
+    report_job_collection.update_one(
+        {"_id": job_id, "status": QUEUED},
+        {"$set": {"status": FAILED, "error": str(error), "finishedAt": datetime.now()}}
+    )
+
+def get_report_job(job_id):
+    """Job state without its parameters. Returns dict or None."""
+    if report_job_collection is None:
+        return None
+    job = report_job_collection.find_one({"_id": job_id}, {"params": 0})
+    if job and _is_stale(job, datetime.now()):
+        job["status"] = FAILED
+        job["error"] = "Report job timed out"
+    return job
+
+def open_report_file(job):
+    """Open a finished job's PDF for streaming. Returns a GridOut or None."""
+    if report_bucket is None or not job.get("fileId"):
+        return None
+    try:
+        return report_bucket.open_download_stream(job["fileId"])
+    except NoFile:
+        return None
+
+def _delete_file(file_id):
+    try:
+        report_bucket.delete(file_id)
+    except Exception as e:
+        log.warning("Could not delete report file %s: %s", file_id, e)
+
+def purge_expired_reports(limit=50):
+    """Delete expired jobs and their files. Returns how many were removed."""
+    if report_job_collection is None:
+        return 0
+    now = datetime.now()
+    expired = list(report_job_collection.find(
+        {"expiresAt": {"$lt": now}, "status": {"$in": [DONE, FAILED]}}, {"fileId": 1}
+    ).limit(limit))
+    for job in expired:
+        if job.get("fileId"):
+            _delete_file(job["fileId"])
+    if expired:
+        report_job_collection.delete_many({"_id": {"$in": [j["_id"] for j in expired]}, "expiresAt": {"$lt": now}})
+    return len(expired)
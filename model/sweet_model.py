@@ -1,49 +1,190 @@
-from pymongo import MongoClient
 from bson import ObjectId
+from pymongo import ReturnDocument
 import os
 from dotenv import load_dotenv
-import ssl
 import re
+import threading
+import time
+from utils.logger import get_logger
+from utils.search_index import SweetSearchIndex
+from utils.stores import current_store_id
+from model.db import db, catalogue_db
+from model.migrations import SWEET_SCHEMA_VERSION
 
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    # Fallback to local Mongo for development so endpoints don't 500 when env is missing
-    MONGO_URI = "mongodb://127.0.0.1:27017"
-    print("⚠️ MONGO_URI not set; falling back to local MongoDB at mongodb://127.0.0.1:27017")
-
-# Force legacy OpenSSL provider for compatibility with MongoDB Atlas
-os.environ['OPENSSL_CONF'] = ''
-
-# Create SSL context with legacy settings
-ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
-ssl_context.options |= 0x4  # OP_LEGACY_SERVER_CONNECT
-
-# MongoDB connection with safer TLS handling
-try:
-    mongo_kwargs = {
-        "serverSelectionTimeoutMS": 30000,
-    }
-    # Enable TLS only for SRV (Atlas) URIs or when explicitly provided in URI
-    if MONGO_URI.startswith("mongodb+srv://"):
-        mongo_kwargs["tls"] = True
-        # Optionally allow invalid certs via env toggle (default False)
-        if os.getenv("MONGO_TLS_ALLOW_INVALID", "false").lower() in ("1", "true", "yes"):                
-            mongo_kwargs["tlsAllowInvalidCertificates"] = True
-    # IMPORTANT: Do not set tlsInsecure and tlsAllowInvalidCertificates together
-    client = MongoClient(MONGO_URI, **mongo_kwargs)
-    # Test the connection
-    client.admin.command('ping')
-    print("✅ MongoDB connection successful!")
-except Exception as e:
-    print(f"⚠️ MongoDB connection error: {e}")
-    client = None
-
-db = client["sweet_store"] if client is not None else None
+log = get_logger(__name__)
+
 sweet_collection = db["sweets"] if db is not None else None
+# Storefront listing and search reads (may be served by a secondary); pricing
+# and reads right after a catalogue write use sweet_collection (primary)
+sweet_catalogue_collection = catalogue_db["sweets"] if catalogue_db is not None else None
+# storeId -> change counter of that store's catalogue (bumped on every sweet write)
+catalogue_versions = db["catalogue_versions"] if db is not None else None
+
+# Every sweet belongs to one store (storeId); all queries below are scoped to
+# the current request's store, and the in-memory indexes are kept per store.
+
+# In-memory id -> (rate, unit, name) index used to price orders server-side.
+# Reloaded in one query (without images) when older than the TTL, and patched
+# locally on catalogue writes so this worker never serves its own stale prices.
+PRICE_INDEX_TTL_SECONDS = float(os.getenv("PRICE_INDEX_TTL_SECONDS", 60))
+_price_index = {}             # storeId -> {sweet id: (rate, unit, name)}
+_price_index_loaded_at = {}   # storeId -> monotonic load time
+_price_index_lock = threading.Lock()
+
+def _price_entry(doc):
+    """Build the (rate, unit, name) tuple stored in the price index."""
+    try:
+        rate = float(doc.get("rate", 0) or 0)
+    except (ValueError, TypeError):
+        rate = 0.0
+    return (rate, doc.get("unit") or "kg", doc.get("name", ""))
+
+def _reload_price_index(store_id):
+    docs = sweet_collection.find({"storeId": store_id}, {"rate": 1, "unit": 1, "name": 1})
+    _price_index[store_id] = {str(d["_id"]): _price_entry(d) for d in docs}
+    _price_index_loaded_at[store_id] = time.monotonic()
+
+# In-memory search index over name/category/description, rebuilt lazily after
+# catalogue writes (or when older than the TTL, to pick up other workers' writes).
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", 60))
+_search_index = {}            # storeId -> SweetSearchIndex
+_search_index_built_at = {}   # storeId -> monotonic build time (0.0 = rebuild from primary)
+_search_index_lock = threading.Lock()
+
+if sweet_collection is not None:
+    try:
+        sweet_collection.create_index([("storeId", 1), ("name", 1)])
+        # Fallback for when the in-memory index finds nothing (e.g. stemmed words).
+        # Led by storeId, so text searches are always scoped to one store; it
+        # replaces the old store-less "sweets_text" (one text index per collection).
+        if "sweets_text" in sweet_collection.index_information():
+            sweet_collection.drop_index("sweets_text")
+        sweet_collection.create_index(
+            [("storeId", 1), ("name", "text"), ("category", "text"), ("description", "text")],
+            weights={"name": 10, "category": 5, "description": 1},
+            name="sweets_store_text"
+        )
+    except Exception as e:
+        log.warning("Could not create sweets indexes: %s", e)
+
+# Catalogue versions are re-read at most this often; writes through this worker
+# update its copy immediately.
+CATALOGUE_VERSION_TTL_SECONDS = float(os.getenv("CATALOGUE_VERSION_TTL_SECONDS", 2))
+_catalogue_versions = {}      # storeId -> (version, monotonic check time)
+
+def get_catalogue_version(store_id=None):
+    """Change counter of a store's catalogue (the current store by default).
+    Returns None when the database is not connected.
+    """
+    if catalogue_versions is None:
+        return None
+    store_id = store_id or current_store_id()
+    cached = _catalogue_versions.get(store_id)
+    if cached and time.monotonic() - cached[1] < CATALOGUE_VERSION_TTL_SECONDS:
+        return cached[0]
+    doc = catalogue_versions.find_one({"_id": store_id})
+    version = doc.get("version", 0) if doc else 0
+    _catalogue_versions[store_id] = (version, time.monotonic())
+    return version
+
+def touch_catalogue(store_id=None):
+    """Record a change to a store's catalogue (the current store by default)
+    so caches keyed on its version refresh.
+    """
+    if catalogue_versions is None:
+        return
+    store_id = store_id or current_store_id()
+    try:
+        doc = catalogue_versions.find_one_and_update(
+            {"_id": store_id}, {"$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        _catalogue_versions[store_id] = (doc["version"], time.monotonic())
+    except Exception as e:
+        log.warning("Could not bump catalogue version: %s", e)
+
+def get_catalogue(store_id):
+    """A store's full catalogue as /sweets lists it, read from the primary."""
+    if sweet_collection is None:
+        raise RuntimeError("Database not connected: cannot read catalogue")
+    return list(sweet_collection.find({"storeId": store_id}, {"schema_version": 0}))
+
+def invalidate_search_index():
+    """Rebuild the current store's search index on the next query."""
+    _search_index_built_at[current_store_id()] = 0.0
+
+def _get_search_index(store_id):
+    with _search_index_lock:
+        built_at = _search_index_built_at.get(store_id)
+        if store_id not in _search_index or not built_at or time.monotonic() - built_at > SEARCH_INDEX_TTL_SECONDS:
+            # Rebuilt from the primary right after a write here, so it includes that write
+            source = sweet_collection if not built_at else sweet_catalogue_collection
+            docs = source.find({"storeId": store_id}, {"image": 0, "image_url": 0, "imageUrl": 0})
+            _search_index[store_id] = SweetSearchIndex(docs)
+            _search_index_built_at[store_id] = time.monotonic()
+        return _search_index[store_id]
+
+def search_sweets(query: str, limit: int = 10):
+    """Search sweets by name, category and description with prefix and typo tolerance.
+    Results carry no image data (the storefront already has it from /sweets).
+    Falls back to the Mongo text index when the in-memory index finds nothing.
+    """
+    if sweet_collection is None:
+        log.warning("Database not connected; returning empty search results")
+        return []
+    store_id = current_store_id()
+    results = _get_search_index(store_id).search(query, limit)
+    if results:
+        return results
+    try:
+        docs = sweet_catalogue_collection.find(
+            {"storeId": store_id, "$text": {"$search": str(query)}},
+            {"score": {"$meta": "textScore"}, "name": 1, "category": 1, "rate": 1, "unit": 1, "isFestival": 1}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+        return [{
+            "_id": str(d["_id"]),
+            "name": d.get("name", ""),
+            "category": d.get("category") or "Uncategorized",
+            "rate": d.get("rate", 0),
+            "unit": d.get("unit") or "kg",
+            "isFestival": bool(d.get("isFestival", False)),
+            "score": round(d.get("score", 0), 3),
+        } for d in docs]
+    except Exception as e:
+        log.debug("Text search fallback unavailable: %s", e)
+        return []
+
+def invalidate_price_index():
+    """Force the current store's next price lookup to reload the index from the database."""
+    _price_index_loaded_at[current_store_id()] = 0.0
+
+def get_sweet_prices(sweet_ids):
+    """Resolve sweet id strings to (rate, unit, name) tuples.
+    Served from the in-memory price index; ids it does not know yet (e.g. added
+    by another worker) are fetched together in one batched $in lookup.
+    Unknown or invalid ids are simply absent from the returned dict.
+    """
+    if sweet_collection is None:
+        raise RuntimeError("Database not connected: cannot look up sweet prices")
+    store_id = current_store_id()
+    wanted = {str(i) for i in sweet_ids if i}
+    with _price_index_lock:
+        if time.monotonic() - _price_index_loaded_at.get(store_id, 0.0) > PRICE_INDEX_TTL_SECONDS:
+            _reload_price_index(store_id)
+        prices = _price_index[store_id]
+        missing = [i for i in wanted if i not in prices]
+        oids = []
+        for i in missing:
+            try:
+                oids.append(ObjectId(i))
+            except Exception:
+                continue
+        if oids:
+            for d in sweet_collection.find({"_id": {"$in": oids}, "storeId": store_id}, {"rate": 1, "unit": 1, "name": 1}):
+                prices[str(d["_id"])] = _price_entry(d)
+        return {i: prices[i] for i in wanted if i in prices}
 
 
 def add_sweet(data):
@@ -60,75 +201,66 @@ def add_sweet(data):
         rate_val = 0
 
     # Validate and normalize unit field
-    unit = data.get("unit", "kg").strip().lower()
+    unit = str(data.get("unit") or "kg").strip().lower()
     if unit not in ["piece", "kg"]:
         unit = "kg"  # Default to 'kg' if invalid
 
     # Accept image from multiple keys: image, image_url, or imageUrl
     image_data = data.get("image") or data.get("image_url") or data.get("imageUrl") or ""
     
+    # Uploaded images are stored separately and referenced by URL plus imageId
+    image_id = data.get("imageId") or None
+
+    if image_id:
+        log.debug("Using uploaded image %s for '%s'", image_id, data.get('name', 'Unknown'))
     # Validate base64 image format if image is provided
-    if image_data:
+    elif image_data:
         if not isinstance(image_data, str):
             raise ValueError("Image must be a string")
         if not image_data.startswith('data:image/'):
             raise ValueError("Invalid image format. Must be a base64 data URI starting with 'data:image/'")
-        print(f"📸 Storing image for '{data.get('name', 'Unknown')}' - Length: {len(image_data)} characters")
-        print(f"   Image starts with: {image_data[:50]}...")
+        log.debug("Storing image for '%s' - %d characters", data.get('name', 'Unknown'), len(image_data))
     else:
-        print(f"⚠️ No image provided for '{data.get('name', 'Unknown')}'")
+        log.info("No image provided for '%s'", data.get('name', 'Unknown'))
 
+    store_id = current_store_id()
     doc = {
+        "storeId": store_id,
         "name": data.get("name", "").strip(),
         "rate": rate_val,
         "description": data.get("description", ""),
         # Store as 'image' field to match common frontend expectations
         "image": image_data,
+        "imageId": image_id,
         "category": data.get("category", "").strip(),
         "unit": unit,
         "isFestival": bool(data.get("isFestival", False)),
+        "schema_version": SWEET_SCHEMA_VERSION,
     }
 
     result = sweet_collection.insert_one(doc)
-    print(f"✅ Sweet '{doc['name']}' added successfully with ID: {result.inserted_id}")
+    with _price_index_lock:
+        _price_index.setdefault(store_id, {})[str(result.inserted_id)] = _price_entry(doc)
+    invalidate_search_index()
+    touch_catalogue(store_id)
+    log.info("Sweet added", extra={"sweet": doc['name'], "sweet_id": str(result.inserted_id), "store_id": store_id})
 
 def get_sweets(category: str | None = None):
     """Get sweets from the database with optional category filter.
-    Includes '_id' (as string) and ensures 'category' in the result.
+    Stored sweets are already normalized (see model/migrations), so this is a
+    plain query ('_id' is rendered by the JSON provider).
     Returns complete image field without modification.
     """
     if sweet_collection is None:
-        print("⚠️ Database not connected; returning empty sweets list")
+        log.warning("Database not connected; returning empty sweets list")
         return []
-    query = {}
+    query = {"storeId": current_store_id()}
     if category:
         # Case-insensitive CONTAINS match for robustness (e.g., "din" matches "Dinner")
         cat = str(category).strip()
         if cat:
             query["category"] = re.compile(re.escape(cat), re.IGNORECASE)
-    docs = list(sweet_collection.find(query))
-    # Backfill category and unit for older records, normalize image field
-    for d in docs:
-        if d.get("_id") is not None:
-            d["_id"] = str(d["_id"])
-        if "category" not in d:
-            d["category"] = "Uncategorized"
-        if "unit" not in d:
-            d["unit"] = "kg"  # Default to 'kg' for backward compatibility
-        if "isFestival" not in d:
-            d["isFestival"] = False  # Default to False for backward compatibility
-        
-        # Normalize image field: ensure 'image' field exists
-        # Support legacy records that may have 'image_url' or 'imageUrl'
-        if "image" not in d:
-            d["image"] = d.get("image_url") or d.get("imageUrl") or ""
-        
-        # Log image info for debugging (only first sweet to avoid spam)
-        if docs.index(d) == 0 and d.get("image"):
-            print(f"📸 Returning sweet '{d.get('name')}' - Image length: {len(d['image'])} characters")
-            print(f"   Image starts with: {d['image'][:50]}...")
-    
-    return docs
+    return list(sweet_catalogue_collection.find(query, {"schema_version": 0}))
 
 def get_sweet_by_id(id_str: str):
     """Fetch a single sweet by its ObjectId string. Returns dict or None.
@@ -140,24 +272,13 @@ def get_sweet_by_id(id_str: str):
         oid = ObjectId(id_str)
     except Exception:
         return None
-    doc = sweet_collection.find_one({"_id": oid})
-    if not doc:
-        return None
-    # Normalize id to string for callers
-    doc["_id"] = str(doc["_id"]) if doc.get("_id") is not None else None
-    # Backfill unit for backward compatibility
-    if "unit" not in doc:
-        doc["unit"] = "kg"
-    
-    # Normalize image field: ensure 'image' field exists
-    # Support legacy records that may have 'image_url' or 'imageUrl'
-    if "image" not in doc:
-        doc["image"] = doc.get("image_url") or doc.get("imageUrl") or ""
-    
-    return doc
+    return sweet_collection.find_one({"_id": oid, "storeId": current_store_id()}, {"schema_version": 0})
 
 def remove_sweet(name):
     """Remove a sweet from the database by name."""
     if sweet_collection is None:
         raise RuntimeError("Database not connected: cannot remove sweet")
-    sweet_collection.delete_one({"name": name})
+    sweet_collection.delete_one({"storeId": current_store_id(), "name": name})
+    invalidate_price_index()
+    invalidate_search_index()
+    touch_catalogue()
@@ -0,0 +1,20 @@
+"""
+Publish the storefront catalogue as static files (see utils/static_catalogue).
+
+Catalogue changes made through the API are published automatically; run this
+after editing sweets directly in the database, or to publish a new setup.
+
+Usage: python publish_catalogue.py [storeId ...]   (default: every store)
+"""
+import sys
+
+from utils.static_catalogue import static_publisher
+from utils.stores import STORE_IDS
+
+if __name__ == "__main__":
+    store_ids = sys.argv[1:] or sorted(STORE_IDS)
+    for store_id in store_ids:
+        print(f"\n📤 Publishing catalogue of store '{store_id}'...")
+        manifest = static_publisher.publish(store_id)
+        print(f"✅ {manifest['sweets']} with {len(manifest['categories'])} categories and {manifest['images']} image(s)")
+    print(f"\n✅ Done! Files are in {static_publisher.directory}")
@@ -0,0 +1,78 @@
+"""
+Check read-preference routing against a real replica set.
+
+Start a local single-host replica set first, e.g.:
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval "rs.initiate()"
+then run:
+    MONGO_URI="mongodb://127.0.0.1:27017/?replicaSet=rs0" python test_read_routing.py
+
+With one member every read is answered by the primary, but server selection
+still runs with each path's read preference and maxStalenessSeconds, so
+misconfigured routing fails here instead of in production.
+"""
+from model.db import client, db, ANALYTICS_READ_PREFERENCE, CATALOGUE_READ_PREFERENCE
+from model.sweet_model import get_sweets, search_sweets, sweet_collection, sweet_catalogue_collection
+from model.order_model import get_orders, get_daily_summary, get_customer_orders, order_collection, order_analytics_collection
+from model.customer_model import search_customers
+from model.archive_model import archive_analytics_collection
+
+
+def test_read_routing():
+    print("=" * 60)
+    print("🧪 Testing Read-Preference Routing")
+    print("=" * 60)
+
+    if client is None:
+        print("\n❌ Could not connect to MongoDB (check MONGO_URI)")
+        return False
+
+    hello = client.admin.command("hello")
+    if not hello.get("setName"):
+        print("\n❌ Not a replica set; start mongod with --replSet and run rs.initiate()")
+        return False
+    print(f"\n✅ Replica set: {hello['setName']} (primary {hello.get('primary')})")
+    print(f"✅ Catalogue reads: {CATALOGUE_READ_PREFERENCE}")
+    print(f"✅ Analytics reads: {ANALYTICS_READ_PREFERENCE}")
+
+    expected = [
+        ("sweets (writes, pricing)", sweet_collection, "primary"),
+        ("orders (writes, read-after-write)", order_collection, "primary"),
+        ("sweets (catalogue)", sweet_catalogue_collection, CATALOGUE_READ_PREFERENCE.name),
+        ("orders (analytics)", order_analytics_collection, ANALYTICS_READ_PREFERENCE.name),
+        ("orders_archive (analytics)", archive_analytics_collection, ANALYTICS_READ_PREFERENCE.name),
+    ]
+    ok = True
+    for label, collection, mode in expected:
+        actual = collection.read_preference.name
+        mark = "✅" if actual == mode else "❌"
+        ok = ok and actual == mode
+        print(f"{mark} {label}: {actual}")
+
+    print("\n📖 Running routed reads...")
+    try:
+        print(f"✅ get_sweets: {len(get_sweets())} sweets")
+        print(f"✅ search_sweets: {len(search_sweets('ladoo'))} results")
+        print(f"✅ get_orders: {len(get_orders('2000-01-01', '2999-12-31'))} orders")
+        print(f"✅ get_daily_summary: {get_daily_summary()['total_orders']} orders today")
+        print(f"✅ get_customer_orders: {len(get_customer_orders('9999999999'))} orders")
+        print(f"✅ search_customers: {len(search_customers('test'))} customers")
+    except Exception as e:
+        print(f"❌ Routed read failed: {e}")
+        return False
+
+    # Read-after-write on the primary must always see the write
+    probe = db["read_routing_probe"]
+    inserted = probe.insert_one({"probe": True}).inserted_id
+    seen = probe.find_one({"_id": inserted}) is not None
+    probe.delete_one({"_id": inserted})
+    print(f"{'✅' if seen else '❌'} Primary read-after-write")
+
+    print("\n" + "=" * 60)
+    print("✅ Routing OK" if ok and seen else "❌ Routing check failed")
+    print("=" * 60)
+    return ok and seen
+
+
+if __name__ == "__main__":
+    test_read_routing()
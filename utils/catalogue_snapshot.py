@@ -0,0 +1,229 @@
+"""
+Pre-serialized /sweets catalogue shared by all gunicorn workers.
+
+Each worker used to query and serialize the whole catalogue, inline base64
+images included, on every /sweets request. Instead, every catalogue version
+of a store is rendered once into JSON plus gzip (and brotli, when available)
+variants, written to CATALOGUE_SNAPSHOT_DIR under versioned names and
+memory-mapped read-only. Files are written to a temporary name and renamed
+into place, and one worker renders a version while the others wait on a file
+lock, so nobody sees a partial snapshot or renders the same one twice.
+
+All workers map the same files, so the bytes sit once in the page cache
+instead of in every worker's heap. Responses are handed to the server as
+files: gunicorn sends them with sendfile() straight from the page cache,
+other servers read them from the mapping. When a store's catalogue version
+changes, the next request maps the new snapshot and swaps it in; responses
+still being sent keep the old mapping until they finish.
+"""
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+import time
+
+from werkzeug.wsgi import wrap_file
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; workers may then render the same version twice
+    fcntl = None
+
+from model.sweet_model import get_catalogue, get_catalogue_version
+from utils.compression import brotli, choose_encoding, compress_bytes
+from utils.json_provider import dumps_bytes
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+CATALOGUE_SNAPSHOT_DIR = os.getenv("CATALOGUE_SNAPSHOT_DIR") or os.path.join(tempfile.gettempdir(), "sweet_store_catalogue")
+# Re-render a snapshot this old even if its version did not change, which
+# picks up edits made directly in the database
+CATALOGUE_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("CATALOGUE_SNAPSHOT_MAX_AGE_SECONDS", 3600))
+# Bump when the /sweets payload changes shape so old snapshots are not served
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Content-coding -> file suffix; None is the uncompressed JSON
+_SUFFIXES = {"gzip": ".json.gz", "br": ".json.br", None: ".json"}
+
+
+class _SnapshotFile:
+    """Read-only file view of one snapshot variant for wsgi.file_wrapper.
+    fileno() opens the snapshot file so the server can sendfile() it;
+    read() copies from the shared mapping for servers that cannot.
+    """
+
+    def __init__(self, variant):
+        self._variant = variant
+        self._view = memoryview(variant.mapping)
+        self._pos = 0
+        self._fd = None
+
+    def fileno(self):
+        if self._fd is None:
+            self._fd = os.open(self._variant.path, os.O_RDONLY)
+            if os.fstat(self._fd).st_ino != self._variant.inode:
+                # Replaced by a newer render since we mapped it
+                os.close(self._fd)
+                self._fd = None
+                raise OSError("snapshot file was replaced")
+        return self._fd
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+    def close(self):
+        self._view.release()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class _Variant:
+    __slots__ = ("path", "inode", "mapping", "size")
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.size = os.fstat(f.fileno()).st_size
+            # mmap cannot map empty files; "[]" keeps even an empty catalogue non-empty
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+
+
+class Snapshot:
+    """One mapped catalogue version of a store."""
+
+    def __init__(self, store_id, version, variants, built_at):
+        self.store_id = store_id
+        self.version = version
+        self.variants = variants
+        self.built_at = built_at
+        self.etag = hashlib.sha256(variants[None].mapping).hexdigest()[:32]
+
+    def open(self, encoding):
+        """File-like body for the given content-coding (None = uncompressed)."""
+        variant = self.variants[encoding]
+        return _SnapshotFile(variant), variant.size
+
+
+class CatalogueSnapshots:
+    def __init__(self, directory=CATALOGUE_SNAPSHOT_DIR, max_age=CATALOGUE_SNAPSHOT_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_age = max_age
+        self._current = {}  # storeId -> Snapshot
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _base(self, store_id, version):
+        safe_store = re.sub(r"[^A-Za-z0-9_-]", "_", store_id)
+        return os.path.join(self.directory, f"catalogue-{safe_store}-f{SNAPSHOT_FORMAT_VERSION}-v{version}")
+
+    def get(self, store_id):
+        """Current snapshot of a store, rendering or mapping it if the catalogue
+        changed. Returns None when the database is not connected.
+        """
+        version = get_catalogue_version(store_id)
+        if version is None:
+            return None
+        snapshot = self._current.get(store_id)
+        if snapshot is not None and snapshot.version == version and time.time() - snapshot.built_at < self.max_age:
+            return snapshot
+        with self._lock:
+            snapshot = self._current.get(store_id)
+            if snapshot is None or snapshot.version != version or time.time() - snapshot.built_at >= self.max_age:
+                snapshot = self._load_or_build(store_id, version)
+                # Swap; responses still sending the old snapshot hold their own references
+                self._current[store_id] = snapshot
+            return snapshot
+
+    def _load_or_build(self, store_id, version):
+        base = self._base(store_id, version)
+        snapshot = self._load(store_id, version, base)
+        if snapshot is not None:
+            return snapshot
+        with open(base + ".lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another worker may have rendered it while we waited for the lock
+            snapshot = self._load(store_id, version, base)
+            if snapshot is None:
+                self._build(store_id, base)
+                snapshot = self._load(store_id, version, base)
+        self._forget_older_versions(store_id, base)
+        return snapshot
+
+    def _load(self, store_id, version, base):
+        try:
+            built_at = os.stat(base + _SUFFIXES[None]).st_mtime
+            if time.time() - built_at >= self.max_age:
+                return None
+            variants = {None: _Variant(base + _SUFFIXES[None])}
+            for encoding in ("gzip", "br"):
+                if os.path.exists(base + _SUFFIXES[encoding]):
+                    variants[encoding] = _Variant(base + _SUFFIXES[encoding])
+        except FileNotFoundError:
+            return None
+        return Snapshot(store_id, version, variants, built_at)
+
+    def _build(self, store_id, base):
+        start = time.perf_counter()
+        body = dumps_bytes(get_catalogue(store_id))
+        encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+        # Compressed variants first: the uncompressed file marks the snapshot complete
+        for encoding in encodings + [None]:
+            data = compress_bytes(body, encoding) if encoding else body
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, base + _SUFFIXES[encoding])
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        log.info("Catalogue snapshot rendered", extra={
+            "store_id": store_id,
+            "bytes": len(body),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+    def _forget_older_versions(self, store_id, base):
+        # Open mappings and files in other workers stay valid after the unlink
+        prefix = os.path.basename(self._base(store_id, ""))
+        keep = os.path.basename(base)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and not name.startswith(keep + "."):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+def snapshot_response(snapshot, request, response_class):
+    """Response sending a snapshot in the best encoding the client accepts,
+    or 304 when the client already has it.
+    """
+    etag = f'"{snapshot.etag}"'
+    if request.if_none_match.contains(snapshot.etag):
+        response = response_class(status=304)
+        response.headers["ETag"] = etag
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding not in snapshot.variants:
+        encoding = None
+    body, size = snapshot.open(encoding)
+    response = response_class(wrap_file(request.environ, body), mimetype="application/json", direct_passthrough=True)
+    response.content_length = size
+    response.headers["ETag"] = etag
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+catalogue_snapshots = CatalogueSnapshots()
@@ -0,0 +1,77 @@
+"""
+Negotiated response compression (brotli when available, otherwise gzip).
+
+Only buffered responses above a size threshold with a compressible
+mimetype are compressed; streamed and already-encoded responses pass
+through untouched.
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/csv",
+}
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best encoding we support from a werkzeug Accept-Encoding object."""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_bytes(data, encoding):
+    """Compress raw bytes with the given content-coding ('br' or 'gzip')."""
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def init_compression(app):
+    """Register an after_request hook that compresses eligible responses."""
+
+    @app.after_request
+    def _compress_response(response):
+        from flask import request
+
+        response.vary.add("Accept-Encoding")
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code >= 300
+            or response.status_code == 204
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+
+        response.set_data(compress_bytes(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return app
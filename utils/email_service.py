@@ -4,9 +4,13 @@ from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 import os
 from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from utils.logger import get_logger
 
 load_dotenv(".env")
 
+log = get_logger(__name__)
+
 # Email Configuration
 OUTLOOK_EMAIL = os.getenv("OUTLOOK_EMAIL")
 OUTLOOK_PASSWORD = os.getenv("OUTLOOK_PASSWORD")
@@ -14,7 +18,29 @@ OUTLOOK_HOST = os.getenv("OUTLOOK_HOST", "smtp.office365.com")
 OUTLOOK_PORT = int(os.getenv("OUTLOOK_PORT", 587))
 MANAGER_EMAIL = os.getenv("MANAGER_EMAIL")
 
-def send_email_with_attachment(to_email, subject, body, attachment_path=None):
+# Email bodies are Jinja templates in templates/email, compiled once per
+# process at import. Autoescaping keeps customer-entered text (names,
+# addresses, contact messages) from being interpreted as HTML.
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "email")
+
+def _money(value):
+    try:
+        return f"{float(value or 0):,.2f}"
+    except (ValueError, TypeError):
+        return "0.00"
+
+_template_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+_template_env.filters["money"] = _money
+_templates = {
+    name: _template_env.get_template(f"{name}.html")
+    for name in ("order_invoice", "contact_form", "bulk_import_summary", "bulk_status_summary", "order_digest")
+}
+
+def render_email(template, **context):
+    """Render one of the precompiled email templates."""
+    return _templates[template].render(**context)
+
+def send_email_with_attachment(to_email, subject, body, attachment_path=None, attachments=None):
     """
     Send email with optional PDF attachment using Outlook SMTP.
     
@@ -23,12 +49,13 @@ def send_email_with_attachment(to_email, subject, body, attachment_path=None):
         subject: Email subject
         body: Email body (can be HTML)
         attachment_path: Path to PDF file to attach
+        attachments: Extra attachments as (filename, bytes, subtype) tuples
     
     Returns:
         Boolean: True if successful, False otherwise
     """
     if not all([OUTLOOK_EMAIL, OUTLOOK_PASSWORD, OUTLOOK_HOST]):
-        print("⚠️ Email credentials not configured")
+        log.warning("Email credentials not configured")
         return False
     
     try:
@@ -48,6 +75,10 @@ def send_email_with_attachment(to_email, subject, body, attachment_path=None):
                 attachment.add_header('Content-Disposition', 'attachment', 
                                     filename=os.path.basename(attachment_path))
                 msg.attach(attachment)
+        for filename, data, subtype in attachments or []:
+            attachment = MIMEApplication(data, _subtype=subtype)
+            attachment.add_header('Content-Disposition', 'attachment', filename=filename)
+            msg.attach(attachment)
         
         # Connect to SMTP server
         server = smtplib.SMTP(OUTLOOK_HOST, OUTLOOK_PORT)
@@ -58,11 +89,11 @@ def send_email_with_attachment(to_email, subject, body, attachment_path=None):
         server.send_message(msg)
         server.quit()
         
-        print(f"✅ Email sent successfully to {to_email}")
+        log.info("Email sent", extra={"to": to_email})
         return True
         
     except Exception as e:
-        print(f"❌ Failed to send email: {str(e)}")
+        log.error("Failed to send email: %s", e, extra={"to": to_email})
         return False
 
 def send_order_invoice_to_manager(order_data, pdf_path):
@@ -76,80 +107,48 @@ def send_order_invoice_to_manager(order_data, pdf_path):
     Returns:
         Boolean: True if successful, False otherwise
     """
-    print(f"📧 send_order_invoice_to_manager called")
-    print(f"   Manager Email: {MANAGER_EMAIL}")
-    print(f"   PDF Path: {pdf_path}")
-    print(f"   Order Data Keys: {order_data.keys() if order_data else 'None'}")
-    
     if not MANAGER_EMAIL:
-        print("⚠️ Manager email not configured")
+        log.warning("Manager email not configured")
         return False
     
     order_id = str(order_data.get('_id', 'N/A'))
     customer_name = order_data.get('customerName', 'Customer')
-    total = order_data.get('total', 0)
-    delivery_date = order_data.get('deliveryDate', 'N/A')
-    
-    print(f"   Order ID: {order_id}")
-    print(f"   Customer: {customer_name}")
     
     subject = f"🔔 New Order #{order_id} - {customer_name}"
     
-    body = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; color: #333;">
-        <div style="background-color: #FFD700; padding: 20px; text-align: center;">
-            <h1 style="color: #0D0D0D; margin: 0;">🍬 Sweet Store</h1>
-        </div>
-        
-        <div style="padding: 20px;">
-            <h2 style="color: #D2691E;">New Order Received!</h2>
-            
-            <p>A new order has been placed. Please find the details below:</p>
-            
-            <table style="border-collapse: collapse; width: 100%; margin: 20px 0;">
-                <tr>
-                    <td style="padding: 10px; background-color: #FFF8DC; font-weight: bold;">Order ID:</td>
-                    <td style="padding: 10px; background-color: #FFFEF0;">{order_id}</td>
-                </tr>
-                <tr>
-                    <td style="padding: 10px; background-color: #FFF8DC; font-weight: bold;">Customer:</td>
-                    <td style="padding: 10px; background-color: #FFFEF0;">{customer_name}</td>
-                </tr>
-                <tr>
-                    <td style="padding: 10px; background-color: #FFF8DC; font-weight: bold;">Mobile:</td>
-                    <td style="padding: 10px; background-color: #FFFEF0;">{order_data.get('mobile', 'N/A')}</td>
-                </tr>
-                <tr>
-                    <td style="padding: 10px; background-color: #FFF8DC; font-weight: bold;">Total Amount:</td>
-                    <td style="padding: 10px; background-color: #FFFEF0; font-size: 18px; font-weight: bold; color: #D2691E;">₹{total}</td>
-                </tr>
-                <tr>
-                    <td style="padding: 10px; background-color: #FFF8DC; font-weight: bold;">Delivery Date:</td>
-                    <td style="padding: 10px; background-color: #FFFEF0;">{delivery_date}</td>
-                </tr>
-            </table>
-            
-            <p style="background-color: #FFF8DC; padding: 15px; border-left: 4px solid #FFD700;">
-                <strong>📎 Invoice Attached:</strong> Please find the detailed invoice PDF attached to this email.
-            </p>
-            
-            <p style="margin-top: 30px; color: #666;">
-                You can update the order status from the admin panel.
-            </p>
-        </div>
-        
-        <div style="background-color: #F5F5DC; padding: 15px; text-align: center; margin-top: 20px;">
-            <p style="margin: 0; color: #666; font-size: 12px;">
-                This is an automated notification from Sweet Store Management System
-            </p>
-        </div>
-    </body>
-    </html>
-    """
+    body = render_email(
+        "order_invoice",
+        order_id=order_id,
+        customer_name=customer_name,
+        mobile=order_data.get('mobile', 'N/A'),
+        total=order_data.get('total', 0),
+        delivery_date=order_data.get('deliveryDate', 'N/A'),
+    )
     
     return send_email_with_attachment(MANAGER_EMAIL, subject, body, pdf_path)
 
+def send_order_digest_to_manager(orders, attachments=None, attachment_note=None):
+    """
+    Send one summary email for a batch of new orders.
+    
+    Args:
+        orders: List of order dictionaries, oldest first
+        attachments: Invoice attachments as (filename, bytes, subtype) tuples
+        attachment_note: Sentence describing the attachments, if any
+    
+    Returns:
+        Boolean: True if successful, False otherwise
+    """
+    if not MANAGER_EMAIL:
+        log.warning("Manager email not configured")
+        return False
+    
+    total_amount = sum(_amount(order) for order in orders)
+    subject = f"🔔 {len(orders)} new order(s) - ₹{_money(total_amount)}"
+    body = render_email("order_digest", orders=orders, total_amount=total_amount, attachment_note=attachment_note)
+    
+    return send_email_with_attachment(MANAGER_EMAIL, subject, body, attachments=attachments)
+
 def send_contact_form_to_manager(contact_data):
     """
     Send contact form submission to manager.
@@ -161,63 +160,85 @@ def send_contact_form_to_manager(contact_data):
         Boolean: True if successful, False otherwise
     """
     if not MANAGER_EMAIL:
-        print("⚠️ Manager email not configured")
+        log.warning("Manager email not configured")
         return False
     
     name = contact_data.get('name', 'N/A')
-    email = contact_data.get('email', 'N/A')
-    phone = contact_data.get('phone', 'N/A')
-    message = contact_data.get('message', 'N/A')
     
     subject = f"📧 New Contact Form Submission from {name}"
     
-    body = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; color: #333;">
-        <div style="background-color: #C41E3A; padding: 20px; text-align: center;">
-            <h1 style="color: white; margin: 0;">🍬 Mansoor Hotel & Sweets</h1>
-        </div>
-        
-        <div style="padding: 20px;">
-            <h2 style="color: #C41E3A;">New Contact Form Message</h2>
-            
-            <p>Someone has sent a message through the website contact form:</p>
-            
-            <table style="border-collapse: collapse; width: 100%; margin: 20px 0;">
-                <tr>
-                    <td style="padding: 12px; background-color: #FFF8DC; font-weight: bold; width: 150px;">Name:</td>
-                    <td style="padding: 12px; background-color: #FFFEF0;">{name}</td>
-                </tr>
-                <tr>
-                    <td style="padding: 12px; background-color: #FFF8DC; font-weight: bold;">Email:</td>
-                    <td style="padding: 12px; background-color: #FFFEF0;"><a href="mailto:{email}">{email}</a></td>
-                </tr>
-                <tr>
-                    <td style="padding: 12px; background-color: #FFF8DC; font-weight: bold;">Phone:</td>
-                    <td style="padding: 12px; background-color: #FFFEF0;">{phone}</td>
-                </tr>
-            </table>
-            
-            <div style="margin: 20px 0;">
-                <h3 style="color: #C41E3A; margin-bottom: 10px;">Message:</h3>
-                <div style="background-color: #FFF8DC; padding: 20px; border-left: 4px solid #C41E3A; white-space: pre-wrap;">
-{message}
-                </div>
-            </div>
-            
-            <p style="background-color: #FEF3E2; padding: 15px; border-left: 4px solid #C41E3A; margin-top: 20px;">
-                <strong>💡 Action Required:</strong> Please respond to this inquiry at your earliest convenience.
-            </p>
-        </div>
-        
-        <div style="background-color: #F5F5DC; padding: 15px; text-align: center; margin-top: 20px;">
-            <p style="margin: 0; color: #666; font-size: 12px;">
-                This is an automated notification from Mansoor Hotel & Sweets Contact Form
-            </p>
-        </div>
-    </body>
-    </html>
+    body = render_email(
+        "contact_form",
+        name=name,
+        email=contact_data.get('email', 'N/A'),
+        phone=contact_data.get('phone', 'N/A'),
+        message=contact_data.get('message', 'N/A'),
+    )
+    
+    return send_email_with_attachment(MANAGER_EMAIL, subject, body)
+
+def _amount(order):
+    try:
+        return float(order.get('total', 0) or 0)
+    except (ValueError, TypeError):
+        return 0
+
+def send_bulk_import_summary_to_manager(orders, failed_count=0):
+    """
+    Send one consolidated email for a bulk order import.
+    
+    Args:
+        orders: List of inserted order dictionaries
+        failed_count: Number of rows that were rejected
+    
+    Returns:
+        Boolean: True if successful, False otherwise
     """
+    if not MANAGER_EMAIL:
+        log.warning("Manager email not configured")
+        return False
+    
+    total_amount = 0
+    by_delivery_date = {}
+    for order in orders:
+        amount = _amount(order)
+        total_amount += amount
+        day = order.get('deliveryDate', 'N/A')
+        stats = by_delivery_date.setdefault(day, {"count": 0, "amount": 0})
+        stats["count"] += 1
+        stats["amount"] += amount
+    
+    subject = f"🔔 Bulk Import: {len(orders)} new orders"
+    
+    body = render_email(
+        "bulk_import_summary",
+        order_count=len(orders),
+        total_amount=total_amount,
+        failed_count=failed_count,
+        by_delivery_date=sorted(by_delivery_date.items()),
+    )
+    
+    return send_email_with_attachment(MANAGER_EMAIL, subject, body)
+
+def send_bulk_status_summary_to_manager(status, orders):
+    """
+    Send one consolidated email for a bulk order status change.
+    
+    Args:
+        status: The new status ("Delivered" or "Cancelled")
+        orders: List of updated order dictionaries
+    
+    Returns:
+        Boolean: True if successful, False otherwise
+    """
+    if not MANAGER_EMAIL:
+        log.warning("Manager email not configured")
+        return False
+    
+    total_amount = sum(_amount(order) for order in orders)
+    
+    subject = f"🔔 {len(orders)} order(s) marked {status}"
+    
+    body = render_email("bulk_status_summary", status=status, orders=orders, total_amount=total_amount)
     
-    print(f"📧 Sending contact form to manager: {MANAGER_EMAIL}")
     return send_email_with_attachment(MANAGER_EMAIL, subject, body)
@@ -0,0 +1,96 @@
+"""
+Per-worker fan-out of the shared order event feed to SSE subscribers.
+
+One background thread per worker polls the order_events collection (an
+indexed range query on seq) while at least one client is subscribed, and
+copies new events into each subscriber's queue. Open streams therefore
+cost one queue each, not one database cursor each.
+"""
+import os
+import queue
+import threading
+
+from model.event_model import EVENT_PAGE_SIZE, get_events_since, get_latest_seq
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", 1.0))
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class TooManySubscribers(Exception):
+    """Raised when a worker already serves its maximum number of streams."""
+
+
+class Subscription:
+    """Queue of pending events for one stream."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the client fell too far behind; the stream should end so
+        # the client reconnects and catches up from Last-Event-ID
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class OrderEventBroker:
+    def __init__(self, max_subscribers):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_seq = 0
+
+    def subscribe(self):
+        """Register a new subscriber and return its Subscription."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            subscription = Subscription()
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._last_seq = get_latest_seq()
+                self._thread = threading.Thread(target=self._run, name="order-event-broker", daemon=True)
+                self._thread.start()
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(EVENT_POLL_SECONDS):
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody listening; the next subscribe() restarts the poller
+                    self._thread = None
+                    return
+                subscribers = list(self._subscribers)
+            # Events come without gaps, so _last_seq never passes one still being inserted
+            events = [None]
+            while events:
+                try:
+                    events = get_events_since(self._last_seq)
+                except Exception as e:
+                    log.warning("Order event poll failed: %s", e)
+                    break
+                if not events:
+                    break
+                self._last_seq = events[-1]["seq"]
+                for subscription in subscribers:
+                    for event in events:
+                        try:
+                            subscription.queue.put_nowait(event)
+                        except queue.Full:
+                            subscription.overflowed = True
+                            break
+                if len(events) < EVENT_PAGE_SIZE:
+                    break
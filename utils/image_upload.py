@@ -0,0 +1,242 @@
+"""
+Streaming multipart/form-data parsing for sweet image uploads.
+
+The request body is read in fixed-size chunks and fed through werkzeug's
+sans-IO multipart decoder. Bytes of the file part go straight to a sink
+(the GridFS upload stream) while being hashed, so at most one chunk of
+the image is held in memory. The content type is sniffed from the magic
+bytes and the dimensions are read from the image header alone (PNG IHDR,
+GIF screen descriptor, JPEG SOF, WebP VP8/VP8L/VP8X); the image is never
+decoded.
+"""
+import hashlib
+import os
+import struct
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 5 * 1024 * 1024))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 4096))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Dimensions must appear within this many leading bytes (JPEG EXIF can push SOF back)
+HEADER_SCAN_LIMIT = 256 * 1024
+# Non-file form fields are small text values
+MAX_FIELD_BYTES = 64 * 1024
+
+ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp")
+
+
+class ImageUploadError(ValueError):
+    """Raised when an uploaded image is malformed or not acceptable."""
+
+
+class ImageTooLargeError(ImageUploadError):
+    """Raised when an uploaded image exceeds IMAGE_MAX_BYTES."""
+
+
+def sniff_image_type(head):
+    """Content type from the leading bytes, or None if not a supported image."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _jpeg_dimensions(head):
+    i = 2
+    while i + 4 <= len(head):
+        if head[i] != 0xFF:
+            raise ImageUploadError("Corrupt JPEG header")
+        marker = head[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        (length,) = struct.unpack(">H", head[i + 2:i + 4])
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if i + 9 > len(head):
+                return None
+            height, width = struct.unpack(">HH", head[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _webp_dimensions(head):
+    if len(head) < 30:
+        return None
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", head[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    raise ImageUploadError("Unsupported WebP encoding")
+
+
+def image_dimensions(content_type, head):
+    """(width, height) read from the image header, or None if more bytes are needed."""
+    if content_type == "image/png":
+        if len(head) < 24:
+            return None
+        return struct.unpack(">II", head[16:24])
+    if content_type == "image/gif":
+        if len(head) < 10:
+            return None
+        return struct.unpack("<HH", head[6:10])
+    if content_type == "image/jpeg":
+        return _jpeg_dimensions(head)
+    if content_type == "image/webp":
+        return _webp_dimensions(head)
+    return None
+
+
+class ImageInspector:
+    """Hashes, sizes, sniffs and measures an image as its bytes stream past."""
+
+    def __init__(self, max_bytes=IMAGE_MAX_BYTES, max_dimension=IMAGE_MAX_DIMENSION):
+        self.max_bytes = max_bytes
+        self.max_dimension = max_dimension
+        self.size = 0
+        self.content_type = None
+        self.dimensions = None
+        self._sha256 = hashlib.sha256()
+        self._head = bytearray()
+
+    def feed(self, chunk):
+        """Inspect the next chunk. Raises ImageUploadError as soon as a check fails."""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ImageTooLargeError(f"Image is larger than {self.max_bytes // 1024} KB")
+        self._sha256.update(chunk)
+        if self.dimensions is not None:
+            return
+        self._head += chunk[:HEADER_SCAN_LIMIT - len(self._head)]
+        if self.content_type is None and len(self._head) >= 12:
+            self.content_type = sniff_image_type(bytes(self._head))
+            if self.content_type is None:
+                raise ImageUploadError(f"Unsupported image type. Allowed: {', '.join(ALLOWED_IMAGE_TYPES)}")
+        if self.content_type is not None:
+            self.dimensions = image_dimensions(self.content_type, bytes(self._head))
+            if self.dimensions is not None:
+                self._check_dimensions()
+                self._head = bytearray()
+            elif len(self._head) >= HEADER_SCAN_LIMIT:
+                raise ImageUploadError("Could not read image dimensions")
+
+    def _check_dimensions(self):
+        width, height = self.dimensions
+        if width <= 0 or height <= 0:
+            raise ImageUploadError("Image has no pixels")
+        if width > self.max_dimension or height > self.max_dimension:
+            raise ImageUploadError(f"Image is {width}x{height}; the maximum is {self.max_dimension}px per side")
+
+    def finish(self):
+        """Summary of the complete image. Raises ImageUploadError if it was cut short."""
+        if self.size == 0:
+            raise ImageUploadError("Image file is empty")
+        if self.content_type is None:
+            self.content_type = sniff_image_type(bytes(self._head))
+            if self.content_type is None:
+                raise ImageUploadError(f"Unsupported image type. Allowed: {', '.join(ALLOWED_IMAGE_TYPES)}")
+        if self.dimensions is None:
+            self.dimensions = image_dimensions(self.content_type, bytes(self._head))
+            if self.dimensions is None:
+                raise ImageUploadError("Could not read image dimensions")
+            self._check_dimensions()
+        return {
+            "contentType": self.content_type,
+            "sha256": self._sha256.hexdigest(),
+            "size": self.size,
+            "width": self.dimensions[0],
+            "height": self.dimensions[1],
+        }
+
+
+def stream_multipart_form(stream, boundary, file_field, open_sink):
+    """Parse a multipart body, streaming the `file_field` part into a sink.
+
+    Args:
+        stream: file-like request body (read in UPLOAD_CHUNK_SIZE chunks)
+        boundary: multipart boundary from the Content-Type header
+        file_field: name of the form field carrying the image
+        open_sink: callable(filename) returning an object with write(),
+            close() and abort() (e.g. a GridFS upload stream)
+
+    Returns:
+        (fields, upload): text fields as a dict, and (sink, info, filename)
+        for the streamed file or None if no file was sent. The sink is
+        closed; on any error it is aborted before the exception propagates.
+    """
+    if not boundary:
+        raise ImageUploadError("Missing multipart boundary")
+    # No max_form_memory_size: werkzeug applies it to the decoder's whole buffer,
+    # file data included. Field and image sizes are checked below instead.
+    decoder = MultipartDecoder(boundary.encode("latin-1"))
+    fields = {}
+    upload = None
+    part = None  # ("field", name, bytearray) | ("file", sink, inspector, filename) | ("skip",)
+    sink = None
+    try:
+        finished = False
+        while not finished:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, Epilogue):
+                    finished = True
+                    break
+                if isinstance(event, Field):
+                    part = ("field", event.name, bytearray())
+                elif isinstance(event, File):
+                    if event.name == file_field and upload is None and sink is None:
+                        sink = open_sink(event.filename or "")
+                        part = ("file", sink, ImageInspector(), event.filename or "")
+                    else:
+                        part = ("skip",)
+                elif isinstance(event, Data):
+                    if part[0] == "field":
+                        part[2].extend(event.data)
+                        if len(part[2]) > MAX_FIELD_BYTES:
+                            raise ImageUploadError(f"Form field '{part[1]}' is too long")
+                    elif part[0] == "file":
+                        part[2].feed(event.data)
+                        part[1].write(event.data)
+                    if not event.more_data:
+                        if part[0] == "field":
+                            fields[part[1]] = part[2].decode("utf-8", errors="replace")
+                        elif part[0] == "file":
+                            info = part[2].finish()
+                            part[1].close()
+                            upload = (part[1], info, part[3])
+                            sink = None
+                        part = None
+                event = decoder.next_event()
+            if not chunk and not finished:
+                raise ImageUploadError("Upload ended before the multipart body was complete")
+    except Exception as e:
+        if sink is not None:
+            sink.abort()
+        if isinstance(e, ImageUploadError):
+            raise
+        if isinstance(e, RequestEntityTooLarge):
+            raise ImageTooLargeError(f"Upload is too large: {e.description}")
+        if isinstance(e, ValueError):
+            raise ImageUploadError(f"Malformed multipart body: {e}")
+        raise
+    return fields, upload
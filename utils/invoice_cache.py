@@ -0,0 +1,112 @@
+"""
+Content-addressed on-disk cache of rendered invoice PDFs.
+
+An invoice is identified by the order id and the order's last change
+(updatedAt, or createdAt for orders never edited), so a cached file is
+reused until the order changes and then simply becomes unreachable. The
+directory is bounded by INVOICE_CACHE_MAX_BYTES with least-recently-used
+eviction (file mtime is bumped on every hit). Files are written to a
+temporary name and renamed into place, so gunicorn workers sharing the
+directory never see a partial PDF.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+INVOICE_CACHE_DIR = os.getenv("INVOICE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "sweet_store_invoices")
+INVOICE_CACHE_MAX_BYTES = int(os.getenv("INVOICE_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+# Bump when the invoice layout changes so old renders are not served
+INVOICE_TEMPLATE_VERSION = 1
+
+
+def invoice_key(order):
+    """Cache key for the current state of an order."""
+    changed = order.get("updatedAt") or order.get("createdAt") or ""
+    if hasattr(changed, "isoformat"):
+        # BSON dates keep milliseconds; match a freshly inserted order to its stored copy
+        changed = changed.replace(microsecond=changed.microsecond // 1000 * 1000).isoformat()
+    raw = f"{order.get('_id')}|{changed}|{INVOICE_TEMPLATE_VERSION}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class InvoiceCache:
+    def __init__(self, directory=INVOICE_CACHE_DIR, max_bytes=INVOICE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, order_id, key):
+        return os.path.join(self.directory, f"{order_id}-{key}.pdf")
+
+    def get_invoice(self, order, render):
+        """Path of the invoice PDF for this version of the order, rendering it
+        with render(order, path) -> path-or-None on a miss. Returns (path, key),
+        or (None, key) if rendering failed.
+        """
+        order_id = str(order.get("_id"))
+        key = invoice_key(order)
+        path = self._path(order_id, key)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # mark as recently used
+                return path, key
+            except FileNotFoundError:
+                pass  # evicted by another worker just now; render again
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".pdf.tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            if not render(order, tmp_path):
+                return None, key
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        log.debug("Rendered invoice %s for order %s", key, order_id)
+        self._forget_older_versions(order_id, key)
+        self._evict()
+        return path, key
+
+    def _forget_older_versions(self, order_id, key):
+        prefix = f"{order_id}-"
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(".pdf") and name != f"{order_id}-{key}.pdf":
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self):
+        """Delete least recently used invoices until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+invoice_cache = InvoiceCache()
@@ -0,0 +1,46 @@
+"""
+Fast JSON for Flask responses and request bodies, backed by orjson.
+
+Handles Mongo types natively so models can return raw documents:
+ObjectId becomes its hex string and datetimes keep the API's existing
+"YYYY-MM-DD HH:MM:SS" format.
+"""
+from datetime import date, datetime
+
+import orjson
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Serialize types orjson does not handle (or that we format ourselves)."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(obj, date):
+        return obj.strftime("%Y-%m-%d")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """Serialize to UTF-8 JSON bytes with the same rules as API responses."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider that uses orjson for dumps/loads and jsonify."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype="application/json")
@@ -0,0 +1,119 @@
+"""
+Structured logging for the Sweet Store backend.
+
+Every record is written as one JSON line carrying the current request ID.
+Callers only format into a queue; a background listener thread does the
+JSON encoding and the actual write, so a slow stdout pipe never blocks a
+request. Use %-style arguments (log.debug("x=%s", x)) so disabled levels
+cost nothing beyond a level check.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Request ID of the request being handled by the current thread/context
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_setup_lock = threading.Lock()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a log record as a single JSON line."""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        # Structured fields passed with extra={...}
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the active request ID to each record in the emitting thread."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps exceptions separate from the message text.
+
+    The stock handler folds the traceback into ``msg``; we keep it in
+    ``exc_text`` so the JSON formatter can emit it as its own field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=None):
+    """Install the queue handler on the root logger (idempotent).
+
+    Level defaults to the LOG_LEVEL env var (INFO when unset).
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level_name = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _StructuredQueueHandler(log_queue)
+        queue_handler.addFilter(RequestIdFilter())
+
+        root = logging.getLogger()
+        root.handlers = [queue_handler]
+        root.setLevel(getattr(logging, level_name, logging.INFO))
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+
+def _stop_listener():
+    """Flush pending records on interpreter shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    """Return a module logger, configuring structured logging on first use."""
+    setup_logging()
+    return logging.getLogger(name)
@@ -0,0 +1,116 @@
+"""
+Manager notifications for new orders: one email per order, or digests.
+
+MANAGER_NOTIFY_MODE=instant (the default) emails each order's invoice as it
+is placed. MANAGER_NOTIFY_MODE=digest queues new orders in Mongo and sends
+one summary email every DIGEST_INTERVAL_SECONDS, with the invoices attached
+as PDFs or bundled in a single zip. On a busy festival day that is one SMTP
+session per interval instead of one per order.
+
+Each worker runs a sender thread once it has queued an order; a lease in
+Mongo lets only one of them send at a time, and entries are marked sent only
+after the email went out, so a failed send is retried on the next round.
+"""
+import os
+import socket
+import threading
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+from model.notification_model import queue_order_notification, claim_digest_lease, get_pending_notifications, mark_notifications_sent
+from model.order_model import get_orders_by_ids
+from utils.email_service import send_order_digest_to_manager
+from utils.invoice_cache import invoice_cache
+from utils.logger import get_logger
+from utils.pdf_generator import generate_order_pdf
+from utils.report_jobs import report_runner
+
+log = get_logger(__name__)
+
+MANAGER_NOTIFY_MODE = (os.getenv("MANAGER_NOTIFY_MODE") or "instant").strip().lower()
+DIGEST_INTERVAL_SECONDS = max(10, int(os.getenv("DIGEST_INTERVAL_SECONDS", 900)))
+# Orders per digest email; a larger backlog is split over several emails
+DIGEST_MAX_ORDERS = max(1, int(os.getenv("DIGEST_MAX_ORDERS", 100)))
+# How invoices travel with a digest: zip, pdf (one attachment each) or none
+DIGEST_ATTACHMENTS = (os.getenv("DIGEST_ATTACHMENTS") or "zip").strip().lower()
+
+
+def _render_invoice(order, path):
+    # In the report process pool, keeping ReportLab off the worker's GIL
+    return report_runner.render(generate_order_pdf, order, path)
+
+
+class ManagerNotifier:
+    def __init__(self, mode=MANAGER_NOTIFY_MODE, interval=DIGEST_INTERVAL_SECONDS):
+        self.digest_enabled = mode == "digest"
+        self.interval = interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def queue_order(self, order):
+        """Add a newly placed order to the next digest."""
+        queue_order_notification(order)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="manager-digest", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            try:
+                self.send_digest()
+            except Exception:
+                log.exception("Order digest failed")
+
+    def send_digest(self):
+        """Send pending orders to the manager if this worker holds the lease.
+        Returns the number of orders reported.
+        """
+        if not claim_digest_lease(self.owner, self.interval):
+            return 0
+        reported = 0
+        while True:
+            entries = get_pending_notifications(DIGEST_MAX_ORDERS)
+            if not entries:
+                break
+            orders = get_orders_by_ids([e["orderId"] for e in entries])
+            if orders and not self._send(orders):
+                # Keep the entries pending; the next round retries them
+                break
+            mark_notifications_sent([e["_id"] for e in entries])
+            reported += len(orders)
+            if len(entries) < DIGEST_MAX_ORDERS:
+                break
+        if reported:
+            log.info("Order digest sent", extra={"orders": reported})
+        return reported
+
+    def _send(self, orders):
+        attachments = []
+        for order in orders if DIGEST_ATTACHMENTS in ("zip", "pdf") else []:
+            try:
+                path, _ = invoice_cache.get_invoice(order, _render_invoice)
+                if path:
+                    with open(path, "rb") as f:
+                        attachments.append((f"invoice_{order['_id']}.pdf", f.read(), "pdf"))
+            except Exception:
+                log.exception("Invoice for digest failed", extra={"order_id": str(order.get("_id"))})
+
+        note = None
+        if attachments and DIGEST_ATTACHMENTS == "zip":
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as bundle:
+                for filename, data, _ in attachments:
+                    bundle.writestr(filename, data)
+            zip_name = f"invoices_{datetime.now().strftime('%Y-%m-%d_%H%M')}.zip"
+            attachments = [(zip_name, buffer.getvalue(), "zip")]
+            note = f"The invoices are bundled in {zip_name}."
+        elif attachments:
+            note = "Each order's invoice PDF is attached."
+        return send_order_digest_to_manager(orders, attachments, note)
+
+
+manager_notifier = ManagerNotifier()
@@ -0,0 +1,135 @@
+"""
+Streaming CSV/XLSX export of order lines for accounting.
+
+One row per order item, with the order's customer and date fields repeated
+on every row (an order without items still gets one row). Rows are produced
+from a cursor and written out as they come, so memory use does not depend
+on the size of the exported range.
+"""
+import csv
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+try:
+    import xlsxwriter
+except ImportError:  # xlsx export is optional; CSV is always available
+    xlsxwriter = None
+
+EXPORT_COLUMNS = [
+    "orderId", "orderDate", "deliveryDate", "status", "customerName", "mobile", "address",
+    "sweetId", "sweetName", "quantity", "unit", "price", "lineTotal",
+    "orderTotal", "advancePaid", "createdAt",
+]
+# Rows buffered before a CSV chunk is yielded
+CSV_CHUNK_ROWS = 200
+# Characters that make spreadsheet apps treat a cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def _defuse(value):
+    """CSV cell that spreadsheet apps will not evaluate as a formula."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _number(value):
+    try:
+        return round(float(value), 2)
+    except (TypeError, ValueError):
+        return ""
+
+
+def _timestamp(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else (value or "")
+
+
+def order_rows(orders):
+    """Flatten orders into export rows (lists in EXPORT_COLUMNS order)."""
+    for order in orders:
+        head = [
+            str(order.get("_id", "")),
+            order.get("orderDate") or "",
+            order.get("deliveryDate") or "",
+            order.get("status") or "",
+            _text(order.get("customerName")),
+            _text(order.get("mobile")),
+            _text(order.get("address")),
+        ]
+        tail = [
+            _number(order.get("total")),
+            _number(order.get("advancePaid")),
+            _timestamp(order.get("createdAt")),
+        ]
+        items = [i for i in order.get("items") or [] if isinstance(i, dict)]
+        if not items:
+            yield head + [""] * 6 + tail
+            continue
+        for item in items:
+            line_total = item.get("lineTotal")
+            if line_total is None:
+                try:
+                    line_total = float(item.get("price") or 0) * float(item.get("quantity") or 0)
+                except (TypeError, ValueError):
+                    line_total = None
+            yield head + [
+                str(item.get("sweetId") or ""),
+                _text(item.get("sweetName") or item.get("name")),
+                _number(item.get("quantity")),
+                item.get("unit") or "",
+                _number(item.get("price")),
+                _number(line_total),
+            ] + tail
+
+
+def iter_csv(rows):
+    """Encode rows as CSV (with header), yielding UTF-8 chunks of CSV_CHUNK_ROWS rows."""
+    buffer = StringIO()
+    # BOM so Excel opens the file as UTF-8
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 0
+    for row in rows:
+        writer.writerow([_defuse(c) for c in row])
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_xlsx(rows):
+    """Write rows to a temporary .xlsx file in xlsxwriter's constant-memory mode
+    (each row is flushed to disk as soon as it is written). Returns the path;
+    the caller deletes it.
+    """
+    if xlsxwriter is None:
+        raise RuntimeError("xlsx export requires the XlsxWriter package")
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tempfile.gettempdir()})
+        sheet = workbook.add_worksheet("Orders")
+        bold = workbook.add_format({"bold": True})
+        sheet.write_row(0, 0, EXPORT_COLUMNS, bold)
+        for index, row in enumerate(rows, start=1):
+            # Explicit cell types: text is never interpreted as a formula
+            for col, value in enumerate(row):
+                if isinstance(value, (int, float)):
+                    sheet.write_number(index, col, value)
+                elif value != "":
+                    sheet.write_string(index, col, str(value))
+        workbook.close()
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,75 @@
+"""
+CSV parsing for bulk order import (festival pre-order spreadsheets).
+
+One CSV row per order item. Rows sharing the same ``orderRef`` are merged
+into a single order; rows without an ``orderRef`` are orders of their own.
+Order-level columns are read from the first row of each order.
+"""
+import csv
+from io import StringIO
+
+ORDER_FIELDS = ["customerName", "mobile", "address", "orderDate", "deliveryDate", "preference", "advancePaid", "total"]
+ITEM_FIELDS = ["sweetId", "sweetName", "quantity", "unit", "price"]
+REQUIRED_COLUMNS = ["orderDate", "deliveryDate", "sweetId", "quantity"]
+
+
+def parse_orders_csv(text):
+    """
+    Parse CSV text into order dictionaries in the /place_order shape.
+
+    Args:
+        text: Decoded CSV content with a header row
+
+    Returns:
+        tuple: (row_labels, orders, errors) where row_labels[i] is the CSV line
+        number of the first row of orders[i], and errors is a list of
+        {"row": line, "error": message} for rows that could not be parsed
+    """
+    reader = csv.DictReader(StringIO(text))
+    header = [h.strip() for h in (reader.fieldnames or [])]
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        return [], [], [{"row": 1, "error": f"Missing required column(s): {', '.join(missing)}"}]
+    reader.fieldnames = header
+
+    orders_by_ref = {}
+    row_labels = []
+    orders = []
+    errors = []
+
+    # Header is line 1, so the first data row is line 2
+    for line_no, row in enumerate(reader, start=2):
+        row = {k: (v or "").strip() for k, v in row.items() if k}
+        if not any(row.values()):
+            continue
+
+        item = {k: row[k] for k in ITEM_FIELDS if row.get(k)}
+        ref = row.get("orderRef")
+        order = orders_by_ref.get(ref) if ref else None
+
+        if order is None:
+            order = {k: row[k] for k in ORDER_FIELDS if row.get(k)}
+            order["items"] = []
+            if ref:
+                orders_by_ref[ref] = order
+            row_labels.append(line_no)
+            orders.append(order)
+        elif any(row.get(k) and row[k] != order.get(k) for k in ("orderDate", "deliveryDate")):
+            errors.append({"row": line_no, "error": f"Dates differ from earlier rows of order '{ref}'"})
+            continue
+
+        order["items"].append(item)
+
+    # Fill in totals the spreadsheet left blank from the item lines
+    for order in orders:
+        if "total" in order:
+            continue
+        total = 0.0
+        for item in order["items"]:
+            try:
+                total += float(item.get("price", 0) or 0) * float(item.get("quantity", 0) or 0)
+            except (ValueError, TypeError):
+                continue
+        order["total"] = total
+
+    return row_labels, orders, errors
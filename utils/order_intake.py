@@ -0,0 +1,336 @@
+"""
+Write-behind order intake for festival peaks.
+
+With ORDER_INTAKE_MODE=buffered, /place_order admits an order as usual
+(prices, validation, capacity reservation), appends it to a local
+append-only log and answers as soon as the log is fsynced, instead of
+waiting for its own insert_one and the invoice PDF/email. Concurrent orders
+share one fsync: the first waiter holds the sync for
+ORDER_INTAKE_GROUP_COMMIT_MS so others can join it (group commit).
+
+A flusher thread writes logged orders to Mongo with insert_many in batches
+of up to ORDER_INTAKE_FLUSH_BATCH, then hands them to the manager
+notifications. Orders carry their _id from the start, so an order inserted
+twice (a replay after a crash, a retried batch) is stored once.
+
+Each worker logs to its own slot directory under ORDER_INTAKE_DIR, held
+with a file lock for the life of the process. The log is split into
+segments, and a segment is deleted once all its orders are in Mongo. On
+start a worker replays whatever its slot still holds, and inserts the
+orders of slots left behind by workers that are gone. Records are raw BSON
+documents, so a write torn by a crash is recognised by its length and cut
+off.
+
+Buffered orders show up in admin lists once flushed, normally within
+ORDER_INTAKE_FLUSH_INTERVAL_MS.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bson
+from bson import ObjectId
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; all workers then share slot 0, so run one worker there
+    fcntl = None
+
+from model.capacity_model import release_order_capacity
+from model.order_model import admit_order, insert_admitted_orders
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+ORDER_INTAKE_MODE = (os.getenv("ORDER_INTAKE_MODE") or "direct").strip().lower()
+ORDER_INTAKE_DIR = os.getenv("ORDER_INTAKE_DIR") or "order_intake"
+ORDER_INTAKE_GROUP_COMMIT_MS = float(os.getenv("ORDER_INTAKE_GROUP_COMMIT_MS", 2))
+ORDER_INTAKE_FLUSH_BATCH = max(1, int(os.getenv("ORDER_INTAKE_FLUSH_BATCH", 500)))
+ORDER_INTAKE_FLUSH_INTERVAL_MS = float(os.getenv("ORDER_INTAKE_FLUSH_INTERVAL_MS", 200))
+# A new log segment is started once the current one reaches this size
+ORDER_INTAKE_SEGMENT_BYTES = int(os.getenv("ORDER_INTAKE_SEGMENT_BYTES", 4 * 1024 * 1024))
+MAX_SLOTS = 64
+
+
+def _segment_name(seq):
+    return f"segment-{seq:012d}.log"
+
+
+def _segments(slot_dir):
+    """(seq, path) of every log segment in a slot, oldest first."""
+    found = []
+    for name in os.listdir(slot_dir):
+        if name.startswith("segment-") and name.endswith(".log"):
+            found.append((int(name[8:-4]), os.path.join(slot_dir, name)))
+    return sorted(found)
+
+
+def read_segment(path, repair=False):
+    """Orders logged in a segment. A torn record at the end (a crash mid-write)
+    is ignored, and cut off the file when repair is set.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    orders = []
+    pos = 0
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], "little") if pos + 4 <= len(data) else 0
+        if length < 5 or pos + length > len(data) or data[pos + length - 1] != 0:
+            break
+        try:
+            orders.append(bson.decode(data[pos:pos + length]))
+        except Exception:
+            break
+        pos += length
+    if pos < len(data):
+        log.warning("Ignoring torn record at the end of the order log", extra={"path": path, "bytes": len(data) - pos})
+        if repair:
+            with open(path, "r+b") as f:
+                f.truncate(pos)
+                os.fsync(f.fileno())
+    return orders
+
+
+class OrderIntakeBuffer:
+    def __init__(self, mode=ORDER_INTAKE_MODE, directory=ORDER_INTAKE_DIR,
+                 group_commit_ms=ORDER_INTAKE_GROUP_COMMIT_MS, flush_batch=ORDER_INTAKE_FLUSH_BATCH,
+                 flush_interval_ms=ORDER_INTAKE_FLUSH_INTERVAL_MS, segment_bytes=ORDER_INTAKE_SEGMENT_BYTES):
+        self.enabled = mode == "buffered"
+        self.directory = directory
+        self.group_commit_seconds = group_commit_ms / 1000
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.segment_bytes = segment_bytes
+        # Called with each batch of newly inserted orders, off the flusher thread
+        self.on_inserted = None
+
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._slot_dir = None
+        self._slot_lock = None
+
+        # Log writing: _write_lock guards the file and segment bookkeeping
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._segment_seq = 0
+        self._segment_size = 0
+        self._segment_pending = {}  # segment seq -> logged orders not yet in Mongo
+        self._written = 0           # bytes appended by this process
+        # Group commit: one thread at a time fsyncs on behalf of all waiters
+        self._sync_cond = threading.Condition()
+        self._synced = 0
+        self._syncing = False
+
+        self._queue = deque()       # (segment seq, order) awaiting insert
+        self._queue_cond = threading.Condition()
+        self._notify_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="intake-notify")
+
+    # ---- start-up and replay ----
+
+    def start(self):
+        """Claim a log slot, replay what it holds and start the flusher (once)."""
+        with self._start_lock:
+            if self._started:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._slot_dir, self._slot_lock = self._claim_slot()
+            last_seq = 0
+            replayed = 0
+            for seq, path in _segments(self._slot_dir):
+                orders = read_segment(path, repair=True)
+                last_seq = seq
+                if not orders:
+                    os.remove(path)
+                    continue
+                self._segment_pending[seq] = len(orders)
+                self._queue.extend((seq, order) for order in orders)
+                replayed += len(orders)
+            if replayed:
+                log.info("Replaying logged orders", extra={"orders": replayed, "slot": self._slot_dir})
+            self._open_segment(last_seq + 1)
+            threading.Thread(target=self._run, name="order-intake-flush", daemon=True).start()
+            atexit.register(self.drain)
+            self._started = True
+
+    def _claim_slot(self):
+        for n in range(MAX_SLOTS if fcntl is not None else 1):
+            slot_dir = os.path.join(self.directory, f"slot-{n}")
+            os.makedirs(slot_dir, exist_ok=True)
+            lock_file = open(os.path.join(slot_dir, ".lock"), "w")
+            if fcntl is None:
+                return slot_dir, lock_file
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot_dir, lock_file
+            except BlockingIOError:
+                lock_file.close()
+        raise RuntimeError(f"No free order intake slot in {self.directory}")
+
+    def _adopt_orphaned_slots(self):
+        """Insert the orders of slots no live worker holds (e.g. after scaling down)."""
+        if fcntl is None:
+            return
+        for name in sorted(os.listdir(self.directory)):
+            slot_dir = os.path.join(self.directory, name)
+            if slot_dir == self._slot_dir or not name.startswith("slot-") or not _segments(slot_dir):
+                continue
+            with open(os.path.join(slot_dir, ".lock"), "w") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker owns it
+                try:
+                    for _, path in _segments(slot_dir):
+                        orders = read_segment(path)
+                        for i in range(0, len(orders), self.flush_batch):
+                            self._inserted(insert_admitted_orders(orders[i:i + self.flush_batch]))
+                        os.remove(path)
+                    log.info("Recovered orders of an abandoned intake slot", extra={"slot": slot_dir})
+                except Exception:
+                    log.exception("Could not recover abandoned intake slot", extra={"slot": slot_dir})
+
+    # ---- intake ----
+
+    def _open_segment(self, seq):
+        self._file = open(os.path.join(self._slot_dir, _segment_name(seq)), "ab")
+        self._segment_seq = seq
+        self._segment_size = 0
+
+    def _rotate(self):
+        """Seal the current segment (durably) and start the next one. Needs _write_lock."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        sealed = self._segment_seq
+        with self._sync_cond:
+            self._synced = max(self._synced, self._written)
+            self._sync_cond.notify_all()
+        self._open_segment(sealed + 1)
+        if not self._segment_pending.get(sealed):
+            self._segment_pending.pop(sealed, None)
+            os.remove(os.path.join(self._slot_dir, _segment_name(sealed)))
+
+    def submit(self, order):
+        """Admit an order, log it durably and return it with its _id.
+        It reaches the database when the flusher next runs. Raises like
+        place_order for invalid orders or when capacity is exhausted.
+        """
+        self.start()
+        admit_order(order)
+        order["_id"] = ObjectId()
+        try:
+            record = bson.encode(order)
+            with self._write_lock:
+                if self._segment_size >= self.segment_bytes:
+                    self._rotate()
+                self._file.write(record)
+                self._written += len(record)
+                self._segment_size += len(record)
+                seq = self._segment_seq
+                self._segment_pending[seq] = self._segment_pending.get(seq, 0) + 1
+                end = self._written
+        except Exception:
+            release_order_capacity(order)
+            raise
+        self._sync_to(end)
+        with self._queue_cond:
+            self._queue.append((seq, order))
+            if len(self._queue) >= self.flush_batch:
+                self._queue_cond.notify()
+        return order
+
+    def _sync_to(self, end):
+        """Return once the log is fsynced up to byte `end` of this process's writes."""
+        with self._sync_cond:
+            while self._synced < end and self._syncing:
+                self._sync_cond.wait()
+            if self._synced >= end:
+                return
+            self._syncing = True
+        synced = None
+        try:
+            # Give orders arriving right now the chance to share this fsync
+            if self.group_commit_seconds:
+                time.sleep(self.group_commit_seconds)
+            with self._write_lock:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                synced = self._written
+        finally:
+            with self._sync_cond:
+                self._syncing = False
+                if synced is not None:
+                    self._synced = max(self._synced, synced)
+                self._sync_cond.notify_all()
+
+    # ---- flushing ----
+
+    def _run(self):
+        self._adopt_orphaned_slots()
+        while True:
+            try:
+                if not self.flush_once(wait=True):
+                    time.sleep(1)  # database unavailable; the batch is retried
+            except Exception:
+                log.exception("Order intake flusher failed")
+                time.sleep(1)
+
+    def flush_once(self, wait=False):
+        """Insert one batch of logged orders. Returns False if the insert failed."""
+        with self._queue_cond:
+            if wait and len(self._queue) < self.flush_batch:
+                self._queue_cond.wait(self.flush_interval)
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.flush_batch))]
+        if not batch:
+            return True
+        try:
+            inserted = insert_admitted_orders([order for _, order in batch])
+        except Exception as e:
+            log.warning("Could not flush %d logged orders: %s", len(batch), e)
+            with self._queue_cond:
+                self._queue.extendleft(reversed(batch))
+            return False
+        self._forget_flushed(seq for seq, _ in batch)
+        self._inserted(inserted)
+        return True
+
+    def _forget_flushed(self, seqs):
+        with self._write_lock:
+            for seq in seqs:
+                self._segment_pending[seq] -= 1
+            for seq in [s for s, n in self._segment_pending.items() if n == 0 and s != self._segment_seq]:
+                del self._segment_pending[seq]
+                try:
+                    os.remove(os.path.join(self._slot_dir, _segment_name(seq)))
+                except FileNotFoundError:
+                    pass
+            if self._segment_size and not self._segment_pending.get(self._segment_seq):
+                # Everything logged so far is stored; start afresh so a replay has nothing to redo
+                self._rotate()
+
+    def _inserted(self, orders):
+        if orders and self.on_inserted is not None:
+            self._notify_pool.submit(self._notify, orders)
+
+    def _notify(self, orders):
+        try:
+            self.on_inserted(orders)
+        except Exception:
+            log.exception("Notification for buffered orders failed")
+
+    def drain(self, timeout=10):
+        """Insert what is still queued (at shutdown); anything left is replayed later."""
+        deadline = time.monotonic() + timeout
+        while self._queue and time.monotonic() < deadline:
+            if not self.flush_once():
+                break
+
+    def pending(self):
+        """Logged orders not yet in the database."""
+        return len(self._queue)
+
+
+order_intake = OrderIntakeBuffer()
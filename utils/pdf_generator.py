@@ -6,6 +6,9 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 from datetime import datetime
 import os
+from utils.logger import get_logger
+
+log = get_logger(__name__)
 
 def generate_order_pdf(order_data, filename="invoice.pdf"):
     """
@@ -18,11 +21,6 @@ def generate_order_pdf(order_data, filename="invoice.pdf"):
     Returns:
         str: Path to generated PDF file
     """
-    print(f"📄 generate_order_pdf called")
-    print(f"   Filename: {filename}")
-    print(f"   Order Data Type: {type(order_data)}")
-    print(f"   Order Data Keys: {order_data.keys() if hasattr(order_data, 'keys') else 'Not a dict'}")
-    
     try:
         # Create PDF document
         doc = SimpleDocTemplate(filename, pagesize=letter)
@@ -163,11 +161,11 @@ def generate_order_pdf(order_data, filename="invoice.pdf"):
         
         # Build PDF
         doc.build(elements)
-        print(f"✅ PDF generated: {filename}")
+        log.debug("Invoice PDF generated: %s", filename)
         return filename
         
-    except Exception as e:
-        print(f"❌ Failed to generate PDF: {str(e)}")
+    except Exception:
+        log.exception("Failed to generate PDF")
         return None
 
 
@@ -183,10 +181,6 @@ def generate_orders_statement_pdf(orders, filters, filename="statement.pdf"):
     Returns:
         bytes: PDF file bytes
     """
-    print(f"📄 generate_orders_statement_pdf called")
-    print(f"   Filename: {filename}")
-    print(f"   Total Orders: {len(orders)}")
-    
     try:
         from io import BytesIO
         
@@ -436,11 +430,110 @@ def generate_orders_statement_pdf(orders, filters, filename="statement.pdf"):
         pdf_bytes = buffer.getvalue()
         buffer.close()
         
-        print(f"✅ Statement PDF generated: {len(pdf_bytes)} bytes")
+        log.info("Statement PDF generated", extra={"order_count": len(orders), "bytes": len(pdf_bytes)})
+        return pdf_bytes
+        
+    except Exception:
+        log.exception("Failed to generate statement PDF")
+        return None
+
+
+def generate_prep_list_pdf(prep_list):
+    """
+    Generate a printable kitchen prep list for one delivery date.
+    
+    Args:
+        prep_list: Dictionary returned by get_prep_list
+    
+    Returns:
+        bytes: PDF file bytes
+    """
+    try:
+        from io import BytesIO
+        
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        elements = []
+        styles = getSampleStyleSheet()
+        
+        # Same look as the order invoice
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#FFD700'),
+            spaceAfter=20,
+            alignment=TA_CENTER
+        )
+        
+        heading_style = ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=14,
+            textColor=colors.HexColor('#D2691E'),
+            spaceAfter=12
+        )
+        
+        elements.append(Paragraph("🍬 SWEET STORE", title_style))
+        elements.append(Paragraph(f"Kitchen Prep List - Delivery {prep_list.get('deliveryDate', 'N/A')}", heading_style))
+        elements.append(Paragraph(
+            f"Orders: {prep_list.get('orderCount', 0)} | "
+            f"Total: {prep_list.get('totalKg', 0):.2f} kg, {prep_list.get('totalPieces', 0):.0f} pieces",
+            styles['Normal']
+        ))
+        elements.append(Spacer(1, 0.3*inch))
+        
+        items_data = [['#', 'Sweet', 'Quantity', 'Unit', 'Orders']]
+        for idx, sweet in enumerate(prep_list.get('sweets', []), 1):
+            quantity = sweet.get('quantity', 0)
+            items_data.append([
+                str(idx),
+                sweet.get('name') or 'Unknown',
+                f"{quantity:.2f}" if sweet.get('unit') == 'kg' else f"{quantity:.0f}",
+                sweet.get('unit', 'kg'),
+                str(sweet.get('orders', 0))
+            ])
+        
+        items_table = Table(items_data, colWidths=[0.5*inch, 3*inch, 1.2*inch, 0.8*inch, 0.8*inch])
+        items_table.setStyle(TableStyle([
+            # Header row
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FFD700')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            
+            # Data rows
+            ('FONT', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 11),
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+            
+            # Grid
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]))
+        
+        elements.append(items_table)
+        elements.append(Spacer(1, 0.5*inch))
+        
+        footer_text = f"""
+        <para align=center>
+        <font size=10 color="#666666">
+        Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        </font>
+        </para>
+        """
+        elements.append(Paragraph(footer_text, styles['Normal']))
+        
+        doc.build(elements)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
         return pdf_bytes
         
-    except Exception as e:
-        print(f"❌ Failed to generate statement PDF: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Failed to generate prep list PDF")
         return None
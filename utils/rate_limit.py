@@ -0,0 +1,256 @@
+"""
+Token-bucket rate limiting and load shedding for expensive public endpoints.
+
+Each limited endpoint has a per-IP bucket and a global bucket. Buckets live
+in process memory by default (limits are then per worker), or in Mongo when
+RATE_LIMIT_STORE=mongo so every worker draws from the same bucket; if the
+shared store fails the worker falls back to its local buckets rather than
+rejecting traffic.
+
+Before the buckets are consulted the request may be shed outright (503)
+when this worker is saturated: too many requests in flight, too much
+PDF/SMTP work running, or the request already waited too long in the
+proxy queue (X-Request-Start).
+"""
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", 1))
+
+# A gthread worker never has more requests in flight than it has threads
+# (GUNICORN_THREADS, as in gunicorn_config.py), so the default sheds once
+# the request being checked would take the last free thread
+SHED_MAX_INFLIGHT_REQUESTS = int(os.getenv("SHED_MAX_INFLIGHT_REQUESTS") or max(1, int(os.getenv("GUNICORN_THREADS", 8)) - 1))
+SHED_MAX_SLOW_WORK = int(os.getenv("SHED_MAX_SLOW_WORK", 4))
+SHED_MAX_QUEUE_MS = int(os.getenv("SHED_MAX_QUEUE_MS", 0))
+SHED_RETRY_AFTER_SECONDS = 5
+
+MEMORY_STORE_MAX_KEYS = 10000
+
+# "<requests>/<seconds>": burst size and the period over which it refills
+DEFAULT_LIMITS = {
+    "place_order": {"per_ip": "10/60", "global": "120/60"},
+    "contact": {"per_ip": "3/300", "global": "30/60"},
+}
+
+
+def parse_limit(value):
+    """Parse '<count>/<seconds>' into (rate per second, capacity); None if disabled."""
+    if not value or value.strip().lower() in ("0", "off", "none"):
+        return None
+    try:
+        count, seconds = value.split("/", 1)
+        count, seconds = float(count), float(seconds)
+    except ValueError:
+        log.warning("Ignoring invalid rate limit %r", value)
+        return None
+    if count <= 0 or seconds <= 0:
+        return None
+    return count / seconds, count
+
+
+def _endpoint_limits(name):
+    limits = {}
+    for scope, default in DEFAULT_LIMITS.get(name, {}).items():
+        limits[scope] = parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}_{scope.upper()}", default))
+    return limits
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Refill and take one token. Returns (allowed, tokens_left)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, 0))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Third field: how long until this bucket is full again when left idle
+            self._buckets[key] = (tokens, now, capacity / rate)
+            if len(self._buckets) > MEMORY_STORE_MAX_KEYS:
+                self._prune(now)
+        return allowed, tokens
+
+    def _prune(self, now):
+        # Buckets idle long enough to be full again carry no state worth keeping
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < v[2]}
+
+
+class RateLimiter:
+    def __init__(self, store=RATE_LIMIT_STORE):
+        self.shared = store == "mongo"
+        self._local = MemoryBucketStore()
+        self._limits = {}
+
+    def _take(self, key, rate, capacity):
+        if self.shared:
+            try:
+                from model.rate_limit_model import take_shared_token
+                return take_shared_token(key, rate, capacity)
+            except Exception as e:
+                log.warning("Shared rate limit store failed, using local buckets: %s", e)
+        return self._local.take(key, rate, capacity)
+
+    def check(self, name, client_ip):
+        """Take a token from the endpoint's per-IP then global bucket.
+        Returns None when allowed, or the number of seconds to wait.
+        """
+        if name not in self._limits:
+            self._limits[name] = _endpoint_limits(name)
+        buckets = (("per_ip", f"{name}:ip:{client_ip}"), ("global", f"{name}:global"))
+        for scope, key in buckets:
+            limit = self._limits[name].get(scope)
+            if limit is None:
+                continue
+            rate, capacity = limit
+            allowed, tokens = self._take(key, rate, capacity)
+            if not allowed:
+                return max(1, math.ceil((1 - tokens) / rate))
+        return None
+
+
+class LoadShedder:
+    """Tracks how busy this worker is and decides when to turn requests away."""
+
+    def __init__(self, max_inflight=SHED_MAX_INFLIGHT_REQUESTS, max_slow_work=SHED_MAX_SLOW_WORK,
+                 max_queue_ms=SHED_MAX_QUEUE_MS):
+        self.max_inflight = max_inflight
+        self.max_slow_work = max_slow_work
+        self.max_queue_ms = max_queue_ms
+        self.inflight = 0
+        self.slow_work_running = 0
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self.inflight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.inflight -= 1
+
+    @contextmanager
+    def slow_work(self):
+        """Mark a block of PDF rendering or SMTP sending as running."""
+        with self._lock:
+            self.slow_work_running += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.slow_work_running -= 1
+
+    def shed_reason(self, request_start_header=None):
+        """Why this request should be shed, or None to let it through."""
+        # The current request is itself counted in inflight
+        if self.max_inflight and self.inflight > self.max_inflight:
+            return "too many requests in flight"
+        if self.max_slow_work and self.slow_work_running >= self.max_slow_work:
+            return "too much PDF/email work running"
+        if self.max_queue_ms and request_start_header:
+            waited_ms = _queue_time_ms(request_start_header)
+            if waited_ms is not None and waited_ms > self.max_queue_ms:
+                return f"queued for {waited_ms:.0f} ms"
+        return None
+
+
+def _queue_time_ms(header):
+    """Milliseconds since the proxy received the request, from X-Request-Start
+    ('t=<epoch>' or a bare epoch, in seconds, milliseconds or microseconds)."""
+    value = header.strip()
+    if value.startswith("t="):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return (time.time() - started) * 1000
+
+
+rate_limiter = RateLimiter()
+load_shedder = LoadShedder()
+
+
+def client_ip(request):
+    """Client address as seen by the outermost trusted proxy."""
+    forwarded = request.access_route if request.headers.get("X-Forwarded-For") else []
+    if RATE_LIMIT_TRUSTED_PROXIES and len(forwarded) >= RATE_LIMIT_TRUSTED_PROXIES:
+        return forwarded[-RATE_LIMIT_TRUSTED_PROXIES]
+    return request.remote_addr or "unknown"
+
+
+def _reject(status, message, retry_after):
+    from flask import jsonify
+
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def rate_limited(name):
+    """Decorate a view with load shedding and the named endpoint's rate limits."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request
+
+            if not RATE_LIMIT_ENABLED or request.method == "OPTIONS":
+                return view(*args, **kwargs)
+            reason = load_shedder.shed_reason(request.headers.get("X-Request-Start"))
+            if reason:
+                log.warning("Shedding %s request: %s", name, reason)
+                return _reject(503, "Server is busy, please try again shortly", SHED_RETRY_AFTER_SECONDS)
+            ip = client_ip(request)
+            retry_after = rate_limiter.check(name, ip)
+            if retry_after is not None:
+                log.warning("Rate limited %s request", name, extra={"client_ip": ip, "retry_after": retry_after})
+                return _reject(429, "Too many requests, please slow down", retry_after)
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def init_load_shedding(app):
+    """Count this worker's in-flight requests for the load shedder."""
+
+    @app.before_request
+    def _count_request():
+        from flask import request
+
+        load_shedder.request_started()
+        request.environ["sweet_store.counted_inflight"] = True
+
+    @app.teardown_request
+    def _uncount_request(exc=None):
+        from flask import request
+
+        if request.environ.pop("sweet_store.counted_inflight", False):
+            load_shedder.request_finished()
+
+    return app
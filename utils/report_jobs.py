@@ -0,0 +1,121 @@
+"""
+Background rendering of report PDFs in a bounded process pool.
+
+ReportLab rendering is CPU-bound, so it runs in REPORT_WORKERS child
+processes per gunicorn worker instead of in the request thread, where it
+would hold the GIL against every other request. A job is identified by the
+hash of its request: identical requests (from any worker) join the same
+job document, so one statement is rendered once. Job state and finished
+PDFs live in Mongo (see model.report_model), so clients can poll and
+download from whichever worker answers.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from model.report_model import claim_report_job, complete_report_job, fail_report_job, purge_expired_reports
+from utils.logger import get_logger
+from utils.pdf_generator import generate_orders_statement_pdf
+
+log = get_logger(__name__)
+
+REPORT_WORKERS = max(1, int(os.getenv("REPORT_WORKERS", 1)))
+# Renders queued or running in this worker before new jobs are refused
+REPORT_MAX_PENDING = max(1, int(os.getenv("REPORT_MAX_PENDING", 4)))
+# How long the synchronous statement endpoint waits for its render
+REPORT_SYNC_TIMEOUT_SECONDS = int(os.getenv("REPORT_SYNC_TIMEOUT_SECONDS", 120))
+
+
+class ReportQueueFull(Exception):
+    """Raised when this worker already has REPORT_MAX_PENDING renders in flight."""
+
+
+def report_job_id(kind, payload):
+    """Stable id for a report request: identical requests get the same id."""
+    canonical = json.dumps({"kind": kind, "payload": payload}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ReportRunner:
+    def __init__(self, workers=REPORT_WORKERS, max_pending=REPORT_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created lazily so the pool belongs to the gunicorn worker, not the
+        # master. "spawn" children start clean instead of forking a process
+        # that has threads and open Mongo sockets.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            try:
+                return self._get_pool().submit(fn, *args)
+            except BrokenProcessPool:
+                # A child died (e.g. OOM-killed); start a fresh pool
+                log.warning("Report process pool was broken; restarting it")
+                self._pool = None
+                return self._get_pool().submit(fn, *args)
+
+    def submit_statement(self, orders, filters):
+        """Start (or join) the statement job for this request. Returns (job, created)."""
+        job_id = report_job_id("statement", {"orders": orders, "filters": filters})
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ReportQueueFull()
+            self._pending += 1
+        try:
+            purge_expired_reports()
+            job, created = claim_report_job(job_id, "statement", {"filters": filters, "orderCount": len(orders)})
+            if not created:
+                self._release()
+                return job, False
+            filename = f"orders_statement_{datetime.now().strftime('%Y-%m-%d')}.pdf"
+            future = self._submit(generate_orders_statement_pdf, orders, filters)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda f: self._finish(job_id, filename, f))
+        log.info("Statement job queued", extra={"job_id": job_id, "order_count": len(orders)})
+        return job, True
+
+    def render(self, fn, *args):
+        """Run a (picklable, module-level) render function in the pool and wait for its result."""
+        return self._submit(fn, *args).result(timeout=REPORT_SYNC_TIMEOUT_SECONDS)
+
+    def render_statement(self, orders, filters):
+        """Render a statement in the pool and wait for it. Returns bytes or None."""
+        return self.render(generate_orders_statement_pdf, orders, filters)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _finish(self, job_id, filename, future):
+        self._release()
+        try:
+            pdf_bytes = future.result()
+            if not pdf_bytes:
+                fail_report_job(job_id, "Failed to generate PDF")
+                return
+            complete_report_job(job_id, filename, pdf_bytes)
+            log.info("Statement job finished", extra={"job_id": job_id, "bytes": len(pdf_bytes)})
+        except Exception as e:
+            log.exception("Statement job failed", extra={"job_id": job_id})
+            try:
+                fail_report_job(job_id, e)
+            except Exception:
+                log.exception("Could not record report job failure", extra={"job_id": job_id})
+
+
+report_runner = ReportRunner()
@@ -0,0 +1,158 @@
+"""
+In-memory search index for the sweet catalogue.
+
+Tokens from name, category and description are kept in a sorted list for
+prefix (autocomplete) lookups via bisect, and in a deletion-neighbourhood
+map (SymSpell style) for typo-tolerant matching within edit distance 1,
+or 2 for longer words. The catalogue is small, so the whole index lives
+in memory and is rebuilt from scratch on catalogue changes.
+"""
+import bisect
+import re
+import unicodedata
+
+# Field weights: a hit in the name counts far more than one in the description
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+EXACT_BONUS = 1.0
+PREFIX_BONUS = 0.6
+FUZZY_BONUS = 0.3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation; returns a list of tokens."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return _TOKEN_RE.findall(text)
+
+
+def _max_edits(token):
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 7:
+        return 1
+    return 2
+
+
+def _deletes(token, max_edits):
+    """All strings reachable from token by deleting up to max_edits characters."""
+    result = {token}
+    frontier = {token}
+    for _ in range(max_edits):
+        nxt = set()
+        for word in frontier:
+            for i in range(len(word)):
+                nxt.add(word[:i] + word[i + 1:])
+        result |= nxt
+        frontier = nxt
+    return result
+
+
+def _edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance, capped at limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SweetSearchIndex:
+    """Immutable search index over a list of sweet documents."""
+
+    def __init__(self, docs):
+        # token -> {doc_id: weight}
+        self._postings = {}
+        self._docs = {}
+        for doc in docs:
+            doc_id = str(doc.get("_id"))
+            self._docs[doc_id] = {
+                "_id": doc_id,
+                "name": doc.get("name", ""),
+                "category": doc.get("category") or "Uncategorized",
+                "rate": doc.get("rate", 0),
+                "unit": doc.get("unit") or "kg",
+                "isFestival": bool(doc.get("isFestival", False)),
+            }
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in normalize(doc.get(field)):
+                    postings = self._postings.setdefault(token, {})
+                    postings[doc_id] = max(postings.get(doc_id, 0), weight)
+
+        self._tokens = sorted(self._postings)
+        self._delete_map = {}
+        for token in self._tokens:
+            for variant in _deletes(token, _max_edits(token)):
+                self._delete_map.setdefault(variant, []).append(token)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _prefix_tokens(self, prefix):
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + "\uffff")
+        return self._tokens[start:end]
+
+    def _fuzzy_tokens(self, term):
+        max_edits = _max_edits(term)
+        if max_edits == 0:
+            return []
+        candidates = set()
+        for variant in _deletes(term, max_edits):
+            candidates.update(self._delete_map.get(variant, ()))
+        return [t for t in candidates if t != term and _edit_distance(term, t, max_edits) <= max_edits]
+
+    def _term_scores(self, term, is_last):
+        """Score documents for one query term; the last term also matches as a prefix."""
+        scores = {}
+
+        def add(token, bonus):
+            for doc_id, weight in self._postings.get(token, {}).items():
+                score = weight * bonus
+                if score > scores.get(doc_id, 0):
+                    scores[doc_id] = score
+
+        if term in self._postings:
+            add(term, EXACT_BONUS)
+        if is_last:
+            for token in self._prefix_tokens(term):
+                if token != term:
+                    add(token, PREFIX_BONUS)
+        for token in self._fuzzy_tokens(term):
+            add(token, FUZZY_BONUS)
+        return scores
+
+    def search(self, query, limit=10):
+        """Return up to limit matching sweets, best first.
+        Every query term must match (exactly, by prefix for the last term,
+        or with a small typo) for a sweet to be returned.
+        """
+        terms = normalize(query)
+        if not terms:
+            return []
+        combined = None
+        for i, term in enumerate(terms):
+            scores = self._term_scores(term, is_last=(i == len(terms) - 1))
+            if combined is None:
+                combined = scores
+            else:
+                combined = {d: combined[d] + s for d, s in scores.items() if d in combined}
+            if not combined:
+                return []
+        ranked = sorted(combined.items(), key=lambda kv: (-kv[1], self._docs[kv[0]]["name"]))
+        return [dict(self._docs[doc_id], score=round(score, 3)) for doc_id, score in ranked[:limit]]
@@ -0,0 +1,265 @@
+"""
+Publish the storefront catalogue as static files.
+
+The menu is read far more often than it changes, so each store's catalogue
+can be exported to STATIC_CATALOGUE_DIR/<storeId>/ and served by a reverse
+proxy or static host without reaching Flask or Mongo:
+
+    manifest.json                       current version; revalidate on every read
+    sweets.<hash>.json                  what GET /sweets returns
+    categories/<slug>.<hash>.json       one file per category
+    images/<hash>-<size>.<ext>          sweet images, resized to STATIC_IMAGE_MAX_DIMENSION
+
+Everything except the manifest is named after its content, so it can be
+cached forever. JSON files also get .gz (and .br) siblings for gzip_static /
+brotli_static. Files are written to temporary names and renamed into place,
+and the manifest goes last, so readers only ever see complete publishes.
+Files no longer referenced are removed after STATIC_PUBLISH_GRACE_SECONDS,
+giving clients holding the previous manifest time to finish.
+"""
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:  # in requirements.txt; without it images are published unresized
+    Image = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; concurrent publishes then rely on atomic renames alone
+    fcntl = None
+
+from model.image_model import open_image
+from model.sweet_model import get_catalogue, get_catalogue_version
+from utils.compression import brotli, compress_bytes
+from utils.image_upload import sniff_image_type
+from utils.json_provider import dumps_bytes
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+if Image is None:
+    log.warning("Pillow is not installed; static catalogue images will be published at full size")
+
+STATIC_CATALOGUE_DIR = os.getenv("STATIC_CATALOGUE_DIR") or "static_catalogue"
+# URL under which the proxy serves STATIC_CATALOGUE_DIR (used for image links)
+STATIC_CATALOGUE_BASE_URL = (os.getenv("STATIC_CATALOGUE_BASE_URL") or "/catalogue").rstrip("/")
+STATIC_IMAGE_MAX_DIMENSION = int(os.getenv("STATIC_IMAGE_MAX_DIMENSION", 800))
+STATIC_PUBLISH_ON_CHANGE = (os.getenv("STATIC_PUBLISH_ON_CHANGE") or "true").strip().lower() in ("1", "true", "yes", "on")
+# Catalogue edits arriving within this window are published together
+STATIC_PUBLISH_DELAY_SECONDS = float(os.getenv("STATIC_PUBLISH_DELAY_SECONDS", 2))
+STATIC_PUBLISH_GRACE_SECONDS = float(os.getenv("STATIC_PUBLISH_GRACE_SECONDS", 3600))
+
+_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+_PIL_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+_IMAGE_ID_URL = re.compile(r"/sweets/images/([0-9a-f]{24})$")
+
+
+def _content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _slug(category):
+    return re.sub(r"[^a-z0-9]+", "-", category.lower()).strip("-") or "uncategorized"
+
+
+def resize_image(data, content_type, max_dimension=STATIC_IMAGE_MAX_DIMENSION):
+    """Scale an image down so neither side exceeds max_dimension.
+    GIFs, small images and anything Pillow cannot handle are returned unchanged.
+    """
+    if Image is None or content_type not in _PIL_FORMATS:
+        return data
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if max(image.size) <= max_dimension:
+                return data
+            image.thumbnail((max_dimension, max_dimension))
+            options = {}
+            if content_type == "image/jpeg":
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                options = {"quality": 85, "optimize": True}
+            out = BytesIO()
+            image.save(out, format=_PIL_FORMATS[content_type], **options)
+            return out.getvalue()
+    except Exception as e:
+        log.warning("Could not resize image: %s", e)
+        return data
+
+
+class StaticCataloguePublisher:
+    def __init__(self, directory=STATIC_CATALOGUE_DIR, base_url=STATIC_CATALOGUE_BASE_URL):
+        self.directory = directory
+        self.base_url = base_url
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _store_dir(self, store_id):
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_-]", "_", store_id))
+
+    def _write(self, path, data):
+        """Atomically write a file unless an identical (same-named) one exists."""
+        if os.path.exists(path):
+            os.utime(path)  # still referenced; keep it out of the clean-up
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _write_json(self, store_dir, name, obj):
+        """Write obj as <name>.<hash>.json with compressed siblings; returns the relative path."""
+        body = dumps_bytes(obj)
+        relative = f"{name}.{_content_hash(body)}.json"
+        path = os.path.join(store_dir, relative)
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            if encoding == "gzip" or brotli is not None:
+                self._write(path + suffix, compress_bytes(body, encoding))
+        self._write(path, body)
+        return relative
+
+    def _publish_image(self, store_dir, sweet):
+        """Static URL of the sweet's resized image, or None to keep its current link.
+        Resized files are named after the original image, so unchanged images are
+        not resized again (uploaded ones are not even read: their hash is stored).
+        """
+        image = sweet.get("image") or ""
+        data = grid_out = None
+        if image.startswith("data:image/"):
+            try:
+                data = base64.b64decode(image.split(",", 1)[1])
+            except Exception:
+                return None
+            digest, content_type = _content_hash(data), sniff_image_type(data[:16])
+        else:
+            match = _IMAGE_ID_URL.search(image)
+            image_id = sweet.get("imageId") or (match.group(1) if match else None)
+            grid_out = open_image(image_id) if image_id else None
+            if grid_out is None:
+                return None
+            metadata = grid_out.metadata or {}
+            digest, content_type = (metadata.get("sha256") or image_id)[:16], metadata.get("contentType")
+        try:
+            if content_type not in _EXTENSIONS:
+                return None
+            relative = f"images/{digest}-{STATIC_IMAGE_MAX_DIMENSION}.{_EXTENSIONS[content_type]}"
+            path = os.path.join(store_dir, relative)
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                if data is None:
+                    data = grid_out.read()
+                self._write(path, resize_image(data, content_type))
+        finally:
+            if grid_out is not None:
+                grid_out.close()
+        return f"{self.base_url}/{os.path.basename(store_dir)}/{relative}"
+
+    def publish(self, store_id):
+        """Export a store's catalogue and switch its manifest over. Returns the manifest."""
+        start = time.perf_counter()
+        store_dir = self._store_dir(store_id)
+        os.makedirs(os.path.join(store_dir, "categories"), exist_ok=True)
+        os.makedirs(os.path.join(store_dir, "images"), exist_ok=True)
+
+        with open(os.path.join(store_dir, ".publish.lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            version = get_catalogue_version(store_id)
+            sweets = get_catalogue(store_id)
+            images = set()
+            for sweet in sweets:
+                url = self._publish_image(store_dir, sweet)
+                if url:
+                    sweet["image"] = url
+                    images.add(url.rsplit("/", 2)[-1])
+
+            by_category = {}
+            for sweet in sweets:
+                by_category.setdefault(sweet.get("category") or "Uncategorized", []).append(sweet)
+            manifest = {
+                "storeId": store_id,
+                "version": version,
+                "publishedAt": datetime.now(),
+                "baseUrl": f"{self.base_url}/{os.path.basename(store_dir)}",
+                "sweets": self._write_json(store_dir, "sweets", sweets),
+                "categories": {
+                    category: self._write_json(store_dir, f"categories/{_slug(category)}", docs)
+                    for category, docs in sorted(by_category.items())
+                },
+                "images": len(images),
+            }
+            # The manifest is the switch-over point, so it is written last
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=store_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(dumps_bytes(manifest))
+            os.replace(tmp_path, os.path.join(store_dir, "manifest.json"))
+            removed = self._remove_unreferenced(store_dir, manifest, images)
+
+        log.info("Static catalogue published", extra={
+            "store_id": store_id,
+            "version": version,
+            "sweets": len(sweets),
+            "images": len(images),
+            "removed_files": removed,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+        return manifest
+
+    def _remove_unreferenced(self, store_dir, manifest, images):
+        referenced = {manifest["sweets"], *manifest["categories"].values()}
+        referenced |= {f"{r}.gz" for r in referenced} | {f"{r}.br" for r in referenced}
+        referenced |= {f"images/{name}" for name in images}
+        cutoff = time.time() - STATIC_PUBLISH_GRACE_SECONDS
+        removed = 0
+        for sub in ("", "categories", "images"):
+            folder = os.path.join(store_dir, sub)
+            for name in os.listdir(folder):
+                relative = f"{sub}/{name}" if sub else name
+                path = os.path.join(folder, name)
+                if relative in referenced or name.startswith(".") or name == "manifest.json" or not os.path.isfile(path):
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def schedule(self, store_id):
+        """Publish a store in the background shortly after a catalogue change.
+        Changes arriving before that publish starts are folded into it.
+        """
+        if not STATIC_PUBLISH_ON_CHANGE:
+            return
+        with self._lock:
+            if store_id in self._pending:
+                return
+            self._pending.add(store_id)
+        threading.Thread(target=self._publish_later, args=(store_id,), name="catalogue-publish", daemon=True).start()
+
+    def _publish_later(self, store_id):
+        time.sleep(STATIC_PUBLISH_DELAY_SECONDS)
+        with self._lock:
+            # Changes from here on schedule another publish
+            self._pending.discard(store_id)
+        try:
+            self.publish(store_id)
+        except Exception:
+            log.exception("Static catalogue publish failed", extra={"store_id": store_id})
+
+
+static_publisher = StaticCataloguePublisher()
@@ -0,0 +1,64 @@
+"""
+Store (branch) resolution for multi-outlet deployments.
+
+Every sweet and order belongs to one store, identified by a short `storeId`.
+The store of a request is taken from the X-Store-ID header, else from the
+Host the request came in on (STORE_HOSTS), else DEFAULT_STORE_ID, and kept
+in a context variable for the duration of the request so the models can
+scope every query without threading it through each call. Code running
+outside a request (scripts, background threads) works on the default store.
+"""
+import os
+from contextvars import ContextVar
+
+DEFAULT_STORE_ID = (os.getenv("DEFAULT_STORE_ID") or "main").strip()
+
+
+def _parse_store_hosts(value):
+    """"host=storeId,host2=storeId2" -> {"host": "storeId", ...} (hosts lower-cased, ports ignored)."""
+    hosts = {}
+    for pair in (value or "").split(","):
+        host, sep, store_id = pair.partition("=")
+        if sep and host.strip() and store_id.strip():
+            hosts[host.strip().lower().split(":")[0]] = store_id.strip()
+    return hosts
+
+
+STORE_HOSTS = _parse_store_hosts(os.getenv("STORE_HOSTS"))
+# Every store this deployment serves; X-Store-ID must name one of them
+STORE_IDS = frozenset(
+    [DEFAULT_STORE_ID]
+    + list(STORE_HOSTS.values())
+    + [s.strip() for s in (os.getenv("STORE_IDS") or "").split(",") if s.strip()]
+)
+
+_DEFAULT_CORS_ORIGINS = [
+    "http://localhost:5173", "http://localhost:3000", "http://127.0.0.1:5173",
+    "https://server.uemcseaiml.org", "https://sweet-store-frontend-ten.vercel.app",
+    "https://www.mansoorhotel.in", "https://mansoorhotel.in",
+]
+# Storefront/admin origins of all stores, comma-separated
+CORS_ORIGINS = [o.strip() for o in (os.getenv("CORS_ORIGINS") or "").split(",") if o.strip()] or _DEFAULT_CORS_ORIGINS
+
+store_id_var = ContextVar("store_id", default=None)
+
+
+class UnknownStoreError(ValueError):
+    """Raised when a request names a store this deployment does not serve."""
+
+
+def resolve_store_id(header_value=None, host=None):
+    """Store for a request: the X-Store-ID header, else the Host mapping, else the default."""
+    if header_value:
+        store_id = header_value.strip()
+        if store_id not in STORE_IDS:
+            raise UnknownStoreError(f"Unknown store: {store_id}")
+        return store_id
+    if host:
+        return STORE_HOSTS.get(host.strip().lower().split(":")[0], DEFAULT_STORE_ID)
+    return DEFAULT_STORE_ID
+
+
+def current_store_id():
+    """Store of the current request (or the default store outside a request)."""
+    return store_id_var.get() or DEFAULT_STORE_ID